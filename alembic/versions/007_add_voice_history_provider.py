@@ -0,0 +1,42 @@
+"""add provider and latency to voice history
+
+Revision ID: 007_add_voice_history_provider
+Revises: 006_add_missing_user_columns
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007_add_voice_history_provider'
+down_revision = '006_add_missing_user_columns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Check if columns exist before adding (SQLite doesn't support IF NOT EXISTS)
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = [col['name'] for col in inspector.get_columns('voice_history')]
+    
+    # Which TTS provider produced the audio, and how long it took
+    if 'provider' not in columns:
+        op.add_column('voice_history', sa.Column('provider', sa.String(), nullable=True))
+    
+    if 'latency_ms' not in columns:
+        op.add_column('voice_history', sa.Column('latency_ms', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = [col['name'] for col in inspector.get_columns('voice_history')]
+    
+    if 'latency_ms' in columns:
+        op.drop_column('voice_history', 'latency_ms')
+    
+    if 'provider' in columns:
+        op.drop_column('voice_history', 'provider')
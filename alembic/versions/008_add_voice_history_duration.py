@@ -0,0 +1,36 @@
+"""add duration to voice history
+
+Revision ID: 008_add_voice_history_duration
+Revises: 007_add_voice_history_provider
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008_add_voice_history_duration'
+down_revision = '007_add_voice_history_provider'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Check if column exists before adding (SQLite doesn't support IF NOT EXISTS)
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = [col['name'] for col in inspector.get_columns('voice_history')]
+    
+    # Length of the clip, read from its frame headers when it is stored
+    if 'duration_seconds' not in columns:
+        op.add_column('voice_history', sa.Column('duration_seconds', sa.Float(), nullable=True))
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = [col['name'] for col in inspector.get_columns('voice_history')]
+    
+    if 'duration_seconds' in columns:
+        op.drop_column('voice_history', 'duration_seconds')
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for /static/videos: concurrent Range requests (like a player seeking)
+against each MEDIA_SERVE_MODE.
+
+"fileresponse" and "sendfile" are started here as local uvicorn servers. "accel" needs
+nginx in front of the backend (frontend/nginx.conf), so pass its URL with --accel-url
+and make sure the same video exists there.
+
+Usage:
+    python benchmark_video_serving.py
+    python benchmark_video_serving.py --size-mb 50 --concurrency 64 --requests 2000
+    python benchmark_video_serving.py --accel-url http://localhost:3000 --filename slideshow_x.mp4
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+VIDEOS_DIR = os.path.join(APP_DIR, "generated_videos")
+
+
+def create_test_video(size_mb: int) -> str:
+    """Write a file with an MP4-looking header; the server never decodes it"""
+    os.makedirs(VIDEOS_DIR, exist_ok=True)
+    filename = f"bench_{uuid.uuid4().hex[:8]}.mp4"
+    path = os.path.join(VIDEOS_DIR, filename)
+    with open(path, "wb") as f:
+        f.write(b"\x00\x00\x00\x18ftypmp42")
+        block = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            f.write(block)
+    return filename
+
+
+def start_server(mode: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, MEDIA_SERVE_MODE=mode, MEDIA_STORAGE_BACKEND="local")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=APP_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_up(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server at {base_url} did not come up")
+
+
+async def run_load(base_url: str, filename: str, file_size: int, concurrency: int, total: int, range_kb: int) -> dict:
+    url = f"{base_url}/static/videos/{filename}"
+    latencies = []
+    bytes_received = 0
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+
+        async def worker():
+            nonlocal bytes_received, errors
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = random.randrange(0, max(1, file_size - range_kb * 1024))
+                end = start + range_kb * 1024 - 1
+                t0 = time.perf_counter()
+                try:
+                    response = await client.get(url, headers={"Range": f"bytes={start}-{end}"})
+                    bytes_received += len(response.content)
+                    if response.status_code not in (200, 206):
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        t_start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t_start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "req_per_s": total / elapsed,
+        "mb_per_s": bytes_received / elapsed / 1024 / 1024,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def print_result(label: str, result: dict):
+    print(
+        f"{label:<14} {result['req_per_s']:>9.1f} req/s {result['mb_per_s']:>9.1f} MB/s "
+        f"p50 {result['p50_ms']:>7.1f} ms  p95 {result['p95_ms']:>7.1f} ms  p99 {result['p99_ms']:>7.1f} ms  "
+        f"errors {result['errors']}",
+        flush=True,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent Range requests per video serve mode")
+    parser.add_argument("--size-mb", type=int, default=20, help="Size of the generated test video")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--range-kb", type=int, default=512, help="Bytes per Range request (a player seek)")
+    parser.add_argument("--modes", default="fileresponse,sendfile", help="Locally started modes to compare")
+    parser.add_argument("--accel-url", help="Base URL of nginx in front of a backend running MEDIA_SERVE_MODE=accel")
+    parser.add_argument("--filename", help="Existing video to use instead of generating one")
+    args = parser.parse_args()
+
+    filename = args.filename or create_test_video(args.size_mb)
+    file_size = args.size_mb * 1024 * 1024
+    if args.filename:
+        file_size = os.path.getsize(os.path.join(VIDEOS_DIR, filename))
+
+    print("=" * 50, flush=True)
+    print(f"🎬 {filename}: {file_size / 1024 / 1024:.1f} MB, {args.requests} requests, "
+          f"concurrency {args.concurrency}, {args.range_kb} KB ranges", flush=True)
+    print("=" * 50, flush=True)
+
+    try:
+        port = 8701
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            server = start_server(mode, port)
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                await wait_until_up(base_url)
+                # Warm the page cache so every mode reads from memory
+                await run_load(base_url, filename, file_size, 4, 20, args.range_kb)
+                print_result(mode, await run_load(base_url, filename, file_size, args.concurrency, args.requests, args.range_kb))
+            finally:
+                server.terminate()
+                server.wait()
+            port += 1
+
+        if args.accel_url:
+            base_url = args.accel_url.rstrip("/")
+            await run_load(base_url, filename, file_size, 4, 20, args.range_kb)
+            print_result("accel (nginx)", await run_load(base_url, filename, file_size, args.concurrency, args.requests, args.range_kb))
+    finally:
+        if not args.filename:
+            os.remove(os.path.join(VIDEOS_DIR, filename))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
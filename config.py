@@ -49,6 +49,154 @@ class Settings:
     if os.getenv("CORS_ALLOW_ALL", "false").lower() == "true":
         ALLOWED_ORIGINS = ["*"]
 
+    # Shared upstream HTTP clients (see services/http_clients.py)
+    UPSTREAM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY_SECONDS", "120"))
+    UPSTREAM_PREWARM = os.getenv("UPSTREAM_PREWARM", "true").lower() == "true"
+    UPSTREAM_PREWARM_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_PREWARM_TIMEOUT_SECONDS", "5"))
+    # Retries of idempotent upstream requests (jittered exponential backoff)
+    UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+    UPSTREAM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY_SECONDS", "0.25"))
+    UPSTREAM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY_SECONDS", "2"))
+    # Answer upstream calls from the local simulator instead (see services/upstream_simulator.py):
+    # "" = real providers, "inprocess", or the URL of a running stand-in server
+    UPSTREAM_SIMULATOR = os.getenv("UPSTREAM_SIMULATOR", "").strip()
+    # Per upstream: latency as "median_ms,p95_ms" and injected faults as "kind:rate,..." where kind is
+    # an HTTP status, "deprecated", "timeout" or "connect"
+    SIMULATOR_LATENCY_MS = {
+        name: os.getenv(f"SIMULATOR_LATENCY_MS_{name.upper()}", default)
+        for name, default in (("elevenlabs", "400,1500"), ("lamonfox", "600,2500"), ("easypaisa", "150,600"), ("claid", "300,1200"))
+    }
+    SIMULATOR_ERRORS = {
+        name: os.getenv(f"SIMULATOR_ERRORS_{name.upper()}", "")
+        for name in ("elevenlabs", "lamonfox", "easypaisa", "claid")
+    }
+    SIMULATOR_TTS_MS_PER_CHAR = float(os.getenv("SIMULATOR_TTS_MS_PER_CHAR", "2"))
+    SIMULATOR_DEPRECATED_MODELS = [m.strip() for m in os.getenv("SIMULATOR_DEPRECATED_MODELS", "").split(",") if m.strip()]
+    SIMULATOR_SEED = int(os.getenv("SIMULATOR_SEED")) if os.getenv("SIMULATOR_SEED") else None
+    # Circuit breakers (see utils/circuit_breaker.py)
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+
+    # While on a fallback TTS model, how often to re-check the preferred one in the background
+    TTS_MODEL_REPROBE_INTERVAL_SECONDS = int(os.getenv("TTS_MODEL_REPROBE_INTERVAL_SECONDS", "3600"))
+
+    # Voice catalog (see services/voice_catalog.py): background refresh interval and per-fetch timeout
+    VOICE_CATALOG_REFRESH_SECONDS = int(os.getenv("VOICE_CATALOG_REFRESH_SECONDS", "3600"))
+    VOICE_CATALOG_FETCH_TIMEOUT_SECONDS = float(os.getenv("VOICE_CATALOG_FETCH_TIMEOUT_SECONDS", "10"))
+
+    # Synthesized speech cache (see services/tts_cache.py)
+    TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+    TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR")  # defaults to <app>/tts_cache
+    TTS_CACHE_MEMORY_MB = int(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+    TTS_CACHE_DISK_MB = int(os.getenv("TTS_CACHE_DISK_MB", "1024"))
+    # Longest an output format conversion may run (see services/audio_transcode.py); results share the TTS cache
+    AUDIO_TRANSCODE_TIMEOUT_SECONDS = float(os.getenv("AUDIO_TRANSCODE_TIMEOUT_SECONDS", "30"))
+
+    # Synthesize multi-sentence texts sentence by sentence so edits only re-synthesize what changed
+    TTS_SENTENCE_SYNTHESIS = os.getenv("TTS_SENTENCE_SYNTHESIS", "true").lower() == "true"
+    TTS_SENTENCE_CONCURRENCY = int(os.getenv("TTS_SENTENCE_CONCURRENCY", "4"))
+
+    # ElevenLabs optimize_streaming_latency (0-4): higher = faster first audio, slightly lower quality
+    TTS_STREAM_LATENCY_OPTIMIZATION = int(os.getenv("TTS_STREAM_LATENCY_OPTIMIZATION", "3"))
+
+    # Long-form synthesis: chunk size, concurrent chunks per user, retries per failed chunk
+    TTS_LONGFORM_CHUNK_CHARS = int(os.getenv("TTS_LONGFORM_CHUNK_CHARS", "1500"))
+    TTS_LONGFORM_USER_CONCURRENCY = int(os.getenv("TTS_LONGFORM_USER_CONCURRENCY", "3"))
+    TTS_LONGFORM_CHUNK_RETRIES = int(os.getenv("TTS_LONGFORM_CHUNK_RETRIES", "2"))
+
+    # Batch jobs (see services/tts_batch.py): items per job, characters per item, concurrent items per job,
+    # and how long finished jobs stay downloadable
+    TTS_BATCH_MAX_ITEMS = int(os.getenv("TTS_BATCH_MAX_ITEMS", "500"))
+    TTS_BATCH_MAX_ITEM_CHARS = int(os.getenv("TTS_BATCH_MAX_ITEM_CHARS", "1000"))
+    TTS_BATCH_CONCURRENCY = int(os.getenv("TTS_BATCH_CONCURRENCY", "4"))
+    TTS_BATCH_RETENTION_SECONDS = int(os.getenv("TTS_BATCH_RETENTION_SECONDS", "3600"))
+    TTS_BATCH_DIR = os.getenv("TTS_BATCH_DIR")  # defaults to <app>/tts_batches
+
+    # WebSocket TTS sessions (see routes/tts_ws.py): time allowed for the auth message, idle timeout,
+    # queued requests per session and size of the binary audio messages
+    TTS_WS_AUTH_TIMEOUT_SECONDS = float(os.getenv("TTS_WS_AUTH_TIMEOUT_SECONDS", "10"))
+    TTS_WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("TTS_WS_IDLE_TIMEOUT_SECONDS", "300"))
+    TTS_WS_MAX_PENDING = int(os.getenv("TTS_WS_MAX_PENDING", "8"))
+    TTS_WS_CHUNK_BYTES = int(os.getenv("TTS_WS_CHUNK_BYTES", "32768"))
+
+    # TTS providers each plan may use, in order of preference (comma-separated provider names)
+    TTS_PROVIDER_PREFERENCES = {
+        "Free": [p.strip() for p in os.getenv("TTS_PROVIDERS_FREE", "elevenlabs,lamonfox").split(",") if p.strip()],
+        "Paid": [p.strip() for p in os.getenv("TTS_PROVIDERS_PAID", "elevenlabs,lamonfox").split(",") if p.strip()],
+    }
+    # Providers failing more than this share of requests in the window are tried last
+    TTS_ROUTER_MAX_ERROR_RATE = float(os.getenv("TTS_ROUTER_MAX_ERROR_RATE", "0.5"))
+    TTS_ROUTER_WINDOW_SECONDS = int(os.getenv("TTS_ROUTER_WINDOW_SECONDS", "300"))
+
+    # Time budget for one synthesis request, across retries, fallbacks and hedges
+    TTS_REQUEST_DEADLINE_SECONDS = float(os.getenv("TTS_REQUEST_DEADLINE_SECONDS", "45"))
+    # Hedging: duplicate a request that's slower than the provider's observed p95
+    TTS_HEDGE_ENABLED = os.getenv("TTS_HEDGE_ENABLED", "true").lower() == "true"
+    TTS_HEDGE_MAX_RATIO = float(os.getenv("TTS_HEDGE_MAX_RATIO", "0.1"))  # hedges per request, over the router window
+    TTS_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("TTS_HEDGE_DEFAULT_DELAY_SECONDS", "5"))  # before any latency data
+    TTS_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("TTS_HEDGE_MIN_DELAY_SECONDS", "0.3"))
+
+    # Client-side rate limits per TTS provider account: (requests per second, burst); rate 0 disables
+    TTS_RATE_LIMITS = {
+        "elevenlabs": (float(os.getenv("ELEVENLABS_RATE_PER_SECOND", "2")), int(os.getenv("ELEVENLABS_RATE_BURST", "4"))),
+        "lamonfox": (float(os.getenv("LAMONFOX_RATE_PER_SECOND", "1")), int(os.getenv("LAMONFOX_RATE_BURST", "3"))),
+    }
+    # Longest a request without its own deadline queues for a token
+    TTS_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("TTS_RATE_LIMIT_MAX_WAIT_SECONDS", "10"))
+    # "memory" (per process) or "redis" (shared by all workers; needs the redis package)
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    # Connect/read timeout for Redis, and how long to stay on the in-process bucket after it fails
+    RATE_LIMIT_REDIS_TIMEOUT_SECONDS = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT_SECONDS", "0.25"))
+    RATE_LIMIT_REDIS_COOLDOWN_SECONDS = float(os.getenv("RATE_LIMIT_REDIS_COOLDOWN_SECONDS", "30"))
+
+    # Lamonfox proxy pool (see services/proxy_pool.py). LAMONFOX_PROXIES: comma-separated proxy URLs,
+    # unset = built-in list, empty = direct connections only
+    LAMONFOX_PROXIES = os.getenv("LAMONFOX_PROXIES")
+    PROXY_PROBE_INTERVAL_SECONDS = int(os.getenv("PROXY_PROBE_INTERVAL_SECONDS", "60"))
+    PROXY_PROBE_TIMEOUT_SECONDS = float(os.getenv("PROXY_PROBE_TIMEOUT_SECONDS", "5"))
+    PROXY_EJECT_AFTER_FAILURES = int(os.getenv("PROXY_EJECT_AFTER_FAILURES", "3"))
+    PROXY_EJECT_BASE_SECONDS = float(os.getenv("PROXY_EJECT_BASE_SECONDS", "30"))  # doubles per repeat ejection
+    PROXY_EJECT_MAX_SECONDS = float(os.getenv("PROXY_EJECT_MAX_SECONDS", "600"))
+    PROXY_MAX_ATTEMPTS = int(os.getenv("PROXY_MAX_ATTEMPTS", "2"))  # proxies tried per request
+    PROXY_DIRECT_FALLBACK = os.getenv("PROXY_DIRECT_FALLBACK", "true").lower() == "true"
+
+    # Worker pools for CPU-bound media work (see utils/offload.py)
+    OFFLOAD_THREAD_WORKERS = int(os.getenv("OFFLOAD_THREAD_WORKERS", "4"))
+    OFFLOAD_PROCESS_WORKERS = int(os.getenv("OFFLOAD_PROCESS_WORKERS", "2"))
+
+    # Generated media storage: "local" (container disk) or "s3" (any S3-compatible store, e.g. MinIO)
+    MEDIA_STORAGE_BACKEND = os.getenv("MEDIA_STORAGE_BACKEND", "local").lower()
+    S3_BUCKET = os.getenv("S3_BUCKET")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+    S3_REGION = os.getenv("S3_REGION", "us-east-1")
+    S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")
+    S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+    S3_KEY_PREFIX = os.getenv("S3_KEY_PREFIX", "")
+    S3_PRESIGN_TTL_SECONDS = int(os.getenv("S3_PRESIGN_TTL_SECONDS", "300"))
+
+    # How local media bytes are sent:
+    #   "fileresponse" - Starlette FileResponse from the uvicorn worker
+    #   "accel"        - backend only authorises; nginx serves the file via X-Accel-Redirect
+    #   "sendfile"     - standalone: range-aware response using zero-copy sendfile where the server supports it
+    MEDIA_SERVE_MODE = os.getenv("MEDIA_SERVE_MODE", "fileresponse").lower()
+    # Internal nginx location that maps onto the media directories (see frontend/nginx.conf)
+    ACCEL_REDIRECT_PREFIX = os.getenv("ACCEL_REDIRECT_PREFIX", "/_protected_media/")
+
+    # Generated media lifecycle (see services/media_lifecycle.py)
+    # Videos older than their owner's plan retention are deleted; plans not listed use "Paid"
+    MEDIA_RETENTION_DAYS = {
+        "Free": float(os.getenv("MEDIA_RETENTION_DAYS_FREE", "7")),
+        "Paid": float(os.getenv("MEDIA_RETENTION_DAYS_PAID", "90")),
+    }
+    # Above the high-water mark, least recently played videos are evicted down to the low-water mark
+    MEDIA_MAX_DISK_MB = int(os.getenv("MEDIA_MAX_DISK_MB", "2048"))
+    MEDIA_LOW_WATER_RATIO = float(os.getenv("MEDIA_LOW_WATER_RATIO", "0.8"))
+    MEDIA_SWEEP_INTERVAL_SECONDS = int(os.getenv("MEDIA_SWEEP_INTERVAL_SECONDS", "900"))
+    MEDIA_CLEANUP_BATCH_SIZE = int(os.getenv("MEDIA_CLEANUP_BATCH_SIZE", "100"))
+    # Temp uploads and partial encodes older than this are leftovers from a dead request
+    ORPHAN_MAX_AGE_SECONDS = int(os.getenv("ORPHAN_MAX_AGE_SECONDS", "3600"))
+
     # Plan Settings
     TRIAL_DAILY_LIMIT = 3
     PLAN_PRICES = {
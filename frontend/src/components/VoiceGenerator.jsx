@@ -22,17 +22,18 @@ const VoiceGenerator = ({ user, onGenerationComplete }) => {
       const response = await ttsAPI.generateVoice(text)
       
       if (response.success) {
-        if (response.audio_data) {
-          // Trial user - play base64 audio
+        if (response.audio_url) {
+          // Stored audio - streamed with Range requests and cached by the browser
+          setAudioUrl(response.audio_url)
+          setAudioData(null)
+        } else if (response.audio_data) {
+          // Older backends inline the audio as base64
           const audioBlob = new Blob([
             Uint8Array.from(atob(response.audio_data), c => c.charCodeAt(0))
           ], { type: 'audio/mpeg' })
           const url = URL.createObjectURL(audioBlob)
           setAudioUrl(url)
           setAudioData(response.audio_data)
-        } else if (response.audio_url) {
-          // Paid user - use URL
-          setAudioUrl(response.audio_url)
         }
         
         onGenerationComplete?.()
@@ -152,7 +153,7 @@ const VoiceGenerator = ({ user, onGenerationComplete }) => {
           />
         )}
 
-        {isTrialUser && audioData && (
+        {isTrialUser && audioUrl && (
           <div className="bg-blue-50 border border-blue-200 rounded-md p-3">
             <p className="text-sm text-blue-800">
               <strong>Note:</strong> This is a trial version with watermark. Upgrade to remove watermark and enable downloads.
@@ -39,7 +39,7 @@ try:
     from database import engine, Base
     print("✅ Database imported", flush=True)
     
-    from routes import auth, tts, payments, video
+    from routes import auth, tts, tts_ws, payments, video
     print("✅ Routes imported", flush=True)
     
     print("DEBUG_DATABASE_URL:", os.getenv("DATABASE_URL"), flush=True)
@@ -54,11 +54,51 @@ except Exception as e:
 # Base.metadata.create_all() can conflict with Alembic migrations
 print("Database tables will be managed by Alembic migrations")
 
+# Background media cleanup (TTL, disk quota, orphaned temp files)
+import asyncio
+from contextlib import asynccontextmanager
+from services.media_lifecycle import MediaLifecycleManager, touch_access
+from services.media_storage import MEDIA_DIRS, get_media_storage
+from services.http_clients import http_clients
+from services.lamonfox_service import LAMONFOX_API_KEY, lamonfox_proxy_pool
+from services.voice_catalog import voice_catalog
+from utils import offload
+from config import settings
+
+media_lifecycle = MediaLifecycleManager(
+    storage=get_media_storage(),
+    videos_dir=video.videos_dir,
+    audio_dir=MEDIA_DIRS["audio"],
+    tmp_dir=video.tmp_uploads_dir,
+    partial_prefix=video.PARTIAL_VIDEO_PREFIX,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start shared clients and background tasks on startup and stop them on shutdown"""
+    await offload.start()
+    await http_clients.start(prewarm=settings.UPSTREAM_PREWARM)
+    await voice_catalog.refresh_all()
+    cleanup_task = asyncio.create_task(media_lifecycle.run_periodic())
+    print("🧹 Media lifecycle sweeper started", flush=True)
+    background_tasks = [cleanup_task, asyncio.create_task(voice_catalog.run_periodic())]
+    if LAMONFOX_API_KEY:
+        background_tasks.append(asyncio.create_task(lamonfox_proxy_pool.run_periodic()))
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await http_clients.close()
+        offload.shutdown()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="MyAIStudio API",
     description="Text-to-Speech API with Lamonfox (Lemonfox.ai) integration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ✅ FIXED: Proper CORS setup for both local + production
@@ -94,6 +134,7 @@ app.add_middleware(
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError, HTTPException
 from fastapi import Request, status
+from utils.circuit_breaker import CircuitOpenError
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -117,6 +158,15 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """An upstream's circuit breaker is open: fail fast and tell the client when to come back"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after + 0.999))},
+    )
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors with CORS headers"""
@@ -128,47 +178,97 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
 app.include_router(tts.router, prefix="/api", tags=["text-to-speech"])
+app.include_router(tts_ws.router, prefix="/api", tags=["text-to-speech"])
 app.include_router(payments.router, prefix="/api/payment", tags=["payments"])
 app.include_router(video.router, prefix="/api/video", tags=["video"])
 
-# ✅ Static files for generated videos
-# Use app directory for generated_videos (writable location on Railway)
-videos_dir = os.path.join(os.path.dirname(__file__), "generated_videos")
-os.makedirs(videos_dir, exist_ok=True)
-print(f"Video files directory: {os.path.abspath(videos_dir)}")
+# ✅ Generated videos (local disk or S3-compatible storage, see services/media_storage.py)
+media_storage = get_media_storage()
+print(f"Video storage backend: {media_storage.name}, serve mode: {settings.MEDIA_SERVE_MODE}")
 
 # Direct route handler to serve video files (more reliable than mount)
-from fastapi.responses import FileResponse
+import stat
+from fastapi.responses import FileResponse, RedirectResponse, Response
 from fastapi import HTTPException
+from utils import http_cache
+from utils.file_response import RangeFileResponse
+from utils.audio_formats import content_type_for
 
-@app.get("/static/videos/{filename}")
-async def serve_video(filename: str):
+def serve_media(namespace: str, filename: str, request: Request, media_type: str) -> Response:
     """
-    SIMPLE: Serve video files directly from disk.
-    This is the ONLY way videos are served - no cache, no streaming complexity.
+    Serve a generated media file from the given storage namespace.
+    Local storage streams the file from disk; S3 storage answers with a short-lived
+    presigned redirect so the bytes never pass through Python.
+    Filenames are unique and never rewritten, so responses are cached as immutable
+    and revalidations are answered with 304 from memory when possible.
     """
-    from fastapi.responses import FileResponse
-    
     # Remove query parameters if present
     filename = filename.split('?')[0]
-    file_path = os.path.join(videos_dir, filename)
-    
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        file_size = os.path.getsize(file_path)
-        print(f"✅ Serving video: {filename} ({file_size} bytes)", flush=True)
-        
-        # Use FileResponse - FastAPI handles range requests automatically
-        return FileResponse(
+    # Hidden names are in-progress writes (see routes/video.py) - never serve them
+    if filename.startswith(".") or os.path.basename(filename) != filename:
+        raise HTTPException(status_code=404, detail=f"File not found: {filename}")
+
+    if media_storage.redirects:
+        # Don't let clients cache the redirect beyond the presigned URL's lifetime
+        return RedirectResponse(
+            media_storage.url_for(namespace, filename),
+            status_code=307,
+            headers={"Cache-Control": f"private, max-age={max(0, settings.S3_PRESIGN_TTL_SECONDS - 30)}"},
+        )
+
+    file_path = media_storage.local_path(namespace, filename)
+
+    # Revalidation of a file we've already served: answer without touching disk
+    known = http_cache.cached_validators(file_path)
+    if known and http_cache.is_not_modified(request.headers, known[0], known[2]):
+        return Response(status_code=304, headers=http_cache.not_modified_headers(known[0], known[1]))
+
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode):
+        print(f"❌ Media file not found: {namespace}/{filename}", flush=True)
+        raise HTTPException(status_code=404, detail=f"File not found: {filename}")
+
+    etag, last_modified, mtime = http_cache.validators_from_stat(file_path, st)
+    if http_cache.is_not_modified(request.headers, etag, mtime):
+        return Response(status_code=304, headers=http_cache.not_modified_headers(etag, last_modified))
+
+    print(f"✅ Serving {namespace}: {filename} ({st.st_size} bytes)", flush=True)
+    # LRU eviction in services/media_lifecycle.py goes by last play
+    touch_access(file_path)
+
+    headers = {
+        "Cache-Control": http_cache.IMMUTABLE_CACHE_CONTROL,
+        "ETag": etag,
+        "Last-Modified": last_modified,
+    }
+    if settings.MEDIA_SERVE_MODE == "accel":
+        # nginx serves the bytes (and any Range) from its internal location
+        headers["X-Accel-Redirect"] = f"{settings.ACCEL_REDIRECT_PREFIX}{namespace}/{filename}"
+        return Response(status_code=200, media_type=media_type, headers=headers)
+    if settings.MEDIA_SERVE_MODE == "sendfile":
+        return RangeFileResponse(
             file_path,
-            media_type="video/mp4",
-            headers={
-                "Accept-Ranges": "bytes",
-                "Cache-Control": "public, max-age=3600",
-            }
+            stat_result=st,
+            request_headers=request.headers,
+            media_type=media_type,
+            headers=headers,
+            etag=etag,
         )
-    
-    print(f"❌ Video not found: {filename}", flush=True)
-    raise HTTPException(status_code=404, detail=f"Video file not found: {filename}")
+    headers["Accept-Ranges"] = "bytes"
+    return FileResponse(file_path, media_type=media_type, stat_result=st, headers=headers)
+
+@app.get("/static/videos/{filename}")
+async def serve_video(filename: str, request: Request):
+    """Serve a generated video"""
+    return serve_media("videos", filename, request, "video/mp4")
+
+@app.get("/static/audio/{filename}")
+async def serve_audio(filename: str, request: Request):
+    """Serve stored voice audio (linked from VoiceHistory.audio_url)"""
+    return serve_media("audio", filename, request, content_type_for(filename))
 
 @app.get("/")
 async def root():
@@ -178,6 +278,14 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+from fastapi.responses import PlainTextResponse
+from utils import metrics
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus-format metrics for this worker process"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Print server startup info
 print("=" * 50)
 print("✅ FastAPI application initialized successfully!")
@@ -187,6 +295,8 @@ print("  - /api/* (text-to-speech)")
 print("  - /api/payment/* (payments)")
 print("  - /api/video/* (video generation)")
 print("  - /static/videos/* (video files)")
+print("  - /static/audio/* (voice audio files)")
+print("  - /metrics (Prometheus metrics)")
 print("=" * 50)
 print("🚀 Starting Uvicorn server...")
 print("=" * 50)
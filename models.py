@@ -33,7 +33,10 @@ class VoiceHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     text = Column(Text, nullable=False)
-    audio_url = Column(String, nullable=True)  # For paid users
+    audio_url = Column(String, nullable=True)  # Stored audio under /static/audio/
+    provider = Column(String, nullable=True)  # TTS provider that produced the audio
+    latency_ms = Column(Integer, nullable=True)  # Upstream synthesis time
+    duration_seconds = Column(Float, nullable=True)  # Length of the clip, from its frame headers
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -1,23 +1,129 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, UploadFile, status
 from sqlalchemy.orm import Session
-from database import get_db
+from fastapi.responses import JSONResponse, StreamingResponse
+from database import SessionLocal, get_db
 from models import User, VoiceHistory
-from schemas import VoiceGenerateRequest, VoiceGenerateResponse
-from services.elevenlabs_service import ElevenLabsService
-from utils.audio_utils import add_watermark_to_audio, audio_to_base64
+from schemas import TTSBatchRequest, VoiceGenerateRequest, VoiceGenerateResponse
+from services.media_lifecycle import AUDIO_URL_PREFIX
+from services.elevenlabs_service import NATIVE_FORMATS
+from services.lamonfox_service import lamonfox_proxy_pool
+from services.media_storage import get_media_storage
+from services.tts_batch import parse_csv, tts_batches
+from services.tts_cache import tts_cache
+from services.tts_providers import DeadlineExceeded
+from services.tts_router import tts_router
+from services.tts_synthesis import routed_generate, synthesize_in_format, synthesize_long_form
+from services.voice_catalog import voice_catalog
+from services.word_quota import WordUsage, plan_token_limit, refund_words, reserve_words
+from utils.audio_formats import DEFAULT_FORMAT, AudioFormat, parse_format
+from utils.media_info import audio_duration
+from utils import http_cache
+from utils.circuit_breaker import CircuitOpenError
 from routes.auth import get_current_user
+from config import settings
+from typing import AsyncIterator, List, Optional, Tuple
+from email.utils import formatdate
+import asyncio
 import os
+import time
+import uuid
 from datetime import datetime, date
 
 router = APIRouter()
-elevenlabs_service = ElevenLabsService()
+# Streaming relays ElevenLabs' streaming API directly; everything else goes through the router
+elevenlabs_service = tts_router.providers["elevenlabs"]
+media_storage = get_media_storage()
 
-@router.post("/generate-voice", response_model=VoiceGenerateResponse)
-async def generate_voice(
-    request: VoiceGenerateRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+async def store_audio(audio_data: bytes, audio_format: AudioFormat = DEFAULT_FORMAT) -> str:
+    """Publish a clip to the "audio" media namespace and return its /static/audio/ URL"""
+    filename = f"voice_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{audio_format.extension}"
+    await asyncio.to_thread(media_storage.save_bytes, "audio", audio_data, filename, audio_format.content_type)
+    return f"{AUDIO_URL_PREFIX}{filename}"
+
+def public_media_url(url: Optional[str]) -> Optional[str]:
+    """Stored URLs are relative; production clients on another origin need the backend URL"""
+    backend_url = os.getenv("BACKEND_URL", settings.BACKEND_URL)
+    if url and url.startswith("/") and backend_url and not backend_url.startswith("http://localhost"):
+        return f"{backend_url}{url}"
+    return url
+
+async def stream_and_record(
+    first_chunk: bytes, chunks: AsyncIterator[bytes], user_id: int, plan: str, text: str, word_count: int,
+    provider: str, latency_ms: int, audio_format: AudioFormat = DEFAULT_FORMAT
+) -> AsyncIterator[bytes]:
+    """
+    Relay audio chunks to the client, then store the clip and write history.
+    The words were reserved before the upstream stream was opened; they are
+    refunded if the stream fails or is abandoned before any audio was sent.
+    Runs after the request's DB session is closed, so history uses its own.
+    """
+    parts = []
+    try:
+        if first_chunk:
+            parts.append(first_chunk)
+            yield first_chunk
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+    except BaseException:
+        # Client gone or upstream failed; shielded so a cancelled response still refunds
+        if not parts:
+            await asyncio.shield(refund_plan_words(user_id, plan, word_count))
+        raise
+    finally:
+        await chunks.aclose()
+    if not parts:
+        await refund_plan_words(user_id, plan, word_count)
+        return
+    # The audio was delivered and stays charged; only the replay copy is lost if this fails
+    audio = b"".join(parts)
+    try:
+        audio_url = await store_audio(audio, audio_format)
+        await asyncio.to_thread(add_history, VoiceHistory(
+            user_id=user_id, text=text, audio_url=audio_url, provider=provider, latency_ms=latency_ms,
+            duration_seconds=audio_duration(audio)
+        ))
+    except Exception as e:
+        print(f"❌ Could not record streamed generation for user {user_id}: {e}", flush=True)
+
+def add_history(entry: VoiceHistory):
+    """Write a history row in a session of its own (for work that outlives the request's)"""
+    session = SessionLocal()
+    try:
+        session.add(entry)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def check_plan_limits(plan: str, tokens_used: int, word_count: int):
+    """Raise HTTPException when word_count more words would break the plan's limits"""
+    MAX_TOTAL_TOKENS = plan_token_limit(plan)
+    if plan == "Free":
+        # Free users: 150 words max per generation, 300 total tokens max
+        MAX_WORDS_PER_GENERATION = 150
+        
+        # Check word limit per generation
+        if word_count > MAX_WORDS_PER_GENERATION:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Text exceeds maximum word limit. Maximum {MAX_WORDS_PER_GENERATION} words allowed for free plan. Your text has {word_count} words."
+            )
+    # Lifetime allowance: 300 tokens on Free, 800 per person on paid plans
+    if tokens_used + word_count > MAX_TOTAL_TOKENS:
+        remaining = MAX_TOTAL_TOKENS - tokens_used
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Token limit reached. You have used {tokens_used}/{MAX_TOTAL_TOKENS} tokens. You can generate up to {remaining} more words."
+        )
+
+def enforce_plan_limits(current_user: User, text: str, db: Session) -> int:
+    """
+    Reset daily counters and check the user's plan limits for this text.
+    Returns the word count to charge; raises HTTPException when over a limit.
+    """
     # Reset daily counters if needed
     today = date.today()
     if current_user.last_reset_date != today:
@@ -28,125 +134,371 @@ async def generate_voice(
         db.commit()
 
     # Count words in the text (treat each word as 1 token)
-    word_count = len(request.text.split())
+    word_count = len(text.split())
     
-    # Enforce plan limits based on tokens/words
-    if current_user.plan == "Free":
-        # Free users: 150 words max per generation, 300 total tokens max
-        MAX_WORDS_PER_GENERATION = 150
-        MAX_TOTAL_TOKENS = 300
-        
-        # Check word limit per generation
-        if word_count > MAX_WORDS_PER_GENERATION:
+    if current_user.total_tokens_used is None:
+        current_user.total_tokens_used = 0
+    check_plan_limits(current_user.plan, current_user.total_tokens_used, word_count)
+    
+    return word_count
+
+async def reserve_plan_words(user_id: int, plan: str, word_count: int) -> WordUsage:
+    """
+    Charge the words before synthesis, atomically against the plan's limit, so
+    parallel requests can't overspend. Raises HTTPException (429) when they don't fit.
+    """
+    reserved, usage = await asyncio.to_thread(reserve_words, user_id, plan, word_count)
+    if not reserved:
+        # Spent elsewhere since the precheck; this raises with the real totals
+        check_plan_limits(plan, usage.tokens_used, word_count)
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Token limit reached.")
+    return usage
+
+async def refund_plan_words(user_id: int, plan: str, word_count: int) -> Optional[WordUsage]:
+    """Give back a reservation that produced no audio; a failed refund is logged, not raised"""
+    try:
+        return await asyncio.to_thread(refund_words, user_id, plan, word_count)
+    except Exception as e:
+        print(f"❌ Could not refund {word_count} words for user {user_id}: {e}", flush=True)
+        return None
+
+def resolve_voice(voice_id: Optional[str], plan: str) -> Optional[dict]:
+    """
+    Look the requested voice up in the voice catalog (no provider call).
+    Returns None when no voice was asked for; raises HTTPException for unknown
+    voices and for voices of a provider the plan can't use.
+    """
+    if not voice_id:
+        return None
+    voice = voice_catalog.get(voice_id)
+    if voice is None:
+        if voice_catalog.loading():
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Text exceeds maximum word limit. Maximum {MAX_WORDS_PER_GENERATION} words allowed for free plan. Your text has {word_count} words."
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The voice list is still loading. Please try again shortly."
             )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown voice_id '{voice_id}'. See /api/voices for the available voices."
+        )
+    if voice["provider"] not in {p.name for p in tts_router.candidates(plan)}:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Voice '{voice['name']}' is not available on your plan."
+        )
+    return voice
+
+def resolve_format(output_format: Optional[str]) -> AudioFormat:
+    """The requested output format; raises HTTPException for unsupported ones"""
+    try:
+        return parse_format(output_format)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.post("/generate-voice", response_model=VoiceGenerateResponse)
+async def generate_voice(
+    request: VoiceGenerateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    word_count = enforce_plan_limits(current_user, request.text, db)
+    voice = resolve_voice(request.voice_id, current_user.plan)
+    audio_format = resolve_format(request.output_format)
+    usage = await reserve_plan_words(current_user.id, current_user.plan, word_count)
+    
+    try:
+        # Generate voice on the healthiest provider, one sentence at a time (unchanged sentences come from cache),
+        # watermarked for trial users and in the requested format
+        audio_data, routed = await synthesize_in_format(
+            current_user.plan,
+            request.text,
+            audio_format,
+            voices={voice["provider"]: voice["id"]} if voice else None,
+            watermark=current_user.plan == "Free",
+        )
         
-        # Check total tokens used
-        if current_user.total_tokens_used is None:
-            current_user.total_tokens_used = 0
-        
-        if current_user.total_tokens_used + word_count > MAX_TOTAL_TOKENS:
-            remaining = MAX_TOTAL_TOKENS - current_user.total_tokens_used
+        # Persist the clip so history can replay it; the response only carries its URL
+        audio_url = await store_audio(audio_data, audio_format)
+        voice_entry = VoiceHistory(
+            user_id=current_user.id,
+            text=request.text,
+            audio_url=audio_url,
+            provider=routed.provider,
+            latency_ms=routed.latency_ms,
+            duration_seconds=audio_duration(audio_data)
+        )
+        db.add(voice_entry)
+        db.commit()
+    except Exception as e:
+        # Nothing was delivered, so the reserved words go back
+        db.rollback()
+        await refund_plan_words(current_user.id, current_user.plan, word_count)
+        if isinstance(e, DeadlineExceeded):
             raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Token limit reached. You have used {current_user.total_tokens_used}/{MAX_TOTAL_TOKENS} tokens. You can generate up to {remaining} more words."
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=str(e)
             )
+        if isinstance(e, CircuitOpenError):
+            raise  # 503 with Retry-After, see main.py
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Voice generation failed: {str(e)}"
+        )
+    
+    max_total_tokens = plan_token_limit(current_user.plan)
+    if current_user.plan == "Free":
+        message = "Voice generated successfully (Trial version with watermark)"
     else:
-        # Paid users: unlimited generations but max 800 tokens per person
-        MAX_TOTAL_TOKENS = 800
-        
-        # Check total tokens used
-        if current_user.total_tokens_used is None:
-            current_user.total_tokens_used = 0
-        
-        if current_user.total_tokens_used + word_count > MAX_TOTAL_TOKENS:
-            remaining = MAX_TOTAL_TOKENS - current_user.total_tokens_used
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Token limit reached. You have used {current_user.total_tokens_used}/{MAX_TOTAL_TOKENS} tokens. You can generate up to {remaining} more words."
-            )
+        message = "Voice generated successfully"
+    
+    return VoiceGenerateResponse(
+        success=True,
+        message=message,
+        audio_url=public_media_url(audio_url),
+        audio_format=audio_format.key,
+        duration_seconds=voice_entry.duration_seconds,
+        daily_count=usage.daily_voice_count,
+        limit_reached=usage.tokens_used >= max_total_tokens,
+        tokens_used=usage.tokens_used,
+        tokens_remaining=max_total_tokens - usage.tokens_used
+    )
+
+def resolve_streaming_format(output_format: Optional[str]) -> AudioFormat:
+    """Streams can't be transcoded, so only formats ElevenLabs streams natively are allowed"""
+    audio_format = resolve_format(output_format)
+    if audio_format not in NATIVE_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"output_format '{audio_format.key}' can't be streamed. Use /api/generate-voice for it."
+        )
+    return audio_format
+
+@router.post("/generate-voice/stream")
+async def generate_voice_stream(
+    request: VoiceGenerateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream audio to the client as the provider produces it (MP3 unless another
+    output_format is requested). Only formats ElevenLabs streams natively are
+    offered. The words are charged before the stream opens and refunded if no
+    audio was sent; history is written once the stream completes.
+    """
+    if current_user.plan == "Free":
+        # Trial audio must be watermarked and charged up front, which a relayed stream can't guarantee
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Streaming playback is available on paid plans. Please use /api/generate-voice."
+        )
+    word_count = enforce_plan_limits(current_user, request.text, db)
+    voice = resolve_voice(request.voice_id, current_user.plan)
+    if voice and voice["provider"] != elevenlabs_service.name:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Streaming is only available for ElevenLabs voices."
+        )
+    audio_format = resolve_streaming_format(request.output_format)
+    user_id, plan = current_user.id, current_user.plan
+    await reserve_plan_words(user_id, plan, word_count)
     
+    # Open the upstream stream before answering, so provider errors still get a proper status
+    started = time.perf_counter()
+    chunks = elevenlabs_service.stream_voice(
+        request.text, voice["id"] if voice else elevenlabs_service.default_voice, NATIVE_FORMATS[audio_format]
+    )
     try:
-        # Generate voice using ElevenLabs
-        audio_data = await elevenlabs_service.generate_voice(request.text)
-        
-        # Handle trial vs paid users
-        if current_user.plan == "Free":
-            # Add watermark for trial users
-            watermarked_audio = add_watermark_to_audio(audio_data)
-            
-            # Save to voice history (no permanent URL for trial)
-            voice_entry = VoiceHistory(
-                user_id=current_user.id,
-                text=request.text,
-                audio_url=None  # No permanent URL for trial users
-            )
-            db.add(voice_entry)
-            
-            # Update token usage
-            if current_user.total_tokens_used is None:
-                current_user.total_tokens_used = 0
-            current_user.total_tokens_used += word_count
-            
-            # Increment daily count
-            current_user.daily_voice_count += 1
-            db.commit()
-            
-            remaining_tokens = 300 - current_user.total_tokens_used
-            return VoiceGenerateResponse(
-                success=True,
-                message="Voice generated successfully (Trial version with watermark)",
-                audio_data=watermarked_audio,
-                audio_url=None,
-                daily_count=current_user.daily_voice_count,
-                limit_reached=current_user.total_tokens_used >= 300,
-                tokens_used=current_user.total_tokens_used,
-                tokens_remaining=remaining_tokens
-            )
-        else:
-            # Paid users get full quality without watermark
-            # In production, you'd save the audio file and return a URL
-            audio_base64 = audio_to_base64(audio_data)
-            
-            # Save to voice history with URL
-            voice_entry = VoiceHistory(
-                user_id=current_user.id,
-                text=request.text,
-                audio_url=None  # Will be set after commit
-            )
-            db.add(voice_entry)
-            
-            # Update token usage
-            if current_user.total_tokens_used is None:
-                current_user.total_tokens_used = 0
-            current_user.total_tokens_used += word_count
-            
-            db.commit()
-            db.refresh(voice_entry)
-            
-            # Update with actual URL
-            voice_entry.audio_url = f"generated_audio_{voice_entry.id}.mp3"  # In production, actual URL
-            db.commit()
-            
-            remaining_tokens = 800 - current_user.total_tokens_used
-            return VoiceGenerateResponse(
-                success=True,
-                message="Voice generated successfully",
-                audio_data=audio_base64,  # For immediate playback
-                audio_url=voice_entry.audio_url,
-                daily_count=current_user.daily_voice_count,
-                limit_reached=current_user.total_tokens_used >= 800,
-                tokens_used=current_user.total_tokens_used,
-                tokens_remaining=remaining_tokens
-            )
-            
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        first_chunk = b""
     except Exception as e:
+        await refund_plan_words(user_id, plan, word_count)
+        if isinstance(e, CircuitOpenError):
+            raise  # 503 with Retry-After, see main.py
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Voice generation failed: {str(e)}"
         )
+    # Streams record time to first audio
+    latency_ms = int((time.perf_counter() - started) * 1000)
+    
+    return StreamingResponse(
+        stream_and_record(
+            first_chunk, chunks, user_id, plan, request.text, word_count, elevenlabs_service.name, latency_ms,
+            audio_format
+        ),
+        media_type=audio_format.content_type,
+        headers={"Cache-Control": "no-store"},
+    )
+
+@router.post("/generate-voice/long")
+async def generate_voice_long(
+    request: VoiceGenerateRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Long-form narration (paid plans): the text is split into chunks that are
+    synthesized concurrently and streamed back in order as audio/mpeg.
+    The words are charged up front. If a chunk still fails after its retries
+    the stream stops, and the words are refunded when no audio was sent yet;
+    sending the same text again reuses every chunk that completed.
+    Chunks are joined at MP3 frame level, so only MP3 bitrates the provider
+    produces natively can be requested.
+    """
+    if current_user.plan == "Free":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Long-form narration is available on paid plans."
+        )
+    word_count = enforce_plan_limits(current_user, request.text, db)
+    voice = resolve_voice(request.voice_id, current_user.plan)
+    user_id = current_user.id
+    
+    plan = current_user.plan
+    audio_format = resolve_format(request.output_format)
+    
+    # Chunks are spliced into one stream, so the whole job stays on one provider (the voice's, if one was chosen):
+    # the healthiest configured one that produces the format
+    if voice:
+        candidates = [tts_router.providers[voice["provider"]]]
+    else:
+        candidates = tts_router.candidates(plan)
+    candidates = [p for p in candidates if p.configured]
+    if not candidates:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No voice provider is available right now. Please try again later."
+        )
+    usable = [p for p in candidates if p.supports_format(audio_format)]
+    if audio_format.codec != "mp3" or not usable:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Long-form narration can't be produced as '{audio_format.key}'. Use mp3 at a supported bitrate."
+        )
+    provider = usable[0]
+    await reserve_plan_words(user_id, plan, word_count)
+    started = time.perf_counter()
+    generate = routed_generate(plan, provider.name, voice["id"] if voice else None, audio_format)
+    chunks = synthesize_long_form(generate, request.text, user_id)
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        await refund_plan_words(user_id, plan, word_count)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Text is empty")
+    except Exception as e:
+        await refund_plan_words(user_id, plan, word_count)
+        if isinstance(e, DeadlineExceeded):
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+        if isinstance(e, CircuitOpenError):
+            raise  # 503 with Retry-After, see main.py
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Voice generation failed: {str(e)}"
+        )
+    
+    latency_ms = int((time.perf_counter() - started) * 1000)
+    
+    return StreamingResponse(
+        stream_and_record(
+            first_chunk, chunks, user_id, plan, request.text, word_count, provider.name, latency_ms, audio_format
+        ),
+        media_type=audio_format.content_type,
+        headers={"Cache-Control": "no-store"},
+    )
+
+async def start_batch(
+    entries: List[Tuple[str, Optional[str]]], voice_id: Optional[str], output_format: Optional[str],
+    current_user: User, db: Session
+) -> dict:
+    """Validate a batch, reserve all of its words at once and start it"""
+    if current_user.plan == "Free":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Batch jobs are available on paid plans."
+        )
+    if not entries:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The batch has no texts")
+    if len(entries) > settings.TTS_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can hold at most {settings.TTS_BATCH_MAX_ITEMS} texts. This one has {len(entries)}."
+        )
+    for index, (text, _) in enumerate(entries):
+        if not text.strip():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Text {index + 1} is empty")
+        if len(text) > settings.TTS_BATCH_MAX_ITEM_CHARS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Text {index + 1} is longer than {settings.TTS_BATCH_MAX_ITEM_CHARS} characters. Use /api/generate-voice/long for long texts."
+            )
+    word_count = enforce_plan_limits(current_user, " ".join(text for text, _ in entries), db)
+    voice = resolve_voice(voice_id, current_user.plan)
+    audio_format = resolve_format(output_format)
+    
+    # One reservation for the whole batch; words of items that fail are refunded when the job ends
+    await reserve_plan_words(current_user.id, current_user.plan, word_count)
+    job = tts_batches.start(current_user.id, current_user.plan, entries, voice, audio_format, word_count)
+    return job.snapshot()
+
+@router.post("/tts/batch", status_code=status.HTTP_202_ACCEPTED)
+async def create_tts_batch(
+    request: TTSBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Voice a list of short texts as one job (paid plans). Poll
+    /api/tts/batch/{job_id} for progress; the ZIP can be downloaded right away
+    and fills in as items finish.
+    """
+    names = request.names or []
+    if names and len(names) != len(request.texts):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="names must have one entry per text")
+    entries = [(text, names[i] if names else None) for i, text in enumerate(request.texts)]
+    return await start_batch(entries, request.voice_id, request.output_format, current_user, db)
+
+@router.post("/tts/batch/csv", status_code=status.HTTP_202_ACCEPTED)
+async def create_tts_batch_from_csv(
+    file: UploadFile = File(..., description="CSV with a text column (and optionally name), or one text per row"),
+    voice_id: Optional[str] = Form(None),
+    output_format: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Same as /api/tts/batch, with the texts uploaded as a CSV file"""
+    max_bytes = settings.TTS_BATCH_MAX_ITEMS * (settings.TTS_BATCH_MAX_ITEM_CHARS + 100) * 4
+    content = await file.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="CSV file is too large")
+    try:
+        entries = parse_csv(content)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not read CSV: {e}")
+    return await start_batch(entries, voice_id, output_format, current_user, db)
+
+@router.get("/tts/batch/{job_id}")
+async def get_tts_batch(job_id: str, current_user: User = Depends(get_current_user)):
+    """Progress of a batch job, per item"""
+    job = tts_batches.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch job not found")
+    return job.snapshot()
+
+@router.get("/tts/batch/{job_id}/zip")
+async def download_tts_batch(job_id: str, current_user: User = Depends(get_current_user)):
+    """The job's clips and a manifest.csv as a ZIP, streamed while the job is still running"""
+    job = tts_batches.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch job not found")
+    return StreamingResponse(
+        job.zip_stream(),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="tts_batch_{job.id[:8]}.zip"',
+            "Cache-Control": "no-store",
+        },
+    )
 
 @router.get("/history")
 async def get_voice_history(
@@ -160,12 +512,51 @@ async def get_voice_history(
         {
             "id": entry.id,
             "text": entry.text,
-            "audio_url": entry.audio_url,
+            "audio_url": public_media_url(entry.audio_url),
+            "provider": entry.provider,
+            "latency_ms": entry.latency_ms,
+            "duration_seconds": entry.duration_seconds,
             "created_at": entry.created_at
         }
         for entry in history
     ]
 
+@router.get("/voices")
+async def list_voices(request: Request, provider: Optional[str] = None):
+    """
+    Voices that can be passed as voice_id, served from the in-memory catalog.
+    Supports If-None-Match, so clients can poll cheaply.
+    """
+    if provider is not None and provider not in voice_catalog.providers:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown provider '{provider}'")
+    headers = {
+        "ETag": voice_catalog.etag,
+        "Last-Modified": formatdate(voice_catalog.updated_at, usegmt=True),
+        "Cache-Control": "public, max-age=300",
+    }
+    if http_cache.is_not_modified(request.headers, voice_catalog.etag, voice_catalog.updated_at):
+        return Response(status_code=304, headers=headers)
+    body = {
+        "voices": voice_catalog.voices(provider),
+        "defaults": {name: p.default_voice for name, p in tts_router.providers.items()},
+    }
+    return JSONResponse(body, headers=headers)
+
+@router.get("/tts/status")
+async def get_tts_status():
+    """Provider health, current TTS model choice, unavailable models, cache effectiveness and voice catalog"""
+    return {
+        "providers": tts_router.status(),
+        "models": elevenlabs_service.models.status(),
+        "cache": tts_cache.stats(),
+        "voices": voice_catalog.status(),
+    }
+
+@router.get("/tts/proxies")
+async def get_tts_proxies():
+    """Per-proxy health of the Lamonfox proxy pool: admission, success rate, RTT, ejections"""
+    return lamonfox_proxy_pool.stats()
+
 @router.get("/plan")
 async def get_plan_info(current_user: User = Depends(get_current_user)):
     """Get user's current plan information"""
@@ -0,0 +1,416 @@
+"""
+WebSocket TTS sessions for interactive use (/api/tts/ws).
+
+The client authenticates once, with its first message. After that, each
+synthesize message skips everything an HTTP request pays for: no JWT decode
+and no user lookup. Before synthesis, the words are reserved with a single
+conditional UPDATE, so the lifetime limit holds across parallel sessions and
+HTTP requests. The reservation is refunded if the request fails or is
+cancelled before any audio was sent; once audio has gone out it stays
+charged. Audio goes out on the same pooled upstream connections as the HTTP
+endpoints.
+
+Protocol (JSON text messages, audio as binary messages):
+  -> {"type": "auth", "token": "<JWT>"}
+  <- {"type": "ready", "user_id": ..., "quota": {...}}
+  -> {"type": "synthesize", "id": "<any>", "text": ..., "voice_id": null, "output_format": null, "stream": false}
+  <- {"type": "start", "id": ...}, binary audio messages, then
+     {"type": "done", "id": ..., "audio_url": ..., "provider": ..., "latency_ms": ...,
+      "duration_seconds": ...}
+     and {"type": "quota", ...}
+  <- {"type": "error", "id": ..., "status": 429, "detail": ...}  (nothing charged unless audio was sent)
+  -> {"type": "cancel", "id": ...}, {"type": "ping"} (<- {"type": "pong"})
+
+Requests are handled one at a time, in order; up to TTS_WS_MAX_PENDING more
+can wait. With "stream": true (paid plans), audio is relayed from ElevenLabs'
+streaming API as it is produced. Otherwise the text is synthesized through the router
+(sentence cache and failover, as in /api/generate-voice), and the clip is
+sent in TTS_WS_CHUNK_BYTES pieces. The session closes with code 4401 when the
+token expires, or after TTS_WS_IDLE_TIMEOUT_SECONDS without a message.
+"""
+import asyncio
+import time
+from collections import deque
+from datetime import date
+from typing import Deque, Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+
+from config import settings
+from database import SessionLocal
+from models import User, VoiceHistory
+from routes.tts import (
+    NATIVE_FORMATS,
+    add_history,
+    check_plan_limits,
+    elevenlabs_service,
+    plan_token_limit,
+    refund_plan_words,
+    reserve_plan_words,
+    resolve_format,
+    resolve_streaming_format,
+    resolve_voice,
+    store_audio,
+)
+from services.tts_providers import DeadlineExceeded
+from services.tts_synthesis import synthesize_in_format
+from services.word_quota import WordUsage, read_usage
+from utils import metrics
+from utils.audio_formats import AudioFormat
+from utils.circuit_breaker import CircuitOpenError
+from utils.jwt_handler import token_expiry, verify_token
+from utils.media_info import audio_duration
+
+router = APIRouter()
+
+metrics.describe("tts_ws_sessions", "Open WebSocket TTS sessions")
+metrics.describe("tts_ws_requests_total", "Synthesis requests over WebSocket sessions, by outcome")
+
+# Close codes in the application range (4000-4999)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_IDLE = 4408
+
+_open_sessions = 0
+
+
+class SynthesisRequest:
+    def __init__(self, request_id, text: str, voice_id: Optional[str], output_format: Optional[str], stream: bool):
+        self.id = request_id
+        self.text = text
+        self.voice_id = voice_id
+        self.output_format = output_format
+        self.stream = stream
+
+
+class TTSSession:
+    def __init__(self, websocket: WebSocket, user: User, expires_at: Optional[float]):
+        self.websocket = websocket
+        self.user_id = user.id
+        self.plan = user.plan
+        self.tokens_used = user.total_tokens_used or 0
+        self.daily_voice_count = user.daily_voice_count or 0
+        self.expires_at = expires_at
+        self.pending: Deque[SynthesisRequest] = deque()
+        self.wakeup = asyncio.Event()
+        self.current: Optional[SynthesisRequest] = None
+        self.current_task: Optional[asyncio.Task] = None
+        self.current_cancelled = False
+        self.audio_sent = False  # whether the current request has sent any audio yet
+        self._send_lock = asyncio.Lock()
+
+    # ---- sending ----
+
+    async def send_json(self, message: dict):
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def send_bytes(self, data: bytes):
+        async with self._send_lock:
+            await self.websocket.send_bytes(data)
+
+    async def send_error(self, request_id, status_code: int, detail: str, **extra):
+        await self.send_json({"type": "error", "id": request_id, "status": status_code, "detail": detail, **extra})
+
+    def quota(self) -> dict:
+        limit = plan_token_limit(self.plan)
+        return {
+            "plan": self.plan,
+            "tokens_used": self.tokens_used,
+            "tokens_remaining": max(0, limit - self.tokens_used),
+            "max_total_tokens": limit,
+            "daily_count": self.daily_voice_count,
+            "limit_reached": self.tokens_used >= limit,
+        }
+
+    # ---- receiving ----
+
+    async def receive_loop(self):
+        """Read client messages until the socket closes; synthesis runs in process_loop"""
+        while True:
+            timeout = settings.TTS_WS_IDLE_TIMEOUT_SECONDS
+            if self.expires_at is not None:
+                timeout = min(timeout, max(0.0, self.expires_at - time.time()))
+            try:
+                message = await asyncio.wait_for(self.websocket.receive_json(), timeout=timeout)
+            except asyncio.TimeoutError:
+                expired = self.expires_at is not None and time.time() >= self.expires_at
+                if not expired and (self.current is not None or self.pending):
+                    continue  # a long clip is still going out; only an idle session times out
+                reason = "Token expired, reconnect with a fresh token" if expired else "Idle timeout"
+                await self.websocket.close(code=CLOSE_UNAUTHORIZED if expired else CLOSE_IDLE, reason=reason)
+                return
+            except (ValueError, KeyError):
+                # KeyError: a binary message where a text one was expected
+                await self.send_error(None, status.HTTP_400_BAD_REQUEST, "Messages must be JSON text")
+                continue
+            if not isinstance(message, dict):
+                await self.send_error(None, status.HTTP_400_BAD_REQUEST, "Messages must be JSON objects")
+                continue
+            kind = message.get("type")
+            if kind == "synthesize":
+                await self.enqueue(message)
+            elif kind == "cancel":
+                self.cancel(message.get("id"))
+            elif kind == "ping":
+                await self.send_json({"type": "pong"})
+            else:
+                await self.send_error(message.get("id"), status.HTTP_400_BAD_REQUEST, f"Unknown message type '{kind}'")
+
+    async def enqueue(self, message: dict):
+        text = message.get("text")
+        if not isinstance(text, str) or not text.strip():
+            await self.send_error(message.get("id"), status.HTTP_400_BAD_REQUEST, "Text is empty")
+            return
+        if len(self.pending) >= settings.TTS_WS_MAX_PENDING:
+            await self.send_error(
+                message.get("id"), status.HTTP_429_TOO_MANY_REQUESTS,
+                f"Too many queued requests (max {settings.TTS_WS_MAX_PENDING}). Wait for one to finish or cancel it."
+            )
+            return
+        self.pending.append(SynthesisRequest(
+            message.get("id"), text, message.get("voice_id"), message.get("output_format"), bool(message.get("stream"))
+        ))
+        self.wakeup.set()
+
+    def cancel(self, request_id):
+        """Drop a queued request, or stop the one in progress (refunded unless audio was already sent)"""
+        for request in list(self.pending):
+            if request.id == request_id:
+                self.pending.remove(request)
+        if self.current is not None and self.current.id == request_id and self.current_task is not None:
+            self.current_cancelled = True
+            self.current_task.cancel()
+
+    # ---- synthesis ----
+
+    async def process_loop(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.pending:
+                self.current = self.pending.popleft()
+                self.current_cancelled = False
+                self.audio_sent = False
+                self.current_task = asyncio.create_task(self.handle(self.current))
+                try:
+                    await self.current_task
+                except asyncio.CancelledError:
+                    if not self.current_cancelled:
+                        raise  # the session itself is being torn down
+                    metrics.inc("tts_ws_requests_total", outcome="cancelled")
+                    await self.send_error(self.current.id, 499, "Cancelled")
+                finally:
+                    self.current = None
+                    self.current_task = None
+
+    async def check_limits(self, text: str) -> int:
+        """
+        Reserve the text's words against the user's plan (one conditional
+        UPDATE, which also counts the clip for the day), so parallel sessions
+        can't overspend. Returns the word count; raises HTTPException when over
+        a limit.
+        """
+        word_count = len(text.split())
+        # Cheap check against the session's counters first (also the per-generation limit)
+        check_plan_limits(self.plan, self.tokens_used, word_count)
+        try:
+            self.update_counters(await reserve_plan_words(self.user_id, self.plan, word_count))
+        except HTTPException:
+            # The user may be generating over HTTP or in other sessions too; show the real totals next time
+            self.update_counters(await asyncio.to_thread(read_usage, self.user_id))
+            raise
+        return word_count
+
+    async def release(self, word_count: int):
+        """Refund the current request's reservation if it sent no audio"""
+        if word_count and not self.audio_sent:
+            usage = await refund_plan_words(self.user_id, self.plan, word_count)
+            if usage is not None:
+                self.update_counters(usage)
+
+    def update_counters(self, usage: WordUsage):
+        self.tokens_used = usage.tokens_used
+        self.daily_voice_count = usage.daily_voice_count
+
+    async def handle(self, request: SynthesisRequest):
+        word_count = 0
+        try:
+            if request.stream and self.plan == "Free":
+                # Trial audio is watermarked whole, which a relayed stream can't guarantee
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Streaming playback is available on paid plans. Send the request without \"stream\"."
+                )
+            voice = resolve_voice(request.voice_id, self.plan)
+            if request.stream and voice and voice["provider"] != elevenlabs_service.name:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Streaming is only available for ElevenLabs voices."
+                )
+            if request.stream:
+                audio_format = resolve_streaming_format(request.output_format)
+            else:
+                audio_format = resolve_format(request.output_format)
+            word_count = await self.check_limits(request.text)
+            started = time.perf_counter()
+            if request.stream:
+                audio, provider, latency_ms = await self.relay_stream(request, voice, audio_format)
+            else:
+                audio, provider, latency_ms = await self.send_routed(request, voice, audio_format)
+        except asyncio.CancelledError:
+            await self.release(word_count)
+            raise
+        except HTTPException as e:
+            metrics.inc("tts_ws_requests_total", outcome="rejected")
+            await self.send_error(request.id, e.status_code, e.detail)
+            return
+        except CircuitOpenError as e:
+            await self.release(word_count)
+            metrics.inc("tts_ws_requests_total", outcome="failed")
+            await self.send_error(request.id, status.HTTP_503_SERVICE_UNAVAILABLE, str(e), retry_after=int(e.retry_after + 0.999))
+            return
+        except DeadlineExceeded as e:
+            await self.release(word_count)
+            metrics.inc("tts_ws_requests_total", outcome="failed")
+            await self.send_error(request.id, status.HTTP_504_GATEWAY_TIMEOUT, str(e))
+            return
+        except WebSocketDisconnect:
+            await self.release(word_count)
+            raise
+        except Exception as e:
+            await self.release(word_count)
+            metrics.inc("tts_ws_requests_total", outcome="failed")
+            await self.send_error(request.id, status.HTTP_500_INTERNAL_SERVER_ERROR, f"Voice generation failed: {str(e)}")
+            return
+
+        duration_seconds = audio_duration(audio)
+        audio_url = await self.record(request.text, audio, audio_format, duration_seconds, provider, latency_ms)
+        metrics.inc("tts_ws_requests_total", outcome="success")
+        await self.send_json({
+            "type": "done",
+            "id": request.id,
+            "audio_url": audio_url,
+            "audio_format": audio_format.key,
+            "provider": provider,
+            "latency_ms": latency_ms,
+            "bytes": len(audio),
+            "duration_seconds": duration_seconds,
+            "total_ms": int((time.perf_counter() - started) * 1000),
+        })
+        await self.send_json({"type": "quota", **self.quota()})
+
+    async def relay_stream(self, request: SynthesisRequest, voice: Optional[dict], audio_format: AudioFormat):
+        """Relay ElevenLabs' stream; returns (whole clip, provider, ms to first audio)"""
+        started = time.perf_counter()
+        chunks = elevenlabs_service.stream_voice(
+            request.text, voice["id"] if voice else elevenlabs_service.default_voice, NATIVE_FORMATS[audio_format]
+        )
+        try:
+            try:
+                first_chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                first_chunk = b""
+            latency_ms = int((time.perf_counter() - started) * 1000)
+            await self.send_json({"type": "start", "id": request.id, "content_type": audio_format.content_type})
+            parts = [first_chunk]
+            self.audio_sent = True
+            await self.send_bytes(first_chunk)
+            async for chunk in chunks:
+                parts.append(chunk)
+                await self.send_bytes(chunk)
+        finally:
+            # Stops the upstream stream when the request is cancelled part-way
+            await chunks.aclose()
+        return b"".join(parts), elevenlabs_service.name, latency_ms
+
+    async def send_routed(self, request: SynthesisRequest, voice: Optional[dict], audio_format: AudioFormat):
+        """Synthesize through the router, then send the clip; returns (clip, provider, latency)"""
+        audio, routed = await synthesize_in_format(
+            self.plan,
+            request.text,
+            audio_format,
+            voices={voice["provider"]: voice["id"]} if voice else None,
+            watermark=self.plan == "Free",
+        )
+        await self.send_json({"type": "start", "id": request.id, "content_type": audio_format.content_type})
+        view = memoryview(audio)
+        self.audio_sent = True
+        for offset in range(0, len(audio), settings.TTS_WS_CHUNK_BYTES):
+            await self.send_bytes(bytes(view[offset:offset + settings.TTS_WS_CHUNK_BYTES]))
+        return audio, routed.provider, routed.latency_ms
+
+    async def record(
+        self, text: str, audio: bytes, audio_format: AudioFormat, duration_seconds: Optional[float],
+        provider: str, latency_ms: Optional[int]
+    ) -> Optional[str]:
+        """Store the clip and write history (the words were charged by check_limits)"""
+        try:
+            audio_url = await store_audio(audio, audio_format)
+            await asyncio.to_thread(add_history, VoiceHistory(
+                user_id=self.user_id, text=text, audio_url=audio_url, provider=provider, latency_ms=latency_ms,
+                duration_seconds=duration_seconds
+            ))
+            return audio_url
+        except Exception as e:
+            print(f"❌ Could not record WebSocket generation for user {self.user_id}: {e}", flush=True)
+            return None
+
+
+async def authenticate(websocket: WebSocket) -> Optional[TTSSession]:
+    """Wait for the auth message; closes the socket and returns None when it isn't valid"""
+    try:
+        message = await asyncio.wait_for(websocket.receive_json(), timeout=settings.TTS_WS_AUTH_TIMEOUT_SECONDS)
+    except (asyncio.TimeoutError, ValueError, KeyError):
+        await websocket.close(code=CLOSE_UNAUTHORIZED, reason="Send {\"type\": \"auth\", \"token\": ...} first")
+        return None
+    token = message.get("token") if isinstance(message, dict) and message.get("type") == "auth" else None
+    email = verify_token(token) if token else None
+    if email is None:
+        await websocket.close(code=CLOSE_UNAUTHORIZED, reason="Could not validate credentials")
+        return None
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email).first()
+        if user is None:
+            await websocket.close(code=CLOSE_UNAUTHORIZED, reason="Could not validate credentials")
+            return None
+        if user.last_reset_date != date.today():
+            user.daily_voice_count = 0
+            user.daily_video_count = 0
+            user.last_reset_date = date.today()
+            db.commit()
+        return TTSSession(websocket, user, token_expiry(token))
+    finally:
+        db.close()
+
+
+@router.websocket("/tts/ws")
+async def tts_websocket(websocket: WebSocket):
+    global _open_sessions
+    await websocket.accept()
+    session = await authenticate(websocket)
+    if session is None:
+        return
+
+    _open_sessions += 1
+    metrics.set_gauge("tts_ws_sessions", _open_sessions)
+    print(f"🔌 WebSocket TTS session opened for user {session.user_id}", flush=True)
+    tasks = []
+    try:
+        await session.send_json({"type": "ready", "user_id": session.user_id, "quota": session.quota()})
+        tasks = [asyncio.create_task(session.receive_loop()), asyncio.create_task(session.process_loop())]
+        # Either side ending (client gone, send failed, timeout) ends the session
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and not isinstance(task.exception(), (WebSocketDisconnect, type(None))):
+                print(f"⚠️ WebSocket TTS session for user {session.user_id} failed: {task.exception()}", flush=True)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _open_sessions -= 1
+        metrics.set_gauge("tts_ws_sessions", _open_sessions)
+        print(f"🔌 WebSocket TTS session closed for user {session.user_id}", flush=True)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -2,6 +2,7 @@ from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, s
 from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import asyncio
 import os
 import uuid
 import io
@@ -10,6 +11,9 @@ from database import get_db
 from models import GeneratedVideo
 from models import User as UserModel
 from routes.auth import get_current_user
+from services.media_storage import MEDIA_DIRS, PARTIAL_PREFIX, get_media_storage
+from utils import offload
+from utils.media_info import mp4_info
 from sqlalchemy import and_
 
 # Fix for Pillow 10.0.0+ compatibility with MoviePy
@@ -42,12 +46,81 @@ except Exception as e:
 from moviepy.editor import ImageClip, concatenate_videoclips, CompositeVideoClip, ColorClip, vfx
 
 router = APIRouter()
+media_storage = get_media_storage()
 
-# Simple: Save videos to disk (Railway allows writes to app directory)
-videos_dir = os.path.join(os.path.dirname(__file__), "..", "generated_videos")
+# Encodes always happen on local disk; finished videos are handed to the media storage
+# backend (local disk or S3-compatible, see services/media_storage.py)
+videos_dir = MEDIA_DIRS["videos"]
 os.makedirs(videos_dir, exist_ok=True)
 print(f"📁 Video storage directory: {os.path.abspath(videos_dir)}", flush=True)
 
+# Uploaded images only live here for the duration of one request
+# Use app directory for tmp_uploads (writable location on Railway)
+tmp_uploads_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tmp_uploads"))
+os.makedirs(tmp_uploads_dir, exist_ok=True)
+
+# In-progress encodes live next to the published videos under this prefix so the
+# final os.replace() is an atomic rename; serve_video refuses to serve them.
+PARTIAL_VIDEO_PREFIX = PARTIAL_PREFIX
+# Enough of the file to check the leading ftyp box without reading the whole video
+VIDEO_HEADER_PROBE_BYTES = 4096
+
+
+def _probe_image_sizes(paths: List[str]) -> List[tuple]:
+    """(width, height) of each uploaded image (blocking - decodes the images)"""
+    sizes = []
+    for path in paths:
+        clip_temp = ImageClip(path)
+        sizes.append(clip_temp.size)
+        clip_temp.close()  # Close temporary clip
+    return sizes
+
+
+def _build_clip(idx: int, path: str, W: int, H: int, dur: int):
+    """Load one image as a clip filling the W x H canvas (blocking - decodes and resizes)"""
+    print(f"📂 Loading image from: {path}", flush=True)
+    print(f"📂 File exists: {os.path.exists(path)}, size: {os.path.getsize(path) if os.path.exists(path) else 0} bytes", flush=True)
+
+    # Load image clip
+    try:
+        clip = ImageClip(path)
+        iw, ih = clip.size
+        print(f"📷 Image {idx+1} loaded - original size: {iw}x{ih}", flush=True)
+    except Exception as e:
+        print(f"❌ Failed to load image {idx+1}: {e}", flush=True)
+        raise HTTPException(status_code=500, detail=f"Failed to load image {idx+1}: {str(e)}")
+
+    # Calculate scale to fill canvas
+    scale = max(W / iw, H / ih)
+    new_w, new_h = int(iw * scale), int(ih * scale)
+    print(f"🔍 Scale: {scale:.2f}, scaled size: {new_w}x{new_h}", flush=True)
+
+    # Resize image to EXACTLY match canvas size (fill canvas completely)
+    clip = clip.resize((W, H))
+    print(f"✅ Image {idx+1} resized to canvas size: {W}x{H}", flush=True)
+
+    # Set duration and FPS - CRITICAL for ImageClip to work as video
+    clip = clip.set_duration(dur)
+    clip = clip.set_fps(24)
+
+    # Use the clip directly - no composite needed if image fills canvas
+    final_clip = clip
+
+    print(f"✅ Clip {idx+1} created - size: {final_clip.size}, duration: {final_clip.duration}s", flush=True)
+
+    # Verify frame has content
+    try:
+        frame = final_clip.get_frame(0.5)
+        non_black = (frame > 10).sum()  # Count non-black pixels
+        print(f"✅ Clip {idx+1} frame - shape: {frame.shape}, non-black pixels: {non_black}", flush=True)
+        print(f"   Frame stats - min: {frame.min()}, max: {frame.max()}, mean: {frame.mean():.1f}", flush=True)
+        if non_black < 1000:
+            print(f"⚠️ WARNING: Clip {idx+1} might be empty! non-black pixels: {non_black}", flush=True)
+    except Exception as e:
+        print(f"⚠️ Could not verify clip {idx+1}: {e}", flush=True)
+
+    return final_clip
+
 
 @router.post("/slideshow")
 async def create_slideshow_video(
@@ -69,10 +142,7 @@ async def create_slideshow_video(
             raise HTTPException(status_code=400, detail="Please upload 2 to 4 images.")
 
         # Validate formats and persist temporarily
-        # Use app directory for tmp_uploads (writable location on Railway)
-        temp_dir = os.path.join(os.path.dirname(__file__), "..", "tmp_uploads")
-        temp_dir = os.path.abspath(temp_dir)
-        os.makedirs(temp_dir, exist_ok=True)
+        temp_dir = tmp_uploads_dir
 
         saved_paths: List[str] = []
         try:
@@ -91,13 +161,9 @@ async def create_slideshow_video(
 
             # Step 1: Determine dynamic canvas size based on all uploaded images
             # Get maximum width and height from all images
-            max_w, max_h = 0, 0
-            for path in saved_paths:
-                clip_temp = ImageClip(path)
-                iw, ih = clip_temp.size
-                max_w = max(max_w, iw)
-                max_h = max(max_h, ih)
-                clip_temp.close()  # Close temporary clip
+            sizes = await offload.run_in_thread("image_probe", _probe_image_sizes, saved_paths)
+            max_w = max(iw for iw, _ in sizes)
+            max_h = max(ih for _, ih in sizes)
             
             # Canvas size is the maximum dimensions from all images
             W = max_w
@@ -126,48 +192,7 @@ async def create_slideshow_video(
             print(f"🎬 Slide effect: {slide_effect}, Transition: {transition}", flush=True)
 
             for idx, path in enumerate(saved_paths):
-                print(f"📂 Loading image from: {path}", flush=True)
-                print(f"📂 File exists: {os.path.exists(path)}, size: {os.path.getsize(path) if os.path.exists(path) else 0} bytes", flush=True)
-                
-                # Load image clip
-                try:
-                    clip = ImageClip(path)
-                    iw, ih = clip.size
-                    print(f"📷 Image {idx+1} loaded - original size: {iw}x{ih}", flush=True)
-                except Exception as e:
-                    print(f"❌ Failed to load image {idx+1}: {e}", flush=True)
-                    raise HTTPException(status_code=500, detail=f"Failed to load image {idx+1}: {str(e)}")
-
-                # Calculate scale to fill canvas
-                scale = max(W / iw, H / ih)
-                new_w, new_h = int(iw * scale), int(ih * scale)
-                print(f"🔍 Scale: {scale:.2f}, scaled size: {new_w}x{new_h}", flush=True)
-                
-                # Resize image to EXACTLY match canvas size (fill canvas completely)
-                clip = clip.resize((W, H))
-                print(f"✅ Image {idx+1} resized to canvas size: {W}x{H}", flush=True)
-                
-                # Set duration and FPS - CRITICAL for ImageClip to work as video
-                clip = clip.set_duration(dur)
-                clip = clip.set_fps(24)
-                
-                # Use the clip directly - no composite needed if image fills canvas
-                final_clip = clip
-                
-                print(f"✅ Clip {idx+1} created - size: {final_clip.size}, duration: {final_clip.duration}s", flush=True)
-                
-                # Verify frame has content
-                try:
-                    frame = final_clip.get_frame(0.5)
-                    non_black = (frame > 10).sum()  # Count non-black pixels
-                    print(f"✅ Clip {idx+1} frame - shape: {frame.shape}, non-black pixels: {non_black}", flush=True)
-                    print(f"   Frame stats - min: {frame.min()}, max: {frame.max()}, mean: {frame.mean():.1f}", flush=True)
-                    if non_black < 1000:
-                        print(f"⚠️ WARNING: Clip {idx+1} might be empty! non-black pixels: {non_black}", flush=True)
-                except Exception as e:
-                    print(f"⚠️ Could not verify clip {idx+1}: {e}", flush=True)
-
-                clips.append(final_clip)
+                clips.append(await offload.run_in_thread("image_clip", _build_clip, idx, path, W, H, dur))
 
             # Apply transitions between clips
             if len(clips) > 1:
@@ -191,7 +216,7 @@ async def create_slideshow_video(
             # Verify final video has content before writing
             print(f"🎬 Final video: size={final.size}, duration={final.duration}s, fps={final.fps}", flush=True)
             try:
-                test_frame = final.get_frame(0.5)
+                test_frame = await offload.run_in_thread("video_frame_check", final.get_frame, 0.5)
                 print(f"✅ Final video verified - frame shape: {test_frame.shape}, non-zero pixels: {(test_frame > 0).sum()}", flush=True)
                 if (test_frame > 0).sum() == 0:
                     print(f"⚠️ WARNING: Frame appears to be all black! This might indicate an issue with image composition.", flush=True)
@@ -203,22 +228,22 @@ async def create_slideshow_video(
                 final = final.set_fps(24)
                 print(f"✅ Set FPS to 24", flush=True)
             
-            # Generate video in memory buffer for streaming (works with Railway's ephemeral storage)
-            print(f"🎬 Generating video in memory for streaming...", flush=True)
+            # Encode straight into a hidden temp file inside videos_dir, then publish it
+            # with an atomic rename. The video is never held in memory, and a crash
+            # mid-encode can never leave a truncated file under its public name.
+            filename = f"slideshow_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}.mp4"
+            # Keep the .mp4 suffix - ffmpeg picks the container format from it
+            partial_path = os.path.join(videos_dir, f"{PARTIAL_VIDEO_PREFIX}{uuid.uuid4().hex}.mp4")
+            print(f"🎬 Encoding video to: {partial_path}", flush=True)
             print(f"📊 Final video: size={final.size}, duration={final.duration}s", flush=True)
             
             try:
-                # Create a temporary file path for MoviePy to write to
-                # Use tempfile for better cross-platform support
-                import tempfile
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-                temp_path = temp_file.name
-                temp_file.close()
-                
-                # Write video to temporary file with browser-compatible settings
+                # Write video with browser-compatible settings
                 # Use H.264 codec with baseline profile for maximum browser support
-                final.write_videofile(
-                    temp_path,
+                await offload.run_in_thread(
+                    "video_render",
+                    final.write_videofile,
+                    partial_path,
                     fps=24,
                     codec="libx264",
                     preset="medium",  # Use medium preset for better compatibility
@@ -238,70 +263,69 @@ async def create_slideshow_video(
                     ],
                 )
                 
-                # Read the video file into memory
-                with open(temp_path, 'rb') as video_file:
-                    video_bytes = video_file.read()
-                
-                # Validate video file format (check for MP4 header)
-                if len(video_bytes) < 8:
-                    print(f"❌ ERROR: Video file is too small ({len(video_bytes)} bytes)", flush=True)
+                # Validate using the file size and the first bytes only
+                file_size = os.path.getsize(partial_path)
+                if file_size < 1000:
+                    print(f"❌ ERROR: Video file is too small ({file_size} bytes) - file is corrupted!", flush=True)
                     raise HTTPException(status_code=500, detail="Video file is corrupted or empty")
                 
                 # Check if it's a valid MP4 file (should start with ftyp box)
                 # MP4 files start with 4-byte size, then 'ftyp', then brand
-                mp4_signature = video_bytes[4:8] if len(video_bytes) >= 8 else b''
+                with open(partial_path, 'rb') as video_file:
+                    header = video_file.read(VIDEO_HEADER_PROBE_BYTES)
+                mp4_signature = header[4:8]
                 if mp4_signature != b'ftyp':
                     print(f"⚠️ WARNING: Video file may not be valid MP4 (signature: {mp4_signature})", flush=True)
                     # Still continue - some MP4s have different structure
-                
-                file_size = len(video_bytes)
+                else:
+                    print(f"✅ Video format check: MP4 signature found", flush=True)
                 print(f"✅ Video generated - size: {file_size} bytes ({file_size / 1024 / 1024:.2f} MB)", flush=True)
-                print(f"✅ Video format check: MP4 signature found", flush=True)
-                
-                if file_size < 1000:
-                    print(f"❌ ERROR: Video file is too small ({file_size} bytes) - file is corrupted!", flush=True)
-                    raise HTTPException(status_code=500, detail="Video file is corrupted or empty")
+                # Length straight from the moov/mvhd box, before the file is published
+                video_info = mp4_info(partial_path)
                 
-                # Clean up temporary file AFTER validation
-                try:
-                    os.remove(temp_path)
-                except Exception:
-                    pass
+                # Publish: an atomic rename for local storage, an upload for S3
+                await asyncio.to_thread(media_storage.save_file, "videos", partial_path, filename, "video/mp4")
+                print(f"✅ Video stored ({media_storage.name}): {filename} ({file_size} bytes)", flush=True)
                     
             except Exception as e:
+                # Never leave a half-written file behind
+                try:
+                    os.remove(partial_path)
+                except OSError:
+                    pass
+                if isinstance(e, HTTPException):
+                    raise
                 print(f"❌ Failed to generate video: {e}", flush=True)
                 import traceback
                 traceback.print_exc()
                 raise HTTPException(status_code=500, detail=f"Failed to generate video: {str(e)}")
-            
-            # Clean up clips to free memory
-            try:
-                final.close()
-                for c in clips:
-                    c.close()
-            except Exception:
-                pass
-
-            # Generate a unique filename for the video
-            filename = f"slideshow_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}.mp4"
-            
-            # Save video to disk (SIMPLE - no cache, just disk)
-            disk_path = os.path.join(videos_dir, filename)
-            try:
-                with open(disk_path, 'wb') as f:
-                    f.write(video_bytes)
-                print(f"✅ Video saved to disk: {disk_path} ({len(video_bytes)} bytes)", flush=True)
-            except Exception as disk_error:
-                print(f"❌ Could not save video to disk: {disk_error}", flush=True)
-                raise HTTPException(status_code=500, detail=f"Failed to save video: {str(disk_error)}")
+            finally:
+                # Clean up clips to free memory
+                try:
+                    final.close()
+                    for c in clips:
+                        c.close()
+                except Exception:
+                    pass
             
             # Persist GeneratedVideo record
             try:
-                gv = GeneratedVideo(user_id=current_user.id, video_url=f"/static/videos/{filename}")
+                gv = GeneratedVideo(
+                    user_id=current_user.id,
+                    video_url=f"/static/videos/{filename}",
+                    duration_seconds=video_info.duration_seconds if video_info else None,
+                )
                 db.add(gv)
                 db.commit()
-            except Exception:
+            except Exception as e:
+                # Without its row the orphan sweep would delete the file, so don't hand out its URL
                 db.rollback()
+                print(f"❌ Could not record video {filename}, removing it: {e}", flush=True)
+                try:
+                    await asyncio.to_thread(media_storage.delete, "videos", filename)
+                except Exception as cleanup_error:
+                    print(f"⚠️ Could not remove unrecorded video {filename}: {cleanup_error}", flush=True)
+                raise HTTPException(status_code=500, detail="Failed to save the generated video. Please try again.")
 
             # Return simple static URL
             from config import settings
@@ -318,6 +342,7 @@ async def create_slideshow_video(
                 "success": True,
                 "message": "Slideshow video generated successfully.",
                 "video_url": video_url,
+                "duration_seconds": video_info.duration_seconds if video_info else None,
             }
         finally:
             # Cleanup temporary files
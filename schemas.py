@@ -52,17 +52,27 @@ class TokenData(BaseModel):
 # =======================
 class VoiceGenerateRequest(BaseModel):
     text: str
+    voice_id: Optional[str] = None  # from GET /api/voices; None = the provider's default voice
+    output_format: Optional[str] = None  # "mp3" (default), "opus" or "aac", optionally with kbps: "opus_32"
 
 class VoiceGenerateResponse(BaseModel):
     success: bool
     message: str
-    audio_data: Optional[str] = None  # Base64 encoded audio for trial users
-    audio_url: Optional[str] = None   # URL for paid users
+    audio_data: Optional[str] = None  # Deprecated: audio is no longer inlined as base64
+    audio_url: Optional[str] = None   # Stored audio, served from /static/audio/
+    audio_format: Optional[str] = None  # Format of the stored audio, e.g. "mp3" or "opus_32"
+    duration_seconds: Optional[float] = None
     daily_count: int
     limit_reached: bool = False
     tokens_used: Optional[int] = None
     tokens_remaining: Optional[int] = None
 
+class TTSBatchRequest(BaseModel):
+    texts: List[str]
+    names: Optional[List[str]] = None  # Optional clip names, one per text
+    voice_id: Optional[str] = None
+    output_format: Optional[str] = None  # As in VoiceGenerateRequest
+
 
 # =======================
 # Payment Schemas
@@ -89,6 +99,7 @@ class VoiceHistoryResponse(BaseModel):
     id: int
     text: str
     audio_url: Optional[str]
+    duration_seconds: Optional[float] = None
     created_at: datetime
 
     class Config:
@@ -0,0 +1,69 @@
+"""
+Cached conversion of synthesized MP3 into the output format a client asked for.
+
+Only used when no provider could produce the format natively (see
+services/tts_synthesis.synthesize_in_format). Results go into the TTS cache
+under (SHA-256 of the source audio, target format), so replaying, re-sharing
+or re-requesting a clip in the same format never runs ffmpeg twice.
+"""
+import hashlib
+import subprocess
+
+from config import settings
+from services.tts_cache import tts_cache
+from utils import metrics, offload
+from utils.audio_formats import AudioFormat
+from utils.audio_utils import ffmpeg_binary
+
+metrics.describe("audio_transcodes_total", "Output format conversions by target format and result (cached, transcoded)")
+
+# ffmpeg (encoder, container) per codec
+_ENCODERS = {
+    "mp3": ("libmp3lame", "mp3"),
+    "opus": ("libopus", "ogg"),
+    "aac": ("aac", "adts"),
+}
+
+
+class TranscodeError(Exception):
+    """ffmpeg could not convert the audio"""
+
+
+def transcode_key(source: bytes, target: AudioFormat) -> str:
+    source_hash = hashlib.sha256(source).hexdigest()
+    return hashlib.sha256(f"transcode:{source_hash}:{target.codec}_{target.target_bitrate}".encode()).hexdigest()
+
+
+def _transcode(audio: bytes, target: AudioFormat) -> bytes:
+    """Blocking ffmpeg run over pipes; no temp files"""
+    encoder, container = _ENCODERS[target.codec]
+    command = [
+        ffmpeg_binary or "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0", "-vn", "-map_metadata", "-1",
+        "-c:a", encoder, "-b:a", f"{target.target_bitrate}k", "-f", container, "pipe:1",
+    ]
+    try:
+        result = subprocess.run(command, input=audio, capture_output=True, timeout=settings.AUDIO_TRANSCODE_TIMEOUT_SECONDS)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise TranscodeError(f"Could not convert audio to {target.key}: {e}")
+    if result.returncode != 0 or not result.stdout:
+        raise TranscodeError(f"Could not convert audio to {target.key}: {result.stderr.decode('utf-8', 'replace')[-300:]}")
+    return result.stdout
+
+
+async def convert(audio: bytes, source: AudioFormat, target: AudioFormat) -> bytes:
+    """audio (in source format) as target; a no-op when they already match"""
+    if source == target or (target.bitrate is None and source.codec == target.codec):
+        return audio
+    key = transcode_key(audio, target)
+    if settings.TTS_CACHE_ENABLED:
+        cached = await tts_cache.get(key)
+        if cached is not None:
+            metrics.inc("audio_transcodes_total", target=target.key, result="cached")
+            return cached
+    converted = await offload.run_in_thread("audio_transcode", _transcode, audio, target)
+    metrics.inc("audio_transcodes_total", target=target.key, result="transcoded")
+    print(f"🎚️ Transcoded {len(audio)} bytes of {source.key} to {len(converted)} bytes of {target.key}", flush=True)
+    if settings.TTS_CACHE_ENABLED:
+        await tts_cache.put(key, converted)
+    return converted
@@ -2,6 +2,8 @@ import httpx
 import os
 from dotenv import load_dotenv
 from config import settings
+from services.http_clients import get_client
+from utils.circuit_breaker import CircuitOpenError
 
 load_dotenv()
 
@@ -91,13 +93,15 @@ class ClaidService:
         """
         url = f"{self.base_url}/image/{image_id}/status"
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=self.headers)
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                print(f"Error getting image status: {e}")
-                return {"status": "failed"}
+        client = get_client("claid")
+        try:
+            response = await client.get(url, headers=self.headers)
+            response.raise_for_status()
+            return response.json()
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            print(f"Error getting image status: {e}")
+            return {"status": "failed"}
 
 
@@ -3,6 +3,8 @@ import uuid
 import os
 from dotenv import load_dotenv
 from config import settings
+from services.http_clients import get_client
+from utils.circuit_breaker import CircuitOpenError
 
 load_dotenv()
 
@@ -47,49 +49,54 @@ class EasypaisaService:
             }
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/api/v1/payments",
-                    json=data,
-                    headers=self.headers
-                )
-                response.raise_for_status()
-                result = response.json()
-                
-                return {
-                    "success": True,
-                    "payment_url": result.get("payment_url"),
-                    "transaction_id": transaction_id
-                }
-            except httpx.HTTPStatusError as e:
-                print(f"Easypaisa API error: {e.response.status_code} - {e.response.text}")
-                return {
-                    "success": False,
-                    "error": f"Payment creation failed: {e.response.text}"
-                }
-            except Exception as e:
-                print(f"Unexpected error: {e}")
-                return {
-                    "success": False,
-                    "error": "Payment creation failed"
-                }
+        client = get_client("easypaisa")
+        try:
+            response = await client.post(
+                f"{self.base_url}/api/v1/payments",
+                json=data,
+                headers=self.headers
+            )
+            response.raise_for_status()
+            result = response.json()
+            
+            return {
+                "success": True,
+                "payment_url": result.get("payment_url"),
+                "transaction_id": transaction_id
+            }
+        except httpx.HTTPStatusError as e:
+            print(f"Easypaisa API error: {e.response.status_code} - {e.response.text}")
+            return {
+                "success": False,
+                "error": f"Payment creation failed: {e.response.text}"
+            }
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            return {
+                "success": False,
+                "error": "Payment creation failed"
+            }
     
     async def verify_payment(self, transaction_id: str) -> dict:
         """
         Verify payment status with Easypaisa
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{self.base_url}/api/v1/payments/{transaction_id}/status",
-                    headers=self.headers
-                )
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                print(f"Error verifying payment: {e}")
-                return {"status": "failed"}
+        client = get_client("easypaisa")
+        try:
+            response = await client.get(
+                f"{self.base_url}/api/v1/payments/{transaction_id}/status",
+                headers=self.headers
+            )
+            response.raise_for_status()
+            return response.json()
+        except CircuitOpenError:
+            # Unknown, not failed: the payment must not be marked as failed
+            raise
+        except Exception as e:
+            print(f"Error verifying payment: {e}")
+            return {"status": "failed"}
 
 
 
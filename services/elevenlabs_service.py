@@ -1,13 +1,62 @@
 import httpx
 import os
+from typing import AsyncIterator, List, Optional, Tuple
 from dotenv import load_dotenv
+from config import settings
+from services.http_clients import get_client
+from services.tts_model_registry import ModelRegistry
+from services.tts_providers import DeadlineExceeded, TTSProvider, TTSProviderError, count_upstream
+from utils.audio_formats import DEFAULT_FORMAT, AudioFormat
+from utils.circuit_breaker import CircuitOpenError
+from utils.deadline import Deadline
+from utils.rate_limiter import get_limiter
+from services.tts_cache import make_key, normalize_text, tts_cache
 
 load_dotenv()
 
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 ELEVENLABS_BASE_URL = "https://api.elevenlabs.io/v1"
 
-class ElevenLabsService:
+# Free tier compatible models in order of preference
+ELEVENLABS_MODELS = [
+    "eleven_turbo_v2_5",  # Latest free tier model
+    "eleven_turbo_v2",    # Fallback option
+    "eleven_multilingual_v2",  # Multilingual option
+]
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.5
+}
+# ElevenLabs' default output for the Accept: audio/mpeg request we send
+OUTPUT_FORMAT = "mp3_44100_128"
+# output_format values for the formats ElevenLabs produces itself (192 kbps MP3 needs a higher tier)
+NATIVE_FORMATS = {
+    DEFAULT_FORMAT: OUTPUT_FORMAT,
+    AudioFormat("mp3", 32): "mp3_44100_32",
+    AudioFormat("mp3", 64): "mp3_44100_64",
+    AudioFormat("mp3", 96): "mp3_44100_96",
+    AudioFormat("mp3", 128): "mp3_44100_128",
+    AudioFormat("opus"): "opus_48000_64",
+    AudioFormat("opus", 32): "opus_48000_32",
+    AudioFormat("opus", 64): "opus_48000_64",
+    AudioFormat("opus", 96): "opus_48000_96",
+    AudioFormat("opus", 128): "opus_48000_128",
+}
+# Cached clips are replayed to streaming clients in chunks of this size
+STREAM_CHUNK_SIZE = 16 * 1024
+# Kept as short as possible: background probes are billed like any synthesis
+MODEL_PROBE_TEXT = "Hi."
+
+
+def is_model_deprecated(error_text: str) -> bool:
+    """Covers model_deprecated and model_deprecated_free_tier"""
+    return "model_deprecated" in error_text
+
+
+class ElevenLabsService(TTSProvider):
+    name = "elevenlabs"
+    default_voice = "21m00Tcm4TlvDq8ikWAM"
+    
     def __init__(self):
         self.api_key = ELEVENLABS_API_KEY
         self.base_url = ELEVENLABS_BASE_URL
@@ -16,73 +65,235 @@ class ElevenLabsService:
             "Content-Type": "application/json",
             "xi-api-key": self.api_key
         }
+        self.models = ModelRegistry("elevenlabs", ELEVENLABS_MODELS, settings.TTS_MODEL_REPROBE_INTERVAL_SECONDS)
+        self.limiter = get_limiter(self.name, self.api_key)
     
-    async def generate_voice(self, text: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM") -> bytes:
+    async def generate_voice(
+        self,
+        text: str,
+        voice_id: str = "21m00Tcm4TlvDq8ikWAM",
+        model: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        output_format: str = OUTPUT_FORMAT,
+    ) -> bytes:
         """
         Generate voice using ElevenLabs API
-        Uses free tier compatible models
+        Uses free tier compatible models, or only `model` when one is given.
+        With a deadline, each attempt's timeout is what's left of the budget.
+        output_format is one of NATIVE_FORMATS' values.
         """
         url = f"{self.base_url}/text-to-speech/{voice_id}"
+        text = normalize_text(text)
+        models = [model] if model else self.models.order()
         
-        # Try free tier compatible models in order
-        models_to_try = [
-            "eleven_turbo_v2_5",  # Latest free tier model
-            "eleven_turbo_v2",    # Fallback option
-            "eleven_multilingual_v2",  # Multilingual option
-        ]
+        # Cache key uses the model we'd try first; a fallback success is stored under its own model
+        cache_key = make_key(text, voice_id, models[0], VOICE_SETTINGS, output_format)
+        if settings.TTS_CACHE_ENABLED:
+            cached = await tts_cache.get(cache_key)
+            if cached is not None:
+                print(f"💾 TTS cache hit ({len(cached)} bytes)", flush=True)
+                return cached
+        count_upstream(text)
         
-        async with httpx.AsyncClient() as client:
-            last_error = None
-            for model_id in models_to_try:
-                try:
-                    data = {
-                        "text": text,
-                        "model_id": model_id,
-                        "voice_settings": {
-                            "stability": 0.5,
-                            "similarity_boost": 0.5
-                        }
-                    }
-                    
-                    print(f"🎤 Trying model: {model_id}", flush=True)
-                    response = await client.post(url, json=data, headers=self.headers)
-                    response.raise_for_status()
-                    print(f"✅ Voice generated successfully with model: {model_id}", flush=True)
-                    return response.content
-                    
-                except httpx.HTTPStatusError as e:
-                    error_text = e.response.text
-                    print(f"⚠️ Model {model_id} failed: {e.response.status_code} - {error_text}", flush=True)
-                    last_error = e
-                    # If it's a model deprecation error, try next model
-                    if "model_deprecated" in error_text or "model_deprecated_free_tier" in error_text:
-                        continue
-                    # If it's a different error, raise it
-                    raise Exception(f"Voice generation failed: {error_text}")
-                except Exception as e:
-                    print(f"⚠️ Unexpected error with model {model_id}: {e}", flush=True)
-                    last_error = e
+        client = get_client("elevenlabs")
+        last_error = None
+        only_deprecated = True
+        # Known-good model first; models that reported deprecation are skipped
+        for model_id in models:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded(f"Voice generation failed: deadline of {deadline.seconds:.0f}s exceeded", self.name)
+            await self.throttle(deadline)
+            try:
+                print(f"🎤 Trying model: {model_id}", flush=True)
+                response = await client.post(
+                    url,
+                    params=self._format_params(output_format),
+                    json=self._payload(text, model_id),
+                    headers=self.headers,
+                    # Same text and settings give the same audio, so transient failures may be retried
+                    extensions={"idempotent": True},
+                    **({"timeout": deadline.timeout()} if deadline is not None else {}),
+                )
+                response.raise_for_status()
+                print(f"✅ Voice generated successfully with model: {model_id}", flush=True)
+                if model is None:
+                    # A pinned model (hedged request) says nothing about our preferred order
+                    self.models.mark_success(model_id)
+                    self.models.maybe_reprobe(self._probe_model)
+                if settings.TTS_CACHE_ENABLED:
+                    await tts_cache.put(make_key(text, voice_id, model_id, VOICE_SETTINGS, output_format), response.content)
+                return response.content
+                
+            except httpx.HTTPStatusError as e:
+                error_text = e.response.text
+                print(f"⚠️ Model {model_id} failed: {e.response.status_code} - {error_text}", flush=True)
+                last_error = e
+                # If it's a model deprecation error, remember it and try next model
+                if is_model_deprecated(error_text):
+                    self.models.mark_deprecated(model_id, error_text)
                     continue
-            
-            # If all models failed, raise the last error
-            if last_error:
-                raise Exception(f"Voice generation failed: All models failed. Last error: {last_error.response.text if hasattr(last_error, 'response') else str(last_error)}")
-            raise Exception("Voice generation failed: No models available")
+                # If it's a different error, raise it
+                self.models.mark_failure(model_id)
+                raise TTSProviderError(f"Voice generation failed: {error_text}", self.name, e.response.status_code)
+            except CircuitOpenError:
+                # Every model goes through the same upstream: fail fast
+                raise
+            except Exception as e:
+                print(f"⚠️ Unexpected error with model {model_id}: {e}", flush=True)
+                self.models.mark_failure(model_id)
+                last_error = e
+                only_deprecated = False
+                continue
+        
+        # If all models failed, raise the last error
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceeded(f"Voice generation failed: deadline of {deadline.seconds:.0f}s exceeded", self.name)
+        if last_error:
+            status_code = last_error.response.status_code if hasattr(last_error, 'response') else None
+            if only_deprecated:
+                # Every model is retired on this account: another provider can still answer
+                status_code = None
+            raise TTSProviderError(f"Voice generation failed: All models failed. Last error: {last_error.response.text if hasattr(last_error, 'response') else str(last_error)}", self.name, status_code)
+        raise TTSProviderError("Voice generation failed: No models available", self.name)
     
-    async def get_voices(self):
+    async def stream_voice(
+        self, text: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM", output_format: str = OUTPUT_FORMAT
+    ) -> AsyncIterator[bytes]:
         """
-        Get available voices
+        Stream audio chunks (MP3 unless output_format says otherwise) from
+        ElevenLabs' streaming endpoint as they arrive.
+        The full clip is assembled on the side and cached once the stream completes.
         """
-        url = f"{self.base_url}/voices"
+        url = f"{self.base_url}/text-to-speech/{voice_id}/stream"
+        text = normalize_text(text)
+        # Latency-optimized audio is lower quality, so it is cached apart from /generate-voice audio
+        stream_settings = {**VOICE_SETTINGS, "optimize_streaming_latency": settings.TTS_STREAM_LATENCY_OPTIMIZATION}
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=self.headers)
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                print(f"Error fetching voices: {e}")
-                return []
+        cache_key = make_key(text, voice_id, self.models.order()[0], stream_settings, output_format)
+        if settings.TTS_CACHE_ENABLED:
+            cached = await tts_cache.get(cache_key)
+            if cached is not None:
+                print(f"💾 TTS cache hit ({len(cached)} bytes)", flush=True)
+                for i in range(0, len(cached), STREAM_CHUNK_SIZE):
+                    yield cached[i:i + STREAM_CHUNK_SIZE]
+                return
+        
+        client = get_client("elevenlabs")
+        last_error_text = None
+        last_status = None
+        for model_id in self.models.order():
+            await self.throttle()
+            print(f"🎤 Streaming with model: {model_id}", flush=True)
+            async with client.stream(
+                "POST",
+                url,
+                params={
+                    "optimize_streaming_latency": settings.TTS_STREAM_LATENCY_OPTIMIZATION,
+                    **self._format_params(output_format),
+                },
+                json=self._payload(text, model_id),
+                headers=self.headers,
+                extensions={"idempotent": True},
+            ) as response:
+                if response.status_code >= 400:
+                    error_text = (await response.aread()).decode("utf-8", "replace")
+                    print(f"⚠️ Model {model_id} failed: {response.status_code} - {error_text}", flush=True)
+                    last_error_text = error_text
+                    last_status = response.status_code
+                    if is_model_deprecated(error_text):
+                        self.models.mark_deprecated(model_id, error_text)
+                        continue
+                    self.models.mark_failure(model_id)
+                    raise TTSProviderError(f"Voice generation failed: {error_text}", self.name, response.status_code)
+                
+                parts = []
+                async for chunk in response.aiter_bytes():
+                    parts.append(chunk)
+                    yield chunk
+            
+            audio = b"".join(parts)
+            print(f"✅ Voice streamed successfully with model: {model_id} ({len(audio)} bytes)", flush=True)
+            self.models.mark_success(model_id)
+            self.models.maybe_reprobe(self._probe_model)
+            if settings.TTS_CACHE_ENABLED:
+                await tts_cache.put(make_key(text, voice_id, model_id, stream_settings, output_format), audio)
+            return
+        
+        raise TTSProviderError(f"Voice generation failed: All models failed. Last error: {last_error_text}", self.name, last_status)
+    
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+    
+    def hedge_models(self) -> List[str]:
+        return self.models.order()[1:]
+    
+    def supports_format(self, audio_format: AudioFormat) -> bool:
+        return audio_format in NATIVE_FORMATS
+    
+    async def synthesize(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        model: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        audio_format: AudioFormat = DEFAULT_FORMAT,
+    ) -> bytes:
+        return await self.generate_voice(
+            text, voice or self.default_voice, model=model, deadline=deadline, output_format=NATIVE_FORMATS[audio_format]
+        )
+    
+    @staticmethod
+    def _format_params(output_format: str) -> dict:
+        # The default needs no parameter, which keeps those requests exactly as before
+        return {} if output_format == OUTPUT_FORMAT else {"output_format": output_format}
+    
+    def _payload(self, text: str, model_id: str) -> dict:
+        return {
+            "text": text,
+            "model_id": model_id,
+            "voice_settings": VOICE_SETTINGS
+        }
+    
+    async def _probe_model(self, model_id: str, voice_id: str = "21m00Tcm4TlvDq8ikWAM") -> bool:
+        """Tiny synthesis to check whether a model works for our key again"""
+        await self.throttle()
+        client = get_client("elevenlabs")
+        response = await client.post(
+            f"{self.base_url}/text-to-speech/{voice_id}",
+            json=self._payload(MODEL_PROBE_TEXT, model_id),
+            headers=self.headers,
+        )
+        if response.status_code < 400:
+            return True
+        if is_model_deprecated(response.text):
+            self.models.mark_deprecated(model_id, response.text)
+        return False
+    
+    async def fetch_voices(self, etag: Optional[str] = None) -> Tuple[Optional[List[dict]], Optional[str]]:
+        """Voices available to our key; conditional on etag. Errors are raised to the caller."""
+        headers = {**self.headers, "Accept": "application/json"}
+        if etag:
+            headers["If-None-Match"] = etag
+        client = get_client("elevenlabs")
+        response = await client.get(
+            f"{self.base_url}/voices", headers=headers, timeout=settings.VOICE_CATALOG_FETCH_TIMEOUT_SECONDS
+        )
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        voices = [
+            {
+                "id": voice["voice_id"],
+                "name": voice.get("name") or voice["voice_id"],
+                "category": voice.get("category"),
+                "labels": voice.get("labels") or {},
+                "preview_url": voice.get("preview_url"),
+            }
+            for voice in response.json().get("voices", [])
+            if voice.get("voice_id")
+        ]
+        return voices, response.headers.get("etag")
 
 
 
@@ -0,0 +1,298 @@
+"""
+One long-lived, pooled httpx.AsyncClient per upstream provider.
+
+Clients are created (and their connections pre-warmed) in the FastAPI lifespan, so
+requests reuse keep-alive connections instead of paying DNS + TCP + TLS every call.
+Outside the app (scripts, shells) get_client() creates them lazily.
+
+Every request also passes through the upstream's circuit breaker (see
+utils/circuit_breaker.py). Idempotent requests - GET/HEAD/PUT/DELETE/OPTIONS,
+or any request sent with extensions={"idempotent": True} - are retried with
+jittered exponential backoff when the connection fails or the upstream answers
+429/502/503/504. Other requests are sent exactly once.
+
+With UPSTREAM_SIMULATOR set, every client answers from the local upstream
+simulator instead (see services/upstream_simulator.py).
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from config import settings
+from utils import metrics
+from utils.circuit_breaker import OPEN, CircuitBreaker, backoff_delay, get_breaker
+from services.upstream_simulator import RedirectTransport, SimulatorTransport
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Per-upstream connection settings. http2 is only used where the provider supports it.
+UPSTREAMS: Dict[str, dict] = {
+    "elevenlabs": {
+        "base_url": "https://api.elevenlabs.io/v1",
+        "http2": True,
+        "max_connections": 50,
+        "max_keepalive": 20,
+        "timeout": httpx.Timeout(60.0, connect=5.0),
+    },
+    "lamonfox": {
+        "base_url": "https://api.lemonfox.ai/v1",
+        "http2": False,  # requests go through plain HTTP proxies
+        "max_connections": 20,
+        "max_keepalive": 10,
+        "timeout": httpx.Timeout(60.0, connect=10.0),
+    },
+    "easypaisa": {
+        "base_url": "https://api.easypay.com.pk",
+        "http2": False,
+        "max_connections": 10,
+        "max_keepalive": 5,
+        "timeout": httpx.Timeout(30.0, connect=5.0),
+    },
+    "claid": {
+        "base_url": "https://api.claid.ai/v1",
+        "http2": True,
+        "max_connections": 10,
+        "max_keepalive": 5,
+        "timeout": httpx.Timeout(30.0, connect=5.0),
+    },
+}
+
+metrics.describe("upstream_requests_total", "Requests sent to an upstream provider")
+metrics.describe("upstream_in_flight", "Requests currently holding an upstream connection")
+metrics.describe("upstream_pool_saturation", "In-flight requests divided by the pool's max connections")
+metrics.describe("upstream_pool_connections", "Open pooled connections by state")
+metrics.describe("upstream_time_to_headers_seconds", "Time from sending a request to receiving response headers")
+metrics.describe("upstream_retries_total", "Idempotent upstream requests retried after a transient failure")
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+# Responses that count against the breaker (a 429 is a healthy upstream asking us to slow down),
+# and the ones worth retrying
+FAILURE_STATUSES = set(range(500, 600))
+RETRY_STATUSES = {429, 502, 503, 504}
+# Failures where the request most likely never reached the upstream's application
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ProxyError, httpx.RemoteProtocolError)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+class _InstrumentedStream(httpx.AsyncByteStream):
+    """Response body wrapper that releases the in-flight slot when the body is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close:
+                on_close()
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Counts in-flight requests so pool saturation can be exported as a metric,
+    and applies the upstream's circuit breaker and retry policy
+    """
+
+    def __init__(
+        self,
+        name: str,
+        transport: httpx.AsyncBaseTransport,
+        breaker: CircuitBreaker,
+        max_connections: int,
+        retry_connect_errors: bool = True,
+    ):
+        self.name = name
+        self.transport = transport
+        self.breaker = breaker
+        self.max_connections = max_connections
+        self.retry_connect_errors = retry_connect_errors
+        self.in_flight = 0
+
+    def _release(self):
+        self.in_flight -= 1
+
+    async def _send_once(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        metrics.inc("upstream_requests_total", upstream=self.name)
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+        metrics.observe("upstream_time_to_headers_seconds", time.perf_counter() - started, upstream=self.name)
+        response.stream = _InstrumentedStream(response.stream, self._release)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        idempotent = request.method in IDEMPOTENT_METHODS or bool(request.extensions.get("idempotent"))
+        retries = settings.UPSTREAM_RETRIES if idempotent else 0
+        # The breaker gets one verdict per request, from its final attempt, however many retries it took
+        self.breaker.allow()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = await self._send_once(request)
+                except RETRY_EXCEPTIONS as e:
+                    # No point retrying into a breaker other requests have opened
+                    if attempt >= retries or not self.retry_connect_errors or self.breaker.state == OPEN:
+                        raise
+                    reason, delay = type(e).__name__, backoff_delay(attempt + 1)
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt >= retries or self.breaker.state == OPEN:
+                        break
+                    reason, delay = str(response.status_code), backoff_delay(attempt + 1, _retry_after(response))
+                    await response.aclose()
+                attempt += 1
+                metrics.inc("upstream_retries_total", upstream=self.name, reason=reason)
+                print(f"🔁 {self.name} {request.method} failed ({reason}), retry {attempt}/{retries} in {delay:.2f}s", flush=True)
+                await asyncio.sleep(delay)
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        if response.status_code in FAILURE_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def proxy_label(proxy: str) -> str:
+    """host:port of a proxy URL, without any credentials"""
+    url = httpx.URL(proxy)
+    return f"{url.host}:{url.port}" if url.port else url.host
+
+
+def client_key(name: str, proxy: Optional[str] = None) -> str:
+    """Registry key (and metrics label) of a client: the upstream name, plus the proxy if any"""
+    return f"{name} via {proxy_label(proxy)}" if proxy else name
+
+
+class HTTPClientRegistry:
+    def __init__(self):
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.transports: Dict[str, _InstrumentedTransport] = {}
+        metrics.register_collector(self._collect_metrics)
+
+    def _build(self, name: str, proxy: Optional[str]) -> httpx.AsyncClient:
+        config = UPSTREAMS[name]
+        key = client_key(name, proxy)
+        http2 = config["http2"] and HTTP2_AVAILABLE
+        limits = httpx.Limits(
+            max_connections=config["max_connections"],
+            max_keepalive_connections=config["max_keepalive"],
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        if settings.UPSTREAM_SIMULATOR == "inprocess":
+            inner = SimulatorTransport(name)
+        elif settings.UPSTREAM_SIMULATOR:
+            # Stand-in server on a local address: connect to it directly, never through a proxy
+            inner = RedirectTransport(name, settings.UPSTREAM_SIMULATOR, httpx.AsyncHTTPTransport(limits=limits, retries=1))
+        else:
+            inner = httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=limits,
+                proxy=proxy or config.get("proxy"),
+                retries=1,  # retry connection failures once (never replays a sent request)
+            )
+        # A client per proxy, each with its own breaker: one dead proxy mustn't open the upstream's.
+        # Connection failures through a proxy aren't retried; the caller moves on to another route.
+        transport = _InstrumentedTransport(
+            key, inner, get_breaker(key), config["max_connections"], retry_connect_errors=proxy is None
+        )
+        self.transports[key] = transport
+        return httpx.AsyncClient(transport=transport, timeout=config["timeout"])
+
+    def get(self, name: str, proxy: Optional[str] = None) -> httpx.AsyncClient:
+        """The client for an upstream, or for reaching it through a specific proxy"""
+        key = client_key(name, proxy)
+        client = self.clients.get(key)
+        if client is None or client.is_closed:
+            client = self.clients[key] = self._build(name, proxy)
+        return client
+
+    async def _prewarm_one(self, name: str):
+        """Open a connection ahead of the first real request; any response will do"""
+        try:
+            await self.get(name).head(UPSTREAMS[name]["base_url"], timeout=settings.UPSTREAM_PREWARM_TIMEOUT_SECONDS)
+            print(f"🔥 Pre-warmed connection to {name}", flush=True)
+        except Exception as e:
+            print(f"⚠️ Could not pre-warm {name}: {e}", flush=True)
+
+    async def start(self, prewarm: bool = True):
+        for name in UPSTREAMS:
+            self.get(name)
+        print(f"🌐 Upstream HTTP clients ready: {', '.join(UPSTREAMS)} (HTTP/2 {'on' if HTTP2_AVAILABLE else 'unavailable'})", flush=True)
+        if prewarm:
+            await asyncio.gather(*(self._prewarm_one(name) for name in UPSTREAMS))
+
+    async def close(self):
+        clients, self.clients = self.clients, {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()), return_exceptions=True)
+
+    def stats(self) -> Dict[str, dict]:
+        result = {}
+        for name, transport in self.transports.items():
+            max_connections = transport.max_connections
+            active, idle = 0, 0
+            # httpcore keeps its pool private; read it defensively
+            pool = getattr(transport.transport, "_pool", None)
+            for connection in getattr(pool, "connections", []) or []:
+                try:
+                    if connection.is_idle():
+                        idle += 1
+                    else:
+                        active += 1
+                except Exception:
+                    pass
+            result[name] = {
+                "in_flight": transport.in_flight,
+                "max_connections": max_connections,
+                "saturation": transport.in_flight / max_connections,
+                "connections_active": active,
+                "connections_idle": idle,
+                "circuit": transport.breaker.snapshot(),
+            }
+        return result
+
+    def _collect_metrics(self):
+        for name, stat in self.stats().items():
+            metrics.set_gauge("upstream_in_flight", stat["in_flight"], upstream=name)
+            metrics.set_gauge("upstream_pool_saturation", stat["saturation"], upstream=name)
+            metrics.set_gauge("upstream_pool_connections", stat["connections_active"], upstream=name, state="active")
+            metrics.set_gauge("upstream_pool_connections", stat["connections_idle"], upstream=name, state="idle")
+
+
+http_clients = HTTPClientRegistry()
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Shared client for an upstream registered in UPSTREAMS"""
+    return http_clients.get(name)
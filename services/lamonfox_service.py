@@ -0,0 +1,264 @@
+import httpx
+import os
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from config import settings
+from services.http_clients import proxy_label
+from services.proxy_pool import PROXY_ERROR_STATUSES, ProxyPool
+from services.tts_providers import DeadlineExceeded, TTSProvider, TTSProviderError, count_upstream
+from utils.audio_formats import DEFAULT_FORMAT, AudioFormat
+from utils.circuit_breaker import CircuitOpenError
+from utils.deadline import Deadline
+from utils.rate_limiter import get_limiter
+from services.tts_cache import make_key, normalize_text, tts_cache
+
+load_dotenv()
+
+LAMONFOX_API_KEY = os.getenv("LAMONFOX_API_KEY")
+LAMONFOX_BASE_URL = "https://api.lemonfox.ai/v1"
+
+# Free proxies to rotate through (bypass the Railway IP); LAMONFOX_PROXIES overrides the list
+DEFAULT_PROXIES = [
+    "http://proxy.scrape.center:8080",
+    "http://51.158.68.68:8811",
+    "http://103.187.98.25:8080",
+    "http://34.146.64.228:3128",
+    "http://185.199.229.156:7492"
+]
+if settings.LAMONFOX_PROXIES is not None:
+    PROXIES = [p.strip() for p in settings.LAMONFOX_PROXIES.split(",") if p.strip()]
+else:
+    PROXIES = DEFAULT_PROXIES
+
+# Output formats Lemonfox encodes itself (as response_format)
+NATIVE_CODECS = ("mp3", "opus", "aac")
+
+# Failures that mean the route (proxy or connection) is bad, not the request
+ROUTE_ERRORS = (httpx.ProxyError, httpx.ConnectError, httpx.ConnectTimeout, CircuitOpenError)
+
+lamonfox_proxy_pool = ProxyPool(
+    "lamonfox", PROXIES, probe_url=LAMONFOX_BASE_URL, direct_fallback=settings.PROXY_DIRECT_FALLBACK
+)
+
+class LamonfoxService(TTSProvider):
+    name = "lamonfox"
+    default_voice = "sarah"
+    
+    def __init__(self):
+        self.api_key = LAMONFOX_API_KEY
+        self.base_url = LAMONFOX_BASE_URL
+        self.limiter = get_limiter(self.name, self.api_key)
+        
+        # Validate API key on initialization
+        if not self.api_key:
+            print("⚠️ WARNING: LAMONFOX_API_KEY is not set in environment variables", flush=True)
+        
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key or ''}",
+            "Content-Type": "application/json",
+            "User-Agent": "MyAIStudio/1.0",  # Add user agent to identify the application
+            "Accept": "audio/mpeg"  # Explicitly request audio response
+        }
+    
+    async def generate_voice(
+        self, text: str, voice: str = "sarah", response_format: str = "mp3", deadline: Optional[Deadline] = None
+    ) -> bytes:
+        """
+        Generate voice using Lamonfox (Lemonfox.ai) API
+        With a deadline, the request's timeout is what's left of the budget.
+        """
+        # Validate API key before making request
+        if not self.api_key:
+            raise Exception("Lamonfox API key is not configured. Please set LAMONFOX_API_KEY environment variable.")
+        
+        # Validate text input
+        if not text or not text.strip():
+            raise Exception("Text input is required for voice generation")
+        
+        url = f"{self.base_url}/audio/speech"  # Note: Using /audio/speech endpoint
+        text = normalize_text(text)
+        
+        # Lemonfox has a single model per voice
+        cache_key = make_key(text, voice, "lamonfox", None, response_format)
+        if settings.TTS_CACHE_ENABLED:
+            cached = await tts_cache.get(cache_key)
+            if cached is not None:
+                print(f"💾 TTS cache hit ({len(cached)} bytes)", flush=True)
+                return cached
+        count_upstream(text)
+        
+        data = {
+            "input": text,
+            "voice": voice,  # Default: sarah, can be changed based on available voices
+            "response_format": response_format  # Options: mp3, opus, aac, flac, wav, pcm
+        }
+        
+        print(f"🎤 Generating voice with Lamonfox API (voice: {voice}, format: {response_format})", flush=True)
+        print(f"🔗 API URL: {url}", flush=True)
+        
+        # Log API key info (safely)
+        if self.api_key:
+            key_preview = f"{self.api_key[:10]}...{self.api_key[-5:]}" if len(self.api_key) > 15 else f"{self.api_key[:5]}***"
+            print(f"🔑 Using API key: {key_preview}", flush=True)
+        else:
+            print(f"🔑 API key: NOT SET", flush=True)
+        
+        await self.throttle(deadline)
+        try:
+            response = await self._post(url, data, deadline)
+            
+            # Log response status
+            print(f"📡 Response status: {response.status_code}", flush=True)
+            
+            response.raise_for_status()
+            print(f"✅ Voice generated successfully with Lamonfox API", flush=True)
+            if settings.TTS_CACHE_ENABLED:
+                await tts_cache.put(cache_key, response.content)
+            return response.content
+            
+        except httpx.HTTPStatusError as e:
+            # Handle HTTP errors from the API
+            error_text = e.response.text if e.response else "Unknown error"
+            status_code = e.response.status_code if e.response else 0
+            
+            # Try to parse JSON error response
+            try:
+                if e.response:
+                    error_json = e.response.json()
+                    if isinstance(error_json, dict):
+                        if "detail" in error_json:
+                            detail = error_json["detail"]
+                            if isinstance(detail, dict):
+                                message = detail.get("message", error_text)
+                                status_msg = detail.get("status", "")
+                                error_text = f"{status_msg}: {message}" if status_msg else message
+                            else:
+                                error_text = str(detail)
+            except:
+                pass  # If JSON parsing fails, use original error_text
+            
+            print(f"⚠️ Lamonfox API error: {status_code} - {error_text}", flush=True)
+            print(f"🔑 API Key (first 10 chars): {self.api_key[:10] if self.api_key else 'None'}...", flush=True)
+            
+            # Handle specific error cases
+            if status_code == 401:
+                raise TTSProviderError("Lamonfox API key is invalid or expired. Please check your API key configuration.", self.name, status_code)
+            elif status_code == 402:
+                raise TTSProviderError("Payment required. Your API key may be on a free tier that has been disabled. Please upgrade to a paid plan or contact Lamonfox support.", self.name, status_code)
+            elif status_code == 429:
+                raise TTSProviderError("Lamonfox API rate limit exceeded. Please try again later.", self.name, status_code)
+            elif status_code == 400:
+                # Check for unusual activity error
+                if "unusual_activity" in error_text.lower() or "free tier" in error_text.lower():
+                    error_msg = (
+                        "Lamonfox API Error: Your account is being treated as Free Tier and has been flagged for unusual activity. "
+                        "This can happen if:\n"
+                        "1. Your API key is from a free account (even if you purchased credits)\n"
+                        "2. Railway's IP address is flagged as a proxy/VPN\n"
+                        "3. Your paid account needs to be activated\n\n"
+                        "SOLUTION: Please contact Lamonfox support at https://lemonfox.ai with:\n"
+                        "- Your API key (they can verify if it's paid)\n"
+                        "- Request to whitelist Railway's IP addresses\n"
+                        "- Ask them to activate your paid subscription\n\n"
+                        f"Original error: {error_text}"
+                    )
+                    raise TTSProviderError(error_msg, self.name, status_code)
+                raise TTSProviderError(f"Invalid request: {error_text}", self.name, status_code)
+            else:
+                raise TTSProviderError(f"Voice generation failed (HTTP {status_code}): {error_text}", self.name, status_code)
+                
+        except (DeadlineExceeded, CircuitOpenError):
+            raise
+        except httpx.TimeoutException:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded(f"Voice generation failed: deadline of {deadline.seconds:.0f}s exceeded", self.name)
+            raise TTSProviderError("Voice generation request timed out. Please try again.", self.name)
+        except httpx.ProxyError as e:
+            raise TTSProviderError(f"Proxy connection failed: {str(e)}. Please check proxy configuration.", self.name)
+        except Exception as e:
+            print(f"⚠️ Unexpected error with Lamonfox API: {e}", flush=True)
+            raise TTSProviderError(f"Voice generation failed: {str(e)}", self.name)
+    
+    async def _post(self, url: str, data: dict, deadline: Optional[Deadline]) -> httpx.Response:
+        """
+        Send the request through the proxy pool: the best proxies first, then a
+        direct connection. A proxy that can't connect or answers 407 is scored
+        down and the next route is tried. A 502/503/504 through a proxy is also
+        retried on the next route, and only held against the proxy if a later
+        route gets through (otherwise the upstream itself is failing). Any other
+        answer ends the search.
+        """
+        routes = lamonfox_proxy_pool.routes()
+        gateway_errors: List[str] = []  # proxies that answered 502/503/504
+        for index, proxy in enumerate(routes):
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded(f"Voice generation failed: deadline of {deadline.seconds:.0f}s exceeded", self.name)
+            route = f"proxy {proxy_label(proxy)}" if proxy else "direct connection"
+            print(f"🌐 Using {route}", flush=True)
+            try:
+                response = await lamonfox_proxy_pool.client(proxy).post(
+                    url,
+                    json=data,
+                    headers=self.headers,
+                    extensions={"idempotent": True},
+                    **({"timeout": deadline.timeout()} if deadline is not None else {}),
+                )
+            except ROUTE_ERRORS as e:
+                lamonfox_proxy_pool.record(proxy, False)
+                if index == len(routes) - 1:
+                    raise
+                print(f"⚠️ Request via {route} failed ({type(e).__name__}), trying next route", flush=True)
+                continue
+            except httpx.TimeoutException:
+                lamonfox_proxy_pool.record(proxy, False)
+                raise
+            last_route = index == len(routes) - 1
+            if proxy and response.status_code == 407:
+                lamonfox_proxy_pool.record(proxy, False)
+                if not last_route:
+                    print(f"⚠️ Proxy {proxy_label(proxy)} requires authentication, trying next route", flush=True)
+                    continue
+            elif proxy and response.status_code in PROXY_ERROR_STATUSES and not last_route:
+                gateway_errors.append(proxy)
+                print(f"⚠️ Request via {route} answered {response.status_code}, trying next route", flush=True)
+                continue
+            elif response.status_code not in PROXY_ERROR_STATUSES:
+                # The upstream is reachable, so the earlier gateway errors were the proxies' own
+                for failed in gateway_errors:
+                    lamonfox_proxy_pool.record(failed, False)
+                lamonfox_proxy_pool.record(proxy, True)
+            return response
+        raise TTSProviderError("Voice generation failed: no route to Lamonfox", self.name)
+    
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+    
+    def supports_format(self, audio_format: AudioFormat) -> bool:
+        # Lemonfox picks the bitrate itself
+        return audio_format.bitrate is None and audio_format.codec in NATIVE_CODECS
+    
+    async def synthesize(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        model: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        audio_format: AudioFormat = DEFAULT_FORMAT,
+    ) -> bytes:
+        # Lemonfox has a single model per voice, so model is ignored
+        return await self.generate_voice(
+            text, voice or self.default_voice, response_format=audio_format.codec, deadline=deadline
+        )
+    
+    async def fetch_voices(self, etag: Optional[str] = None) -> Tuple[Optional[List[dict]], Optional[str]]:
+        """
+        Lamonfox has no voices endpoint, so the catalog gets a fixed list
+        """
+        return [
+            {"id": "sarah", "name": "Sarah"},
+            {"id": "james", "name": "James"},
+            {"id": "emma", "name": "Emma"},
+            {"id": "william", "name": "William"},
+        ], None
+
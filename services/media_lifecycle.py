@@ -0,0 +1,280 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config import settings
+from database import SessionLocal
+from models import GeneratedVideo, User, VoiceHistory
+from services.media_storage import MediaStorage
+from utils import http_cache
+
+VIDEO_URL_PREFIX = "/static/videos/"
+AUDIO_URL_PREFIX = "/static/audio/"
+
+# serve_video bumps a file's atime at most this often, so range requests from a
+# seeking player don't turn into a metadata write each
+ACCESS_TOUCH_INTERVAL_SECONDS = 3600
+
+
+def touch_access(file_path: str):
+    """
+    Record that a file was just played by bumping its atime (mtime is left alone).
+    Filesystems mounted noatime never update atime on read, so we do it ourselves.
+    """
+    try:
+        st = os.stat(file_path)
+        now = time.time()
+        if now - st.st_atime >= ACCESS_TOUCH_INTERVAL_SECONDS:
+            os.utime(file_path, ns=(int(now * 1e9), st.st_mtime_ns))
+    except OSError:
+        pass
+
+
+class MediaLifecycleManager:
+    """
+    Keeps generated_videos/, generated_audio/ and tmp_uploads/ bounded:
+    - deletes videos older than their owner's plan retention (rows and files together)
+    - drops stored voice audio past the same retention (history rows keep their text)
+    - evicts least recently played videos and clips when they pass the disk high-water mark
+    - removes temp uploads, partial encodes and row-less videos and clips left by dead requests
+    All work is synchronous and batched; run_periodic() runs it off the event loop.
+    Disk quota and row-less sweeps only apply to local storage; remote stores get
+    their own lifecycle rules, but expired rows still delete their objects here.
+    """
+
+    def __init__(self, storage: MediaStorage, videos_dir: str, audio_dir: str, tmp_dir: str, partial_prefix: str):
+        self.storage = storage
+        self.videos_dir = os.path.abspath(videos_dir)
+        self.audio_dir = os.path.abspath(audio_dir)
+        self.tmp_dir = os.path.abspath(tmp_dir)
+        self.partial_prefix = partial_prefix
+        self.batch_size = settings.MEDIA_CLEANUP_BATCH_SIZE
+        self.max_bytes = settings.MEDIA_MAX_DISK_MB * 1024 * 1024
+        self.low_water_bytes = int(self.max_bytes * settings.MEDIA_LOW_WATER_RATIO)
+        self.orphan_max_age = settings.ORPHAN_MAX_AGE_SECONDS
+
+    # ---- helpers ----
+
+    def _media_filename(self, url: str) -> Optional[str]:
+        filename = os.path.basename(url or "")
+        if not filename or filename.startswith("."):
+            return None
+        return filename
+
+    def _remove(self, path: Optional[str]) -> int:
+        """Delete a file, returning the bytes freed (0 if it was already gone)"""
+        if not path:
+            return 0
+        http_cache.forget(path)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def _delete_rows_and_files(self, db, rows: List[GeneratedVideo]) -> int:
+        freed = 0
+        for row in rows:
+            filename = self._media_filename(row.video_url)
+            if filename:
+                freed += self.storage.delete("videos", filename)
+            db.delete(row)
+        db.commit()
+        return freed
+
+    def _drop_audio(self, db, rows: List[VoiceHistory]) -> int:
+        """Delete the rows' stored clips; the history rows stay, without audio"""
+        freed = 0
+        for row in rows:
+            filename = self._media_filename(row.audio_url)
+            if filename:
+                freed += self.storage.delete("audio", filename)
+            row.audio_url = None
+        db.commit()
+        return freed
+
+    def _media_dirs(self):
+        """(namespace, local directory, URL prefix, URL column) of each kind of generated media"""
+        dirs = [
+            ("videos", self.videos_dir, VIDEO_URL_PREFIX, GeneratedVideo.video_url),
+            ("audio", self.audio_dir, AUDIO_URL_PREFIX, VoiceHistory.audio_url),
+        ]
+        return [d for d in dirs if os.path.isdir(d[1])]
+
+    def _retention_for(self, plan: str) -> timedelta:
+        days = settings.MEDIA_RETENTION_DAYS.get(plan, settings.MEDIA_RETENTION_DAYS["Paid"])
+        return timedelta(days=days)
+
+    # ---- policies ----
+
+    def expire_by_ttl(self, db) -> Dict[str, int]:
+        """Delete videos older than their owner's plan retention, one batch per commit"""
+        deleted, freed = 0, 0
+        now = datetime.utcnow()
+        plans = [p for (p,) in db.query(User.plan).distinct().all()]
+        for plan in plans:
+            cutoff = now - self._retention_for(plan)
+            while True:
+                rows = (
+                    db.query(GeneratedVideo)
+                    .join(User, GeneratedVideo.user_id == User.id)
+                    .filter(User.plan == plan, GeneratedVideo.created_at < cutoff)
+                    .order_by(GeneratedVideo.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                freed += self._delete_rows_and_files(db, rows)
+                deleted += len(rows)
+        return {"deleted": deleted, "bytes_freed": freed}
+
+    def expire_audio_by_ttl(self, db) -> Dict[str, int]:
+        """Delete stored voice audio older than its owner's plan retention, one batch per commit"""
+        deleted, freed = 0, 0
+        now = datetime.utcnow()
+        plans = [p for (p,) in db.query(User.plan).distinct().all()]
+        for plan in plans:
+            cutoff = now - self._retention_for(plan)
+            while True:
+                rows = (
+                    db.query(VoiceHistory)
+                    .join(User, VoiceHistory.user_id == User.id)
+                    .filter(
+                        User.plan == plan,
+                        VoiceHistory.created_at < cutoff,
+                        VoiceHistory.audio_url.like(f"{AUDIO_URL_PREFIX}%"),
+                    )
+                    .order_by(VoiceHistory.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                freed += self._drop_audio(db, rows)
+                deleted += len(rows)
+        return {"deleted": deleted, "bytes_freed": freed}
+
+    def enforce_disk_quota(self, db) -> Dict[str, int]:
+        """
+        Evict the least recently played videos and voice clips until their
+        combined usage drops below the low-water mark
+        """
+        entries = []
+        total = 0
+        for namespace, directory, _, _ in self._media_dirs():
+            if self.storage.local_path(namespace, "") is None:
+                continue  # remote store; only partial writes live here
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.is_file() or entry.name.startswith("."):
+                        continue
+                    st = entry.stat()
+                    entries.append((st.st_atime, namespace, entry.name, st.st_size))
+                    total += st.st_size
+
+        if total <= self.max_bytes:
+            return {"deleted": 0, "bytes_freed": 0}
+
+        print(f"🧹 Media storage at {total / 1024 / 1024:.1f} MB exceeds {settings.MEDIA_MAX_DISK_MB} MB - evicting", flush=True)
+        entries.sort()
+        victims: Dict[str, List[str]] = {"videos": [], "audio": []}
+        for _, namespace, name, size in entries:
+            if total <= self.low_water_bytes:
+                break
+            victims[namespace].append(name)
+            total -= size
+
+        deleted, freed = 0, 0
+        for i in range(0, len(victims["videos"]), self.batch_size):
+            batch = victims["videos"][i:i + self.batch_size]
+            urls = [f"{VIDEO_URL_PREFIX}{name}" for name in batch]
+            rows = db.query(GeneratedVideo).filter(GeneratedVideo.video_url.in_(urls)).all()
+            freed += self._delete_rows_and_files(db, rows)
+            # Files whose row is already gone still count against the quota
+            for name in batch:
+                freed += self._remove(os.path.join(self.videos_dir, name))
+            deleted += len(batch)
+        for i in range(0, len(victims["audio"]), self.batch_size):
+            batch = victims["audio"][i:i + self.batch_size]
+            urls = [f"{AUDIO_URL_PREFIX}{name}" for name in batch]
+            rows = db.query(VoiceHistory).filter(VoiceHistory.audio_url.in_(urls)).all()
+            freed += self._drop_audio(db, rows)
+            for name in batch:
+                freed += self._remove(os.path.join(self.audio_dir, name))
+            deleted += len(batch)
+        return {"deleted": deleted, "bytes_freed": freed}
+
+    def sweep_orphans(self, db) -> Dict[str, int]:
+        """
+        Remove files no live request can still own: old temp uploads, old partial
+        encodes and audio writes, and old videos and clips with no row pointing at them.
+        """
+        cutoff = time.time() - self.orphan_max_age
+        removed, freed = 0, 0
+
+        if os.path.isdir(self.tmp_dir):
+            with os.scandir(self.tmp_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        freed += self._remove(entry.path)
+                        removed += 1
+
+        for namespace, directory, url_prefix, url_column in self._media_dirs():
+            candidates = []
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+                        continue
+                    if entry.name.startswith(self.partial_prefix):
+                        freed += self._remove(entry.path)
+                        removed += 1
+                    elif not entry.name.startswith(".") and self.storage.local_path(namespace, entry.name):
+                        candidates.append(entry.name)
+
+            for i in range(0, len(candidates), self.batch_size):
+                batch = candidates[i:i + self.batch_size]
+                urls = [f"{url_prefix}{name}" for name in batch]
+                known = {url for (url,) in db.query(url_column).filter(url_column.in_(urls)).all()}
+                for name in batch:
+                    if f"{url_prefix}{name}" not in known:
+                        freed += self._remove(os.path.join(directory, name))
+                        removed += 1
+
+        return {"deleted": removed, "bytes_freed": freed}
+
+    # ---- scheduling ----
+
+    def run_once(self) -> Dict[str, Dict[str, int]]:
+        """Run every policy once with its own DB session (blocking - call from a thread)"""
+        db = SessionLocal()
+        try:
+            report = {
+                "orphans": self.sweep_orphans(db),
+                "expired": self.expire_by_ttl(db),
+                "expired_audio": self.expire_audio_by_ttl(db),
+                "evicted": self.enforce_disk_quota(db),
+            }
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        total_deleted = sum(r["deleted"] for r in report.values())
+        if total_deleted:
+            total_freed = sum(r["bytes_freed"] for r in report.values())
+            print(f"🧹 Media cleanup removed {total_deleted} files ({total_freed / 1024 / 1024:.2f} MB): {report}", flush=True)
+        return report
+
+    async def run_periodic(self):
+        """Sweep at startup and then every MEDIA_SWEEP_INTERVAL_SECONDS until cancelled"""
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"⚠️ Media cleanup failed: {e}", flush=True)
+            await asyncio.sleep(settings.MEDIA_SWEEP_INTERVAL_SECONDS)
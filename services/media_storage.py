@@ -0,0 +1,185 @@
+import os
+import shutil
+import uuid
+from typing import Dict, Optional
+
+from config import settings
+from utils import http_cache
+
+# boto3 is only needed for the S3-compatible backend
+try:
+    import boto3
+    from botocore.client import Config as BotoConfig
+    from botocore.exceptions import ClientError
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+
+class MediaStorage:
+    """
+    Where generated media lives. Files are addressed by (namespace, filename),
+    e.g. ("videos", "slideshow_20250101_ab12cd34.mp4").
+
+    Backends that set `redirects = True` never stream bytes through Python:
+    the serving route answers with a redirect to `url_for()` instead.
+    """
+
+    name = "base"
+    redirects = False
+
+    def save_file(self, namespace: str, local_path: str, filename: str, content_type: str):
+        """Take ownership of a finished local file and publish it under filename (blocking)"""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, filename: str) -> int:
+        """Delete a stored file, returning the bytes freed when known (blocking)"""
+        raise NotImplementedError
+
+    def save_bytes(self, namespace: str, data: bytes, filename: str, content_type: str):
+        """Publish in-memory content under filename (blocking)"""
+        scratch_dir = MEDIA_DIRS[namespace]
+        os.makedirs(scratch_dir, exist_ok=True)
+        # Hidden partial name: never served, and swept if we die before publishing
+        partial_path = os.path.join(scratch_dir, f"{PARTIAL_PREFIX}{uuid.uuid4().hex}")
+        try:
+            with open(partial_path, "wb") as f:
+                f.write(data)
+            self.save_file(namespace, partial_path, filename, content_type)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def local_path(self, namespace: str, filename: str) -> Optional[str]:
+        """Path on this machine's disk, or None for remote backends"""
+        return None
+
+    def url_for(self, namespace: str, filename: str) -> str:
+        """Short-lived URL clients can fetch the file from directly"""
+        raise NotImplementedError
+
+
+class LocalMediaStorage(MediaStorage):
+    """Files on this container's disk, one directory per namespace"""
+
+    name = "local"
+
+    def __init__(self, dirs: Dict[str, str]):
+        self.dirs = {ns: os.path.abspath(d) for ns, d in dirs.items()}
+        for d in self.dirs.values():
+            os.makedirs(d, exist_ok=True)
+
+    def local_path(self, namespace: str, filename: str) -> Optional[str]:
+        return os.path.join(self.dirs[namespace], filename)
+
+    def save_file(self, namespace: str, local_path: str, filename: str, content_type: str):
+        target = self.local_path(namespace, filename)
+        try:
+            # Atomic rename when the source is on the same filesystem
+            os.replace(local_path, target)
+        except OSError:
+            shutil.move(local_path, target)
+
+    def delete(self, namespace: str, filename: str) -> int:
+        path = self.local_path(namespace, filename)
+        http_cache.forget(path)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def url_for(self, namespace: str, filename: str) -> str:
+        return f"/static/{namespace}/{filename}"
+
+
+class S3MediaStorage(MediaStorage):
+    """
+    S3-compatible object storage (AWS S3, MinIO, R2, ...). Point S3_ENDPOINT_URL at a
+    local MinIO to develop against it. Reads are served via presigned redirects.
+    """
+
+    name = "s3"
+    redirects = True
+
+    def __init__(self):
+        if not BOTO3_AVAILABLE:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 requires boto3. Install it with: pip install boto3")
+        if not settings.S3_BUCKET:
+            raise RuntimeError("MEDIA_STORAGE_BACKEND=s3 requires S3_BUCKET to be set")
+        self.bucket = settings.S3_BUCKET
+        self.key_prefix = settings.S3_KEY_PREFIX
+        self.presign_ttl = settings.S3_PRESIGN_TTL_SECONDS
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            # Path-style addressing works with MinIO and other self-hosted stand-ins
+            config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    def _key(self, namespace: str, filename: str) -> str:
+        return f"{self.key_prefix}{namespace}/{filename}"
+
+    def save_file(self, namespace: str, local_path: str, filename: str, content_type: str):
+        self.client.upload_file(
+            local_path,
+            self.bucket,
+            self._key(namespace, filename),
+            ExtraArgs={
+                "ContentType": content_type,
+                # Filenames are unique, so objects never change once written
+                "CacheControl": http_cache.IMMUTABLE_CACHE_CONTROL,
+            },
+        )
+        try:
+            os.remove(local_path)
+        except OSError:
+            pass
+
+    def delete(self, namespace: str, filename: str) -> int:
+        key = self._key(namespace, filename)
+        size = 0
+        try:
+            size = self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError:
+            pass
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return size
+
+    def url_for(self, namespace: str, filename: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(namespace, filename)},
+            ExpiresIn=self.presign_ttl,
+        )
+
+
+# Local directories per namespace (writable app directory on Railway)
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MEDIA_DIRS = {
+    "videos": os.path.join(APP_DIR, "generated_videos"),
+    "audio": os.path.join(APP_DIR, "generated_audio"),
+}
+# Files still being written carry this prefix until they're published
+PARTIAL_PREFIX = ".partial_"
+
+_storage: Optional[MediaStorage] = None
+
+
+def get_media_storage() -> MediaStorage:
+    """Return the process-wide storage backend selected by MEDIA_STORAGE_BACKEND"""
+    global _storage
+    if _storage is None:
+        backend = settings.MEDIA_STORAGE_BACKEND
+        if backend == "s3":
+            _storage = S3MediaStorage()
+        elif backend == "local":
+            _storage = LocalMediaStorage(MEDIA_DIRS)
+        else:
+            raise RuntimeError(f"Unknown MEDIA_STORAGE_BACKEND '{backend}' (expected 'local' or 's3')")
+        print(f"📦 Media storage backend: {_storage.name}", flush=True)
+    return _storage
@@ -0,0 +1,170 @@
+"""
+Health-scored pool of HTTP proxies for reaching one upstream.
+
+Every proxy gets its own pooled client (see services/http_clients.py). Each
+request picks a proxy at random, weighted by its recent success rate and
+round-trip time, so a slow proxy gets little traffic and a good one most of
+it. Round-trip time comes from the probes only: a request's own duration is
+mostly upstream work that depends on the request, not on the proxy. A proxy that fails PROXY_EJECT_AFTER_FAILURES times in a row is ejected;
+after an ejection period that doubles with each repeat ejection, background
+probes check it again and re-admit it once it answers. With no admitted
+proxy left, requests fall back to a direct connection.
+"""
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from config import settings
+from services.http_clients import http_clients, proxy_label
+from utils import metrics
+
+metrics.describe("proxy_requests_total", "Requests sent through a proxy, by outcome")
+metrics.describe("proxy_admitted", "1 while a proxy is in rotation, 0 while it is ejected")
+metrics.describe("proxy_rtt_seconds", "Smoothed round-trip time through a proxy")
+metrics.describe("proxy_ejections_total", "Times a proxy was taken out of rotation")
+
+# Smoothing factor for success rate and round-trip time (higher = reacts faster)
+EWMA_ALPHA = 0.3
+# RTT assumed for a proxy we haven't timed yet
+DEFAULT_RTT_SECONDS = 1.0
+# Answers a failing proxy produces itself: auth required, or it couldn't reach or hear back from the upstream
+PROXY_ERROR_STATUSES = (407, 502, 503, 504)
+
+
+class ProxyState:
+    def __init__(self, url: str):
+        self.url = url
+        self.label = proxy_label(url)
+        self.success_rate = 1.0
+        self.rtt: Optional[float] = None
+        self.consecutive_failures = 0
+        self.admitted = True
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.last_probe_at: Optional[float] = None
+
+    def weight(self) -> float:
+        return self.success_rate ** 2 / max(0.05, self.rtt or DEFAULT_RTT_SECONDS)
+
+    def snapshot(self) -> dict:
+        return {
+            "proxy": self.label,
+            "admitted": self.admitted,
+            "success_rate": round(self.success_rate, 3),
+            "rtt_ms": int(self.rtt * 1000) if self.rtt is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "readmit_probe_in_seconds": max(0, int(self.ejected_until - time.monotonic())) if not self.admitted else None,
+            "last_probe_at": self.last_probe_at,
+        }
+
+
+class ProxyPool:
+    def __init__(self, upstream: str, proxies: List[str], probe_url: str, direct_fallback: bool = True):
+        self.upstream = upstream
+        self.proxies: Dict[str, ProxyState] = {url: ProxyState(url) for url in proxies}
+        self.probe_url = probe_url
+        self.direct_fallback = direct_fallback
+        metrics.register_collector(self._collect_metrics)
+
+    def routes(self) -> List[Optional[str]]:
+        """
+        Proxies to try for one request, in order (None = direct connection):
+        up to PROXY_MAX_ATTEMPTS admitted proxies drawn by weight, then direct.
+        """
+        candidates = [p for p in self.proxies.values() if p.admitted]
+        routes: List[Optional[str]] = []
+        while candidates and len(routes) < settings.PROXY_MAX_ATTEMPTS:
+            choice = random.choices(candidates, weights=[p.weight() for p in candidates])[0]
+            candidates.remove(choice)
+            routes.append(choice.url)
+        if self.direct_fallback or not self.proxies:
+            routes.append(None)
+        return routes
+
+    def client(self, proxy: Optional[str]) -> httpx.AsyncClient:
+        return http_clients.get(self.upstream, proxy=proxy)
+
+    def record(self, proxy: Optional[str], ok: bool, rtt: Optional[float] = None):
+        """
+        Outcome of a request or probe through proxy; the direct route isn't
+        scored. rtt is only passed by probes.
+        """
+        state = self.proxies.get(proxy) if proxy else None
+        if state is None:
+            return
+        state.requests += 1
+        state.success_rate += EWMA_ALPHA * ((1.0 if ok else 0.0) - state.success_rate)
+        metrics.inc("proxy_requests_total", proxy=state.label, outcome="success" if ok else "failure")
+        if ok:
+            state.consecutive_failures = 0
+            if rtt is not None:
+                state.rtt = rtt if state.rtt is None else state.rtt + EWMA_ALPHA * (rtt - state.rtt)
+            if not state.admitted:
+                state.admitted = True
+                print(f"✅ Proxy {state.label} re-admitted to the {self.upstream} pool", flush=True)
+            return
+        state.failures += 1
+        state.consecutive_failures += 1
+        if state.admitted and state.consecutive_failures >= settings.PROXY_EJECT_AFTER_FAILURES:
+            self._eject(state)
+        elif not state.admitted:
+            # Failed its re-admission probe: stay out for the next, longer period
+            self._eject(state)
+
+    def _eject(self, state: ProxyState):
+        state.admitted = False
+        state.ejections += 1
+        period = min(settings.PROXY_EJECT_MAX_SECONDS, settings.PROXY_EJECT_BASE_SECONDS * 2 ** (state.ejections - 1))
+        state.ejected_until = time.monotonic() + period
+        metrics.inc("proxy_ejections_total", proxy=state.label)
+        print(f"🚫 Proxy {state.label} ejected from the {self.upstream} pool for {period:.0f}s", flush=True)
+
+    async def _probe(self, state: ProxyState):
+        started = time.perf_counter()
+        try:
+            # Any HTTP answer the upstream gives to a HEAD means the proxy works
+            response = await self.client(state.url).head(self.probe_url, timeout=settings.PROXY_PROBE_TIMEOUT_SECONDS)
+            ok = response.status_code not in PROXY_ERROR_STATUSES
+        except Exception:
+            ok = False
+        state.last_probe_at = time.time()
+        self.record(state.url, ok, time.perf_counter() - started if ok else None)
+
+    async def probe_once(self):
+        """Probe admitted proxies, and ejected ones whose ejection period is over"""
+        now = time.monotonic()
+        due = [p for p in self.proxies.values() if p.admitted or now >= p.ejected_until]
+        await asyncio.gather(*(self._probe(p) for p in due))
+
+    async def run_periodic(self):
+        """Probe at startup and then every PROXY_PROBE_INTERVAL_SECONDS until cancelled"""
+        if not self.proxies:
+            return
+        print(f"🩺 Probing {len(self.proxies)} {self.upstream} proxies every {settings.PROXY_PROBE_INTERVAL_SECONDS}s", flush=True)
+        while True:
+            try:
+                await self.probe_once()
+            except Exception as e:
+                print(f"⚠️ Proxy probe failed: {e}", flush=True)
+            await asyncio.sleep(settings.PROXY_PROBE_INTERVAL_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            "upstream": self.upstream,
+            "direct_fallback": self.direct_fallback,
+            "proxies": [p.snapshot() for p in self.proxies.values()],
+        }
+
+    def _collect_metrics(self):
+        for state in self.proxies.values():
+            metrics.set_gauge("proxy_admitted", 1 if state.admitted else 0, proxy=state.label)
+            if state.rtt is not None:
+                metrics.set_gauge("proxy_rtt_seconds", state.rtt, proxy=state.label)
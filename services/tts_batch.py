@@ -0,0 +1,301 @@
+"""
+Batch TTS jobs: many short texts (IVR prompts, course snippets) voiced in one job.
+
+A job's words are reserved against the user's quota once, when it is created.
+A small pool of workers then synthesizes the items through the TTS router, at
+most TTS_BATCH_CONCURRENCY at a time, so every item gets provider failover and
+the synthesis cache (identical lines inside a batch are synthesized once).
+Each clip is written to the job's directory as soon as it is ready. When the
+job ends, the words of items that failed are refunded.
+
+The ZIP download is produced on the fly: entries are written in item order
+while the job runs, waiting for items that aren't done yet, so the archive is
+never assembled in memory or on disk. Jobs live in the process that created
+them and are dropped, with their clips, TTS_BATCH_RETENTION_SECONDS after they
+finish.
+"""
+import asyncio
+import csv
+import io
+import os
+import re
+import shutil
+import time
+import uuid
+import zipfile
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from config import settings
+from services.tts_cache import APP_DIR, normalize_text
+from services.tts_synthesis import synthesize_in_format
+from services.word_quota import refund_words
+from utils import metrics
+from utils.audio_formats import AudioFormat
+from utils.media_info import audio_duration
+
+metrics.describe("tts_batch_items_total", "Batch TTS items by outcome (done, failed)")
+
+QUEUED = "queued"
+DONE = "done"
+FAILED = "failed"
+
+_NAME_RE = re.compile(r"[^A-Za-z0-9]+")
+
+
+class BatchItem:
+    def __init__(self, index: int, text: str, name: Optional[str], extension: str):
+        self.index = index
+        self.text = text
+        base = _NAME_RE.sub("_", name or " ".join(text.split()[:6])).strip("_")[:40] or "clip"
+        self.filename = f"{index + 1:04d}_{base}.{extension}"
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.provider: Optional[str] = None
+        self.path: Optional[str] = None
+        self.duration_seconds: Optional[float] = None
+        self.finished = asyncio.Event()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        metrics.inc("tts_batch_items_total", outcome=status)
+        self.finished.set()
+
+    def snapshot(self) -> dict:
+        return {
+            "index": self.index,
+            "filename": self.filename,
+            "status": self.status,
+            "provider": self.provider,
+            "duration_seconds": self.duration_seconds,
+            "error": self.error,
+        }
+
+
+class BatchJob:
+    def __init__(
+        self, user_id: int, plan: str, items: List[BatchItem], voice: Optional[dict], audio_format: AudioFormat,
+        words_reserved: int, directory: str
+    ):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.plan = plan
+        self.items = items
+        self.voice = voice
+        self.audio_format = audio_format
+        self.words_reserved = words_reserved
+        self.words_refunded = 0
+        self.directory = os.path.join(directory, self.id)
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    async def _synthesize(self, item: BatchItem, duplicates: List[BatchItem]):
+        voices = {self.voice["provider"]: self.voice["id"]} if self.voice else None
+        try:
+            audio, routed = await synthesize_in_format(self.plan, item.text, self.audio_format, voices=voices)
+            path = os.path.join(self.directory, item.filename)
+            await asyncio.to_thread(_write_file, path, audio)
+        except Exception as e:
+            for each in [item, *duplicates]:
+                each.finish(FAILED, str(e))
+            return
+        duration_seconds = audio_duration(audio)
+        for each in [item, *duplicates]:
+            each.provider = routed.provider
+            each.path = path
+            each.duration_seconds = duration_seconds
+            each.finish(DONE)
+
+    async def run(self):
+        """Work through the items with TTS_BATCH_CONCURRENCY workers, then refund failed items"""
+        os.makedirs(self.directory, exist_ok=True)
+        # Lines that normalize to the same text are synthesized once and shared
+        unique: Dict[str, Tuple[BatchItem, List[BatchItem]]] = {}
+        for item in self.items:
+            key = normalize_text(item.text)
+            if key in unique:
+                unique[key][1].append(item)
+            else:
+                unique[key] = (item, [])
+        queue: "asyncio.Queue[Tuple[BatchItem, List[BatchItem]]]" = asyncio.Queue()
+        for entry in unique.values():
+            queue.put_nowait(entry)
+
+        async def worker():
+            while True:
+                try:
+                    item, duplicates = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._synthesize(item, duplicates)
+
+        started = time.perf_counter()
+        print(f"📦 Batch {self.id[:8]}: {len(self.items)} items ({len(unique)} unique) for user {self.user_id}", flush=True)
+        try:
+            workers = min(settings.TTS_BATCH_CONCURRENCY, len(unique))
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        finally:
+            for item in self.items:
+                if not item.finished.is_set():
+                    item.finish(FAILED, "Batch was cancelled")
+            self.finished_at = time.time()
+            await self._refund_failed()
+        failed = sum(1 for item in self.items if item.status == FAILED)
+        print(f"✅ Batch {self.id[:8]} finished in {time.perf_counter() - started:.1f}s ({failed} failed)", flush=True)
+
+    async def _refund_failed(self):
+        """Give back the reserved words of items that produced no audio"""
+        words = sum(len(item.text.split()) for item in self.items if item.status == FAILED)
+        if not words:
+            return
+        try:
+            await asyncio.to_thread(refund_words, self.user_id, self.plan, words)
+            self.words_refunded = words
+        except Exception as e:
+            print(f"❌ Could not refund {words} words for batch {self.id[:8]}: {e}", flush=True)
+
+    def manifest(self) -> bytes:
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["index", "filename", "status", "provider", "duration_seconds", "error", "text"])
+        for item in self.items:
+            writer.writerow([
+                item.index, item.filename, item.status, item.provider or "",
+                "" if item.duration_seconds is None else item.duration_seconds, item.error or "", item.text
+            ])
+        return out.getvalue().encode("utf-8")
+
+    async def zip_stream(self) -> AsyncIterator[bytes]:
+        """
+        The job as a ZIP (clips in item order plus manifest.csv), written while
+        it's streamed. Waits for items still being synthesized; failed items are
+        only listed in the manifest.
+        """
+        sink = _ZipSink()
+        date_time = time.localtime(self.created_at)[:6]
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+            for item in self.items:
+                await item.finished.wait()
+                if item.status != DONE:
+                    continue
+                data = await asyncio.to_thread(_read_file, item.path)
+                archive.writestr(zipfile.ZipInfo(item.filename, date_time=date_time), data)
+                yield sink.drain()
+            archive.writestr(zipfile.ZipInfo("manifest.csv", date_time=date_time), self.manifest())
+        yield sink.drain()
+
+    def snapshot(self) -> dict:
+        completed = sum(1 for item in self.items if item.status == DONE)
+        failed = sum(1 for item in self.items if item.status == FAILED)
+        expires_at = self.finished_at + settings.TTS_BATCH_RETENTION_SECONDS if self.done else None
+        return {
+            "job_id": self.id,
+            "status": "completed" if self.done else "running",
+            "total": len(self.items),
+            "completed": completed,
+            "failed": failed,
+            "words_reserved": self.words_reserved,
+            "words_refunded": self.words_refunded,
+            "voice_id": self.voice["id"] if self.voice else None,
+            "audio_format": self.audio_format.key,
+            "created_at": int(self.created_at),
+            "expires_at": int(expires_at) if expires_at else None,
+            "download_url": f"/api/tts/batch/{self.id}/zip",
+            "items": [item.snapshot() for item in self.items],
+        }
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable output for ZipFile; whatever it wrote since the last drain() is handed out"""
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _write_file(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def parse_csv(content: bytes) -> List[Tuple[str, Optional[str]]]:
+    """
+    (text, name) rows from an uploaded CSV. With a header row naming a "text"
+    column, an optional "name" column names the clips; otherwise every row's
+    first column is a text. Blank rows are skipped.
+    """
+    rows = [row for row in csv.reader(io.StringIO(content.decode("utf-8-sig"))) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "text" in header:
+        text_col = header.index("text")
+        name_col = header.index("name") if "name" in header else None
+        return [
+            (row[text_col].strip(), row[name_col].strip() if name_col is not None and name_col < len(row) else None)
+            for row in rows[1:]
+            if text_col < len(row) and row[text_col].strip()
+        ]
+    return [(row[0].strip(), None) for row in rows if row[0].strip()]
+
+
+class BatchRegistry:
+    def __init__(self, directory: str):
+        self.directory = os.path.abspath(directory)
+        self.jobs: Dict[str, BatchJob] = {}
+
+    def start(
+        self, user_id: int, plan: str, entries: List[Tuple[str, Optional[str]]], voice: Optional[dict],
+        audio_format: AudioFormat, words_reserved: int
+    ) -> BatchJob:
+        self.purge_expired()
+        items = [BatchItem(index, text, name, audio_format.extension) for index, (text, name) in enumerate(entries)]
+        job = BatchJob(user_id, plan, items, voice, audio_format, words_reserved, self.directory)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(job.run())
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[BatchJob]:
+        job = self.jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def purge_expired(self):
+        """Drop finished jobs past their retention, and clip directories no job owns (left by a restart)"""
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.done and now - job.finished_at > settings.TTS_BATCH_RETENTION_SECONDS:
+                del self.jobs[job_id]
+                shutil.rmtree(job.directory, ignore_errors=True)
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name not in self.jobs and now - os.path.getmtime(path) > settings.TTS_BATCH_RETENTION_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+tts_batches = BatchRegistry(settings.TTS_BATCH_DIR or os.path.join(APP_DIR, "tts_batches"))
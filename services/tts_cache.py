@@ -0,0 +1,267 @@
+"""
+Two-tier cache for synthesized speech: an in-memory LRU in front of a
+content-addressed store on disk.
+
+On disk, audio blobs are stored once under the SHA-256 of their bytes and
+small ref files map a request key to a blob. Identical audio reached through
+different requests is therefore stored once. Both tiers evict by size, least
+recently used first; on disk, refs count against the budget and go with the
+blob they point to.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from utils import metrics
+
+metrics.describe("tts_cache_lookups_total", "TTS cache lookups by result (memory, disk, miss)")
+metrics.describe("tts_cache_bytes_saved_total", "Audio bytes served from cache instead of the provider")
+metrics.describe("tts_cache_bytes", "Bytes currently held per cache tier")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _usage(st: os.stat_result) -> int:
+    """Bytes a file takes on disk: allocated blocks where the platform reports them (a tiny ref still uses one)"""
+    blocks = getattr(st, "st_blocks", None)
+    return blocks * 512 if blocks else st.st_size
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for both the cache key and the upstream request"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_key(text: str, voice_id: str, model_id: str, voice_settings: Optional[dict], output_format: str) -> str:
+    descriptor = {
+        "text": normalize_text(text),
+        "voice": voice_id,
+        "model": model_id,
+        "settings": voice_settings or {},
+        "format": output_format,
+    }
+    return hashlib.sha256(json.dumps(descriptor, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    def __init__(self, cache_dir: str, memory_max_bytes: int, disk_max_bytes: int):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.refs_dir = os.path.join(self.cache_dir, "refs")
+        self.blobs_dir = os.path.join(self.cache_dir, "blobs")
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: Optional[int] = None  # computed lazily on first write
+        self._disk_lock = threading.Lock()
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    # ---- memory tier ----
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+        return data
+
+    def _memory_put(self, key: str, data: bytes):
+        if len(data) > self.memory_max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # ---- disk tier (blocking, run in a thread) ----
+
+    def _ref_path(self, key: str) -> str:
+        return os.path.join(self.refs_dir, key[:2], key)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._ref_path(key), "r") as f:
+                digest = f.read().strip()
+            blob = self._blob_path(digest)
+            with open(blob, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        # Blobs never change, so their timestamps double as the LRU clock
+        # (atime alone is unreliable on noatime mounts)
+        try:
+            now = time.time()
+            os.utime(blob, (now, now))
+        except OSError:
+            pass
+        return data
+
+    def _scan_disk_bytes(self) -> int:
+        total = 0
+        for directory in (self.blobs_dir, self.refs_dir):
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    try:
+                        total += _usage(os.stat(os.path.join(root, name)))
+                    except OSError:
+                        pass
+        return total
+
+    def _disk_put(self, key: str, data: bytes):
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self._blob_path(digest)
+        ref = self._ref_path(key)
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            if not os.path.exists(blob):
+                self._write_atomic(blob, data)
+                self._disk_bytes += _usage(os.stat(blob))
+            else:
+                os.utime(blob)  # a new ref to it counts as a use
+            new_ref = not os.path.exists(ref)
+            self._write_atomic(ref, digest.encode("ascii"))
+            if new_ref:
+                self._disk_bytes += _usage(os.stat(ref))
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """
+        Delete least recently used blobs, and the refs pointing to them, down to
+        90% of the budget. Refs whose blob is already gone are dropped as well.
+        """
+        blobs: List[Tuple[float, str, str, int]] = []  # (mtime, digest, path, usage)
+        for root, _, files in os.walk(self.blobs_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                blobs.append((st.st_mtime, name, path, _usage(st)))
+        refs: Dict[str, List[Tuple[str, int]]] = {}  # digest -> [(ref path, usage)]
+        for root, _, files in os.walk(self.refs_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                    with open(path, "r") as f:
+                        digest = f.read().strip()
+                except OSError:
+                    continue
+                refs.setdefault(digest, []).append((path, _usage(st)))
+
+        total = sum(usage for _, _, _, usage in blobs) + sum(usage for entries in refs.values() for _, usage in entries)
+
+        def remove_refs(digest: str):
+            nonlocal total
+            for path, usage in refs.pop(digest, ()):
+                try:
+                    os.remove(path)
+                    total -= usage
+                except OSError:
+                    pass
+
+        for digest in set(refs) - {digest for _, digest, _, _ in blobs}:
+            remove_refs(digest)
+        blobs.sort()
+        target = int(self.disk_max_bytes * 0.9)
+        for _, digest, path, usage in blobs:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= usage
+            except OSError:
+                continue
+            remove_refs(digest)
+        self._disk_bytes = total
+        print(f"🧹 TTS cache evicted down to {total / 1024 / 1024:.1f} MB", flush=True)
+
+    # ---- public API ----
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._memory_get(key)
+        if data is not None:
+            self.hits_memory += 1
+            self._record_hit("memory", data)
+            return data
+        data = await asyncio.to_thread(self._disk_get, key)
+        if data is not None:
+            self.hits_disk += 1
+            self._memory_put(key, data)
+            self._record_hit("disk", data)
+            return data
+        self.misses += 1
+        metrics.inc("tts_cache_lookups_total", result="miss")
+        return None
+
+    async def put(self, key: str, data: bytes):
+        if not data:
+            return
+        self._memory_put(key, data)
+        try:
+            await asyncio.to_thread(self._disk_put, key, data)
+        except OSError as e:
+            print(f"⚠️ Could not write TTS cache entry: {e}", flush=True)
+
+    def _record_hit(self, tier: str, data: bytes):
+        self.bytes_saved += len(data)
+        metrics.inc("tts_cache_lookups_total", result=tier)
+        metrics.inc("tts_cache_bytes_saved_total", len(data))
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_ratio": ((self.hits_memory + self.hits_disk) / lookups) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "memory_bytes": self._memory_bytes,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def collect_metrics(self):
+        metrics.set_gauge("tts_cache_bytes", self._memory_bytes, tier="memory")
+        if self._disk_bytes is not None:
+            metrics.set_gauge("tts_cache_bytes", self._disk_bytes, tier="disk")
+
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+tts_cache = TTSCache(
+    cache_dir=settings.TTS_CACHE_DIR or os.path.join(APP_DIR, "tts_cache"),
+    memory_max_bytes=settings.TTS_CACHE_MEMORY_MB * 1024 * 1024,
+    disk_max_bytes=settings.TTS_CACHE_DISK_MB * 1024 * 1024,
+)
+metrics.register_collector(tts_cache.collect_metrics)
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from utils import metrics
+
+metrics.describe("tts_model_attempts_total", "Upstream synthesis attempts per model and outcome")
+
+
+class ModelRegistry:
+    """
+    Remembers which TTS models work for our API key.
+
+    Models that answered model_deprecated* are skipped, and the model that last
+    succeeded is tried first, so a deprecated preferred model no longer costs a
+    failed round trip on every request. While we're on a fallback, the preferred
+    model is re-probed in the background at most once per reprobe_interval.
+    """
+
+    def __init__(self, provider: str, models: List[str], reprobe_interval: float):
+        self.provider = provider
+        self.models = list(models)  # in order of preference
+        self.preferred = self.models[0]
+        self.reprobe_interval = reprobe_interval
+        self.deprecated: Dict[str, dict] = {}  # model -> {"since": ts, "reason": str}
+        self.last_success: Optional[str] = None
+        self.last_success_at: Optional[float] = None
+        self.last_probe_at: float = 0.0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def order(self) -> List[str]:
+        """Models to try for the next request: known-good first, deprecated ones never"""
+        usable = [m for m in self.models if m not in self.deprecated]
+        if not usable:
+            # Everything looks deprecated - better to try again than to refuse outright
+            usable = list(self.models)
+        if self.last_success in usable:
+            usable.remove(self.last_success)
+            usable.insert(0, self.last_success)
+        return usable
+
+    def mark_success(self, model: str):
+        if model in self.deprecated:
+            print(f"✅ {self.provider} model {model} is available again", flush=True)
+        self.deprecated.pop(model, None)
+        self.last_success = model
+        self.last_success_at = time.time()
+        metrics.inc("tts_model_attempts_total", provider=self.provider, model=model, outcome="success")
+
+    def mark_deprecated(self, model: str, reason: str):
+        if model not in self.deprecated:
+            print(f"📝 Remembering {self.provider} model {model} as unavailable: {reason[:200]}", flush=True)
+        self.deprecated[model] = {"since": time.time(), "reason": reason[:500]}
+        if self.last_success == model:
+            self.last_success = None
+        # The model just answered: the next re-probe is a full interval away, not the next fallback success
+        self.last_probe_at = time.time()
+        metrics.inc("tts_model_attempts_total", provider=self.provider, model=model, outcome="deprecated")
+
+    def mark_failure(self, model: str):
+        metrics.inc("tts_model_attempts_total", provider=self.provider, model=model, outcome="error")
+
+    def maybe_reprobe(self, probe: Callable[[str], Awaitable[bool]]):
+        """
+        If we're not on the preferred model, schedule one background probe of it
+        (rate limited). probe(model) returns True when the model works.
+        """
+        if self.last_success == self.preferred:
+            return
+        if self._probe_task is not None and not self._probe_task.done():
+            return
+        if time.time() - self.last_probe_at < self.reprobe_interval:
+            return
+        self.last_probe_at = time.time()
+        self._probe_task = asyncio.create_task(self._reprobe(probe))
+
+    async def _reprobe(self, probe: Callable[[str], Awaitable[bool]]):
+        model = self.preferred
+        print(f"🔎 Re-probing preferred {self.provider} model {model} in the background", flush=True)
+        try:
+            if await probe(model):
+                self.mark_success(model)
+        except Exception as e:
+            print(f"⚠️ Background probe of {model} failed: {e}", flush=True)
+
+    def status(self) -> dict:
+        return {
+            "provider": self.provider,
+            "preferred_model": self.preferred,
+            "current_model": self.order()[0],
+            "last_success": self.last_success,
+            "last_success_at": self.last_success_at,
+            "unavailable_models": self.deprecated,
+            "next_reprobe_after": (self.last_probe_at + self.reprobe_interval) if self.last_success != self.preferred else None,
+        }
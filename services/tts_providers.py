@@ -0,0 +1,109 @@
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from utils.audio_formats import DEFAULT_FORMAT, AudioFormat
+from utils.deadline import Deadline
+from utils.rate_limiter import RateLimitTimeout, TokenBucket
+
+
+# Characters the current routed attempt sent upstream, set per attempt by the
+# router. Cache hits add nothing, so latency samples only cover real synthesis.
+_upstream_characters: ContextVar[Optional[List[int]]] = ContextVar("upstream_characters", default=None)
+
+
+def track_upstream(counter: List[int]):
+    """Count upstream characters into counter[0] for the current task (and the tasks it creates)"""
+    _upstream_characters.set(counter)
+
+
+def count_upstream(text: str):
+    """Called by providers right before a real (uncached) upstream synthesis"""
+    counter = _upstream_characters.get()
+    if counter is not None:
+        counter[0] += len(text)
+
+
+class TTSProviderError(Exception):
+    """
+    A provider failed to synthesize. status_code is the upstream HTTP status, or
+    None when no response came back (timeout, connection or proxy failure).
+    """
+
+    def __init__(self, message: str, provider: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+
+    @property
+    def should_failover(self) -> bool:
+        """Out of credit, rate limited, upstream trouble or no answer: another provider may succeed"""
+        return self.status_code is None or self.status_code in (402, 429) or self.status_code >= 500
+
+
+class DeadlineExceeded(TTSProviderError):
+    """The request's time budget ran out; no other provider can help any more"""
+
+    @property
+    def should_failover(self) -> bool:
+        return False
+
+
+class TTSProvider:
+    """
+    A text-to-speech backend the router can send requests to. Implementations
+    return MP3 bytes, or another format they produce natively when asked, and
+    raise TTSProviderError when the upstream fails.
+    """
+
+    name = "base"
+    default_voice = ""
+    # Client-side rate limit for this provider account, if one is configured
+    limiter: Optional[TokenBucket] = None
+
+    @property
+    def configured(self) -> bool:
+        """False when the provider can't be used in this deployment (e.g. no API key)"""
+        return True
+
+    async def throttle(self, deadline: Optional[Deadline] = None):
+        """
+        Wait for a rate limit token before an upstream call. When none is free
+        within the deadline, fail like the provider's own 429 would, so the
+        router can move on to another provider.
+        """
+        if self.limiter is None:
+            return
+        try:
+            await self.limiter.acquire(deadline.remaining() if deadline is not None else None)
+        except RateLimitTimeout as e:
+            raise TTSProviderError(f"Voice generation failed: {e}", self.name, 429)
+
+    def supports_format(self, audio_format: AudioFormat) -> bool:
+        """Whether synthesize() can return audio_format without a transcode"""
+        return audio_format == DEFAULT_FORMAT
+
+    def hedge_models(self) -> List[str]:
+        """Models a hedged duplicate may use when there is no other provider to hedge to"""
+        return []
+
+    async def fetch_voices(self, etag: Optional[str] = None) -> Tuple[Optional[List[dict]], Optional[str]]:
+        """
+        The provider's voices as [{"id", "name", ...}] and the listing's ETag.
+        Returns (None, etag) when the listing hasn't changed since etag.
+        """
+        return [{"id": self.default_voice, "name": self.default_voice}], None
+
+    async def synthesize(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        model: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        audio_format: AudioFormat = DEFAULT_FORMAT,
+    ) -> bytes:
+        """
+        model pins one model instead of the provider's own choice; deadline bounds
+        every upstream call; audio_format must be one supports_format() accepts.
+        Implementations call count_upstream() when a request isn't served from cache.
+        """
+        raise NotImplementedError
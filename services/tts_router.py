@@ -0,0 +1,282 @@
+"""
+Routes synthesis requests across the configured TTS providers.
+
+Each provider keeps a rolling window of recent outcomes. A request goes to the
+healthiest provider its plan allows: providers whose error rate is over
+TTS_ROUTER_MAX_ERROR_RATE go last, the rest are ranked by recent latency per
+character (providers without recent samples are tried first, so a recovered or
+new provider gets traffic again). Failures that another provider may not share
+(402, 429, 5xx, timeouts, an open circuit breaker) fail over to the next
+candidate; request errors such as 400/401 are raised straight away.
+Latency samples are time per character actually sent upstream, so answers
+from the providers' caches don't make a provider look faster than it is.
+
+Every request carries a deadline budget. When the primary is slower than its
+observed p95, one hedged duplicate goes to the next provider (or model) and
+the first answer wins; hedges are capped at TTS_HEDGE_MAX_RATIO of requests.
+"""
+import asyncio
+import functools
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+from config import settings
+from services.elevenlabs_service import ElevenLabsService
+from services.lamonfox_service import LAMONFOX_API_KEY, LamonfoxService
+from services.tts_providers import DeadlineExceeded, TTSProvider, TTSProviderError, track_upstream
+from utils import metrics
+from utils.audio_formats import DEFAULT_FORMAT, AudioFormat
+from utils.circuit_breaker import CircuitOpenError
+from utils.deadline import Deadline
+
+metrics.describe("tts_router_requests_total", "Routed TTS requests per provider and outcome")
+metrics.describe("tts_router_latency_seconds", "Upstream synthesis time per provider")
+metrics.describe("tts_router_error_rate", "Provider error rate over the rolling window")
+metrics.describe("tts_router_hedges_total", "Hedged duplicate requests started, per hedge target")
+metrics.describe("tts_router_hedge_wins_total", "Hedged duplicates that answered before the primary")
+
+T = TypeVar("T")
+
+
+class RoutedResult(NamedTuple):
+    value: object
+    provider: str
+    latency_ms: Optional[int]  # None when the provider answered entirely from its cache
+    # What the provider was asked to produce: the requested format when it supports it natively
+    audio_format: AudioFormat = DEFAULT_FORMAT
+
+
+class ProviderStats:
+    """Outcomes of recent requests to one provider, kept for window_seconds"""
+
+    def __init__(self, window_seconds: float, max_samples: int = 200):
+        self.window_seconds = window_seconds
+        # (timestamp, seconds per 1000 characters, ok)
+        self.samples: Deque[Tuple[float, float, bool]] = deque(maxlen=max_samples)
+
+    def _prune(self):
+        cutoff = time.time() - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def record(self, seconds: float, characters: int, ok: bool):
+        self.samples.append((time.time(), seconds * 1000 / max(1, characters), ok))
+
+    def error_rate(self) -> float:
+        self._prune()
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, _, ok in self.samples if not ok) / len(self.samples)
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """Seconds per 1000 characters at quantile q over successful requests, None without data"""
+        self._prune()
+        latencies = sorted(latency for _, latency, ok in self.samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def snapshot(self) -> dict:
+        return {
+            "samples": len(self.samples),
+            "error_rate": self.error_rate(),
+            "p50_seconds_per_1k_chars": self.latency_quantile(0.5),
+            "p95_seconds_per_1k_chars": self.latency_quantile(0.95),
+        }
+
+
+class TTSRouter:
+    def __init__(self, providers: List[TTSProvider], preferences: Dict[str, List[str]]):
+        self.providers: Dict[str, TTSProvider] = {p.name: p for p in providers}
+        self.preferences = preferences
+        self.stats: Dict[str, ProviderStats] = {
+            p.name: ProviderStats(settings.TTS_ROUTER_WINDOW_SECONDS) for p in providers
+        }
+        # Request and hedge timestamps over the rolling window, for the hedge-rate cap
+        self._request_log: Deque[float] = deque()
+        self._hedge_log: Deque[float] = deque()
+        metrics.register_collector(self._collect_metrics)
+
+    def candidates(self, plan: str) -> List[TTSProvider]:
+        """Providers to try for a request on this plan, best first"""
+        names = self.preferences.get(plan) or self.preferences.get("Paid") or list(self.providers)
+        allowed = [self.providers[n] for n in names if n in self.providers and self.providers[n].configured]
+        if not allowed:
+            # Nothing usable is configured - try the preference order anyway so the error surfaces
+            allowed = [self.providers[n] for n in names if n in self.providers] or list(self.providers.values())
+
+        def rank(item):
+            index, provider = item
+            stats = self.stats[provider.name]
+            unhealthy = stats.error_rate() > settings.TTS_ROUTER_MAX_ERROR_RATE
+            latency = stats.latency_quantile(0.5)
+            return (unhealthy, latency if latency is not None else 0.0, index)
+
+        return [p for _, p in sorted(enumerate(allowed), key=rank)]
+
+    def _record(self, provider: str, seconds: float, characters: int, outcome: str):
+        self.stats[provider].record(seconds, characters, outcome == "success")
+        metrics.inc("tts_router_requests_total", provider=provider, outcome=outcome)
+        if outcome == "success":
+            metrics.observe("tts_router_latency_seconds", seconds, provider=provider)
+
+    def _lanes(self, plan: str, only: Optional[Dict[str, str]] = None) -> List[Tuple[TTSProvider, Optional[str]]]:
+        """(provider, pinned model) to try in order: other providers first, else other models"""
+        candidates = [p for p in self.candidates(plan) if only is None or p.name in only]
+        lanes: List[Tuple[TTSProvider, Optional[str]]] = [(p, None) for p in candidates]
+        if len(candidates) == 1:
+            lanes += [(candidates[0], m) for m in candidates[0].hedge_models()]
+        return lanes
+
+    def _hedge_delay(self, provider: str, characters: int) -> float:
+        """Seconds to wait for the primary before hedging: its observed p95 for a text this long"""
+        p95 = self.stats[provider].latency_quantile(0.95)
+        if p95 is None:
+            return settings.TTS_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(settings.TTS_HEDGE_MIN_DELAY_SECONDS, p95 * characters / 1000)
+
+    def _may_hedge(self) -> bool:
+        """Hedges stay under TTS_HEDGE_MAX_RATIO of requests over the rolling window"""
+        if not settings.TTS_HEDGE_ENABLED:
+            return False
+        cutoff = time.time() - settings.TTS_ROUTER_WINDOW_SECONDS
+        for log in (self._request_log, self._hedge_log):
+            while log and log[0] < cutoff:
+                log.popleft()
+        return len(self._hedge_log) < settings.TTS_HEDGE_MAX_RATIO * len(self._request_log)
+
+    async def run(
+        self,
+        plan: str,
+        characters: int,
+        operation: Callable[[Callable[[str], Awaitable[bytes]]], Awaitable[T]],
+        deadline: Optional[Deadline] = None,
+        voices: Optional[Dict[str, str]] = None,
+        audio_format: AudioFormat = DEFAULT_FORMAT,
+    ) -> RoutedResult:
+        """
+        Run operation(generate) on the best provider for plan, where generate(text)
+        synthesizes with that provider under the request's deadline.
+
+        Provider-side errors fail over to the next lane. If the primary hasn't
+        answered by its observed p95, one hedged duplicate is started on the next
+        lane (another provider, or another model when there is only one provider);
+        the first success wins and the other is cancelled. characters is the size
+        of the text, used to compare latencies across requests of different lengths.
+        voices ({provider: voice id}) restricts the request to providers offering
+        the chosen voice; without it every provider uses its default voice.
+        Providers that produce audio_format natively are asked for it, the others
+        for MP3; the result's audio_format says which one the value is in.
+        """
+        deadline = deadline or Deadline(settings.TTS_REQUEST_DEADLINE_SECONDS)
+        lanes = self._lanes(plan, voices)
+        if not lanes:
+            raise TTSProviderError("Voice generation failed: No TTS provider is configured", "router")
+        self._request_log.append(time.time())
+        request_started = time.perf_counter()
+
+        # task -> (provider, model, start time, format, [characters sent upstream])
+        pending: Dict[asyncio.Task, Tuple[TTSProvider, Optional[str], float, AudioFormat, List[int]]] = {}
+        next_lane = 0
+        hedged = False
+        last_error: Optional[Exception] = None
+
+        def launch():
+            nonlocal next_lane
+            provider, model = lanes[next_lane]
+            next_lane += 1
+            voice = voices.get(provider.name) if voices else None
+            fmt = audio_format if provider.supports_format(audio_format) else DEFAULT_FORMAT
+            generate = functools.partial(provider.synthesize, voice=voice, model=model, deadline=deadline, audio_format=fmt)
+            upstream = [0]
+
+            async def attempt():
+                track_upstream(upstream)  # also counts in the subtasks the operation creates
+                return await operation(generate)
+
+            pending[asyncio.create_task(attempt())] = (provider, model, time.perf_counter(), fmt, upstream)
+
+        launch()
+        try:
+            while pending:
+                timeout = deadline.remaining()
+                can_hedge = not hedged and len(pending) == 1 and next_lane < len(lanes)
+                if can_hedge:
+                    primary, _, primary_started, _, _ = next(iter(pending.values()))
+                    hedge_at = primary_started + self._hedge_delay(primary.name, characters)
+                    timeout = min(timeout, max(0.0, hedge_at - time.perf_counter()))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if deadline.expired:
+                        raise DeadlineExceeded(
+                            f"Voice generation failed: deadline of {deadline.seconds:.0f}s exceeded", "router"
+                        )
+                    if can_hedge:
+                        hedged = True
+                        if self._may_hedge():
+                            self._hedge_log.append(time.time())
+                            provider, model = lanes[next_lane]
+                            print(f"🪁 Hedging slow {primary.name} request to {provider.name}{f' ({model})' if model else ''}", flush=True)
+                            metrics.inc("tts_router_hedges_total", provider=provider.name)
+                            launch()
+                    continue
+
+                for task in done:
+                    provider, model, started, fmt, upstream = pending.pop(task)
+                    elapsed = time.perf_counter() - started
+                    try:
+                        value = task.result()
+                    except (TTSProviderError, CircuitOpenError) as e:
+                        if isinstance(e, TTSProviderError) and not e.should_failover:
+                            # The request itself is bad (or out of time); another provider won't do better
+                            raise
+                        self._record(provider.name, elapsed, characters, "failover")
+                        reason = "circuit open" if isinstance(e, CircuitOpenError) else f"status {e.status_code}"
+                        print(f"🔀 {provider.name} failed ({reason}) - failing over", flush=True)
+                        last_error = e
+                        if not pending and next_lane < len(lanes):
+                            launch()
+                        continue
+                    if hedged and len(lanes) > 1 and (provider, model) != lanes[0]:
+                        metrics.inc("tts_router_hedge_wins_total", provider=provider.name)
+                    if not upstream[0]:
+                        # Served from the provider's cache: says nothing about its latency
+                        metrics.inc("tts_router_requests_total", provider=provider.name, outcome="cached")
+                        return RoutedResult(value, provider.name, None, fmt)
+                    # Latency per character of what was actually synthesized, not of cached sentences
+                    self._record(provider.name, elapsed, upstream[0], "success")
+                    # Callers see the whole request, including any wait before a hedge or failover
+                    return RoutedResult(value, provider.name, int((time.perf_counter() - request_started) * 1000), fmt)
+        finally:
+            # Cancel the loser of a hedge (or everything, on error)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if last_error is not None:
+            raise last_error
+        raise TTSProviderError("Voice generation failed: No TTS provider is configured", "router")
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {"configured": provider.configured, **self.stats[name].snapshot()}
+            for name, provider in self.providers.items()
+        }
+
+    def _collect_metrics(self):
+        for name, stats in self.stats.items():
+            metrics.set_gauge("tts_router_error_rate", stats.error_rate(), provider=name)
+
+
+def _build_providers() -> List[TTSProvider]:
+    providers: List[TTSProvider] = [ElevenLabsService()]
+    # Lamonfox is opt-in: only deployments with a key route to it
+    if LAMONFOX_API_KEY:
+        providers.append(LamonfoxService())
+    return providers
+
+
+tts_router = TTSRouter(_build_providers(), settings.TTS_PROVIDER_PREFERENCES)
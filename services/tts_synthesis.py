@@ -0,0 +1,162 @@
+"""
+Sentence-level synthesis on top of a provider's generate_voice().
+
+Text is split into sentences and each sentence is synthesized on its own. The
+provider services cache results per (text, voice, model, settings, format), so
+a sentence that was already synthesized costs nothing upstream. After editing
+one sentence of a paragraph, only that sentence is sent to the provider; the
+clips are then joined at MP3 frame boundaries.
+
+Long texts go through synthesize_long_form() instead, which synthesizes larger
+chunks concurrently and hands them back in order as soon as each is ready.
+
+synthesize_in_format() is the routed entry point for a whole request in the
+client's output format (see utils/audio_formats.py).
+"""
+import asyncio
+import weakref
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from services.audio_transcode import convert
+from services.tts_providers import DeadlineExceeded, TTSProviderError
+from services.tts_router import RoutedResult, tts_router
+from utils import metrics, offload
+from utils.audio_formats import DEFAULT_FORMAT, AudioFormat
+from utils.audio_utils import add_watermark_to_audio
+from utils.mp3_frames import audio_frames, concat_mp3
+from utils.text_segmentation import chunk_text, split_sentences
+
+metrics.describe("tts_longform_chunk_retries_total", "Long-form chunks that needed another synthesis attempt")
+
+# One semaphore per user, shared by all of that user's long-form jobs and dropped
+# once none of them is running
+_user_semaphores: "weakref.WeakValueDictionary[int, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+
+async def synthesize_sentences(generate: Callable[[str], Awaitable[bytes]], text: str) -> bytes:
+    """
+    generate(sentence) -> MP3 bytes, typically a bound provider generate_voice with
+    its voice already chosen. Falls back to a single call for one-sentence texts or
+    when sentence synthesis is disabled.
+    """
+    sentences = split_sentences(text) if settings.TTS_SENTENCE_SYNTHESIS else []
+    if len(sentences) <= 1:
+        return await generate(text)
+
+    semaphore = asyncio.Semaphore(settings.TTS_SENTENCE_CONCURRENCY)
+
+    async def one(sentence: str) -> bytes:
+        async with semaphore:
+            return await generate(sentence)
+
+    clips: List[bytes] = await asyncio.gather(*(one(s) for s in sentences))
+    print(f"🧩 Stitched {len(clips)} sentence clips", flush=True)
+    # Frame scanning is a pure-Python loop over every byte of audio
+    return await offload.run_in_process("mp3_concat", concat_mp3, clips)
+
+
+async def synthesize_in_format(
+    plan: str,
+    text: str,
+    audio_format: AudioFormat = DEFAULT_FORMAT,
+    voices: Optional[Dict[str, str]] = None,
+    watermark: bool = False,
+) -> Tuple[bytes, RoutedResult]:
+    """
+    Synthesize text through the router (sentence by sentence) and return it in
+    audio_format, with the routing result.
+
+    MP3 at any bitrate comes straight from providers that produce it, since
+    MP3 clips can be stitched and watermarked at frame level. Other codecs are
+    only requested natively when the text is a single synthesis call and needs
+    no watermark. Everything else is synthesized as MP3 and converted, with
+    the conversion cached.
+    """
+    single_call = not settings.TTS_SENTENCE_SYNTHESIS or len(split_sentences(text)) <= 1
+    ask = audio_format if audio_format.codec == "mp3" or (single_call and not watermark) else DEFAULT_FORMAT
+    routed = await tts_router.run(
+        plan, len(text), lambda generate: synthesize_sentences(generate, text), voices=voices, audio_format=ask
+    )
+    audio = routed.value
+    if watermark:
+        # Only MP3 is ever asked for when watermarking
+        audio = await add_watermark_to_audio(audio)
+    return await convert(audio, routed.audio_format, audio_format), routed
+
+
+def _user_semaphore(user_id: int) -> asyncio.Semaphore:
+    semaphore = _user_semaphores.get(user_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.TTS_LONGFORM_USER_CONCURRENCY)
+        _user_semaphores[user_id] = semaphore
+    return semaphore
+
+
+def routed_generate(
+    plan: str, provider: str, voice: Optional[str], audio_format: AudioFormat
+) -> Callable[[str], Awaitable[bytes]]:
+    """
+    generate(text) for long-form chunks: each call goes through the router, with
+    its own deadline, stats and failover to the provider's other models, but
+    never to another provider, since the chunks are spliced into one voice.
+    """
+    async def generate(text: str) -> bytes:
+        routed = await tts_router.run(
+            plan, len(text), lambda generate: generate(text), voices={provider: voice}, audio_format=audio_format
+        )
+        return routed.value
+    return generate
+
+
+def _is_transient(error: Exception) -> bool:
+    """Timeouts, rate limits and upstream 5xx are worth another try; bad requests and spent credit aren't"""
+    if isinstance(error, DeadlineExceeded):
+        return True  # the chunk's own budget ran out; a retry gets a fresh one
+    if isinstance(error, TTSProviderError):
+        return error.status_code is None or error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, asyncio.TimeoutError)
+
+
+async def _generate_with_retry(generate: Callable[[str], Awaitable[bytes]], chunk: str, index: int) -> bytes:
+    """Retry one chunk on its own after a transient failure; chunks that already succeeded are never re-sent"""
+    attempt = 0
+    while True:
+        try:
+            return await generate(chunk)
+        except Exception as e:
+            if not _is_transient(e) or attempt >= settings.TTS_LONGFORM_CHUNK_RETRIES:
+                raise
+            attempt += 1
+            metrics.inc("tts_longform_chunk_retries_total")
+            print(f"🔁 Chunk {index + 1} failed ({e}), retry {attempt}/{settings.TTS_LONGFORM_CHUNK_RETRIES}", flush=True)
+            await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+
+async def synthesize_long_form(
+    generate: Callable[[str], Awaitable[bytes]], text: str, user_id: int
+) -> AsyncIterator[bytes]:
+    """
+    Yield the MP3 audio frames of each chunk of text, in order. Chunks are
+    synthesized concurrently, at most TTS_LONGFORM_USER_CONCURRENCY at a time per
+    user across all their jobs, and chunk N is yielded as soon as chunks 1..N are
+    done. Since the provider services cache every chunk, re-running a job after a
+    failure only synthesizes the chunks that didn't complete.
+    """
+    chunks = chunk_text(text, settings.TTS_LONGFORM_CHUNK_CHARS)
+    semaphore = _user_semaphore(user_id)
+    print(f"📚 Long-form synthesis: {len(chunks)} chunks for user {user_id}", flush=True)
+
+    async def one(index: int, chunk: str) -> bytes:
+        async with semaphore:
+            return await _generate_with_retry(generate, chunk, index)
+
+    tasks = [asyncio.create_task(one(i, c)) for i, c in enumerate(chunks)]
+    try:
+        for task in tasks:
+            yield await offload.run_in_process("mp3_frames", audio_frames, await task)
+    finally:
+        # Client went away or a chunk failed for good: stop paying for the rest
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
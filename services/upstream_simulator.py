@@ -0,0 +1,312 @@
+"""
+Local stand-in for the paid upstreams (ElevenLabs, Lamonfox, Easypaisa, Claid),
+for load tests and benchmarks that must not call the real providers.
+
+Selected with UPSTREAM_SIMULATOR (see services/http_clients.py):
+- "inprocess": every shared client answers from SimulatorTransport, with no
+  network involved.
+- "http://host:port": requests are rewritten to a stand-in server on that
+  address, started with `python -m services.upstream_simulator --port 9100`.
+  Real connections, pooling and keep-alive are exercised.
+
+Each upstream has a log-normal latency (SIMULATOR_LATENCY_MS_<UPSTREAM> =
+"median,p95"). TTS requests also take SIMULATOR_TTS_MS_PER_CHAR for every
+character. Faults are injected at random (SIMULATOR_ERRORS_<UPSTREAM> =
+"429:0.05,503:0.01,deprecated:0.01,timeout:0.01,connect:0.01"). Models listed
+in SIMULATOR_DEPRECATED_MODELS always answer like a deprecated ElevenLabs
+model. Audio is valid silence as long as the text would take to speak, in the
+requested output format (ElevenLabs output_format, Lemonfox response_format;
+MP3 128 kbps by default), so payload sizes match real clips.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import uuid
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+from config import settings
+
+# MPEG-1 Layer III at 44.1 kHz, no padding: frames of 1152 samples
+_FRAMES_PER_SECOND = 44100 / 1152
+_MP3_BITRATE_INDEX = {32: 1, 40: 2, 48: 3, 56: 4, 64: 5, 80: 6, 96: 7, 112: 8, 128: 9, 160: 10, 192: 11}
+# Roughly 150 words per minute of narration
+SPEECH_CHARS_PER_SECOND = 15
+STREAM_CHUNK_FRAMES = 10
+
+_DEPRECATED_BODY = json.dumps({
+    "detail": {"status": "model_deprecated_free_tier", "message": "This model is no longer available on the free tier."}
+})
+_ERROR_BODIES = {
+    402: {"detail": {"status": "payment_required", "message": "Quota exceeded for this API key."}},
+    429: {"detail": {"status": "too_many_concurrent_requests", "message": "Too many concurrent requests."}},
+}
+
+
+class SimulatedResponse(NamedTuple):
+    status_code: int
+    headers: Dict[str, str]
+    chunks: AsyncIterator[bytes]
+
+
+class SimulatedConnectError(Exception):
+    """The request should fail as if the connection was refused"""
+
+
+def _silent_frame(bitrate: int = 128) -> bytes:
+    header = bytes([0xFF, 0xFB, _MP3_BITRATE_INDEX[bitrate] << 4, 0x00])
+    return header + b"\x00" * (144 * bitrate * 1000 // 44100 - len(header))
+
+
+def silent_mp3(seconds: float, bitrate: int = 128) -> bytes:
+    return _silent_frame(bitrate) * max(1, math.ceil(seconds * _FRAMES_PER_SECOND))
+
+
+@lru_cache(maxsize=256)
+def _silent_audio(codec: str, bitrate: Optional[int], frames: int) -> bytes:
+    """Silence in codec at bitrate (None = the codec's default), frames MP3 frames long"""
+    if codec == "mp3":
+        return _silent_frame(bitrate or 128) * frames
+    from services.audio_transcode import _transcode
+    from utils.audio_formats import AudioFormat
+    return _transcode(_silent_frame() * frames, AudioFormat(codec, bitrate))
+
+
+def _requested_format(upstream: str, query: Dict[str, str], payload: dict) -> Tuple[str, Optional[int]]:
+    """(codec, kbps) asked for: ElevenLabs' output_format=mp3_44100_64, Lemonfox's response_format"""
+    if upstream == "lamonfox":
+        return payload.get("response_format") or "mp3", None
+    codec, _, rest = (query.get("output_format") or "mp3_44100_128").partition("_")
+    bitrate = rest.rpartition("_")[2]
+    return codec, int(bitrate) if bitrate.isdigit() else None
+
+
+def _parse_latency(value: str) -> Tuple[float, float]:
+    median_ms, p95_ms = (float(v) for v in value.split(","))
+    # Log-normal with the given median and 95th percentile
+    sigma = math.log(max(p95_ms, median_ms) / median_ms) / 1.645 if median_ms > 0 else 0.0
+    return median_ms / 1000, sigma
+
+
+def _parse_errors(value: str) -> List[Tuple[str, float]]:
+    errors = []
+    for part in value.split(","):
+        if ":" in part:
+            kind, rate = part.split(":", 1)
+            errors.append((kind.strip(), float(rate)))
+    return errors
+
+
+async def _single(body: bytes) -> AsyncIterator[bytes]:
+    yield body
+
+
+class UpstreamSimulator:
+    def __init__(self, seed: Optional[int] = None):
+        self.random = random.Random(seed)
+        self.latency = {name: _parse_latency(value) for name, value in settings.SIMULATOR_LATENCY_MS.items()}
+        self.errors = {name: _parse_errors(value) for name, value in settings.SIMULATOR_ERRORS.items()}
+        self.deprecated_models = set(settings.SIMULATOR_DEPRECATED_MODELS)
+        self.voices_etag = '"sim-voices-1"'
+
+    def _delay(self, upstream: str, characters: int = 0) -> float:
+        median, sigma = self.latency.get(upstream, (0.1, 0.0))
+        delay = median * math.exp(self.random.gauss(0, sigma)) if sigma else median
+        return delay + characters * settings.SIMULATOR_TTS_MS_PER_CHAR / 1000
+
+    def _fault(self, upstream: str) -> Optional[str]:
+        roll = self.random.random()
+        for kind, rate in self.errors.get(upstream, []):
+            if roll < rate:
+                return kind
+            roll -= rate
+        return None
+
+    @staticmethod
+    def _json(status_code: int, body, headers: Optional[Dict[str, str]] = None) -> SimulatedResponse:
+        data = json.dumps(body).encode()
+        return SimulatedResponse(status_code, {"content-type": "application/json", **(headers or {})}, _single(data))
+
+    def _audio(
+        self, text: str, stream: bool, delay: float, audio_format: Tuple[str, Optional[int]] = ("mp3", None)
+    ) -> Tuple[SimulatedResponse, float]:
+        """Audio for text; streams send the first chunk at 30% of the time and spread the rest"""
+        frames = max(1, math.ceil(len(text) / SPEECH_CHARS_PER_SECOND * _FRAMES_PER_SECOND))
+        audio = _silent_audio(audio_format[0], audio_format[1], frames)
+        content_type = {"mp3": "audio/mpeg", "opus": "audio/ogg", "aac": "audio/aac"}.get(audio_format[0], "audio/mpeg")
+        headers = {"content-type": content_type}
+        if not stream:
+            return SimulatedResponse(200, {**headers, "content-length": str(len(audio))}, _single(audio)), delay
+
+        chunk_size = len(audio) * STREAM_CHUNK_FRAMES // frames or len(audio)
+        chunks = [audio[i:i + chunk_size] for i in range(0, len(audio), chunk_size)]
+        gap = delay * 0.7 / max(1, len(chunks) - 1)
+
+        async def paced() -> AsyncIterator[bytes]:
+            for index, chunk in enumerate(chunks):
+                if index:
+                    await asyncio.sleep(gap)
+                yield chunk
+
+        return SimulatedResponse(200, headers, paced()), delay * 0.3
+
+    def respond(
+        self, upstream: str, method: str, path: str, headers: Dict[str, str], body: bytes,
+        query: Optional[Dict[str, str]] = None,
+    ) -> Tuple[SimulatedResponse, float]:
+        """
+        (response, seconds to wait before the headers go out) for one request.
+        Raises SimulatedConnectError for an injected connection failure.
+        """
+        if method == "HEAD":
+            return SimulatedResponse(200, {}, _single(b"")), self._delay(upstream) / 4
+        payload = {}
+        if body:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                payload = {}
+        text = payload.get("text") or payload.get("input") or ""
+        delay = self._delay(upstream, len(text))
+
+        fault = self._fault(upstream)
+        if fault == "connect":
+            raise SimulatedConnectError(upstream)
+        if fault == "timeout":
+            return SimulatedResponse(504, {}, _single(b"")), float("inf")
+        if fault == "deprecated" or payload.get("model_id") in self.deprecated_models:
+            return SimulatedResponse(400, {"content-type": "application/json"}, _single(_DEPRECATED_BODY.encode())), delay
+        if fault is not None:
+            status_code = int(fault)
+            return self._json(status_code, _ERROR_BODIES.get(status_code, {"detail": f"Simulated {status_code}"})), delay
+
+        if upstream == "elevenlabs":
+            match = re.search(r"/text-to-speech/([^/]+)(/stream)?$", path)
+            if method == "POST" and match:
+                return self._audio(text, bool(match.group(2)), delay, _requested_format(upstream, query or {}, payload))
+            if method == "GET" and path.endswith("/voices"):
+                if headers.get("if-none-match") == self.voices_etag:
+                    return SimulatedResponse(304, {"etag": self.voices_etag}, _single(b"")), delay
+                voices = [
+                    {"voice_id": "21m00Tcm4TlvDq8ikWAM", "name": "Rachel", "category": "premade", "labels": {}},
+                    {"voice_id": "sim-voice-narrator", "name": "Simulated Narrator", "category": "generated", "labels": {}},
+                ]
+                return self._json(200, {"voices": voices}, {"etag": self.voices_etag}), delay
+        elif upstream == "lamonfox":
+            if method == "POST" and path.endswith("/audio/speech"):
+                return self._audio(text, False, delay, _requested_format(upstream, query or {}, payload))
+        elif upstream == "easypaisa":
+            if method == "POST" and path.endswith("/api/v1/payments"):
+                return self._json(200, {"payment_url": f"https://easypaisa.invalid/pay/{uuid.uuid4().hex[:12]}"}), delay
+            if method == "GET" and path.endswith("/status"):
+                return self._json(200, {"status": "completed"}), delay
+        elif upstream == "claid":
+            if method == "POST" and path.endswith("/image"):
+                image_id = uuid.uuid4().hex[:12]
+                return self._json(200, {"id": image_id, "image_url": f"https://claid.invalid/{image_id}.png"}), delay
+            if method == "GET" and path.endswith("/status"):
+                return self._json(200, {"status": "completed"}), delay
+        return self._json(404, {"detail": f"Simulator has no {method} {path} for {upstream}"}), delay
+
+
+_simulator: Optional[UpstreamSimulator] = None
+
+
+def get_simulator() -> UpstreamSimulator:
+    global _simulator
+    if _simulator is None:
+        _simulator = UpstreamSimulator(settings.SIMULATOR_SEED)
+    return _simulator
+
+
+class _ChunkStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+
+    async def __aiter__(self):
+        async for chunk in self._chunks:
+            yield chunk
+
+    async def aclose(self):
+        await self._chunks.aclose()
+
+
+class SimulatorTransport(httpx.AsyncBaseTransport):
+    """Answers an upstream's requests in-process, honouring the request's read timeout"""
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        try:
+            response, delay = get_simulator().respond(
+                self.upstream, request.method, request.url.path, dict(request.headers), body, dict(request.url.params)
+            )
+        except SimulatedConnectError:
+            raise httpx.ConnectError(f"Simulated connection failure to {self.upstream}", request=request)
+        read_timeout = (request.extensions.get("timeout") or {}).get("read")
+        if read_timeout is not None and delay > read_timeout:
+            await asyncio.sleep(read_timeout)
+            raise httpx.ReadTimeout(f"Simulated {self.upstream} timeout", request=request)
+        await asyncio.sleep(delay if math.isfinite(delay) else 3600)
+        return httpx.Response(response.status_code, headers=response.headers, stream=_ChunkStream(response.chunks))
+
+
+class RedirectTransport(httpx.AsyncBaseTransport):
+    """Sends an upstream's requests to the stand-in server at base_url/<upstream>/<path>"""
+
+    def __init__(self, upstream: str, base_url: str, transport: httpx.AsyncBaseTransport):
+        self.upstream = upstream
+        self.base_url = httpx.URL(base_url.rstrip("/"))
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = self.base_url.copy_with(
+            path=f"{self.base_url.path.rstrip('/')}/{self.upstream}{request.url.path}",
+            query=request.url.query or None,
+        )
+        headers = [(k, v) for k, v in request.headers.raw if k.lower() != b"host"] + [(b"host", url.netloc)]
+        redirected = httpx.Request(request.method, url, headers=headers, stream=request.stream, extensions=request.extensions)
+        return await self.transport.handle_async_request(redirected)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def create_app():
+    """The stand-in server: /<upstream>/<original path> for every simulated upstream"""
+    from starlette.applications import Starlette
+    from starlette.responses import Response, StreamingResponse
+    from starlette.routing import Route
+
+    async def handle(request):
+        upstream, path = request.path_params["upstream"], "/" + request.path_params["path"]
+        try:
+            response, delay = get_simulator().respond(
+                upstream, request.method, path, dict(request.headers), await request.body(), dict(request.query_params)
+            )
+        except SimulatedConnectError:
+            # A server can't refuse a connection it already accepted; closest is an immediate 503
+            return Response(status_code=503)
+        await asyncio.sleep(delay if math.isfinite(delay) else 3600)
+        return StreamingResponse(response.chunks, status_code=response.status_code, headers=response.headers)
+
+    methods = ["GET", "HEAD", "POST", "PUT", "DELETE"]
+    return Starlette(routes=[Route("/{upstream}/{path:path}", handle, methods=methods)])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stand-in server for the paid upstream APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    print(f"🧪 Upstream simulator on http://{args.host}:{args.port} - set UPSTREAM_SIMULATOR to this URL", flush=True)
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
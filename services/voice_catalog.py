@@ -0,0 +1,112 @@
+"""
+In-memory catalog of the voices each TTS provider offers.
+
+Loaded at startup and refreshed in the background every
+VOICE_CATALOG_REFRESH_SECONDS with a conditional request (ETag), so serving
+/api/voices and validating a request's voice_id never call a provider. A
+failed refresh keeps the last good listing.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, List, Optional
+
+from config import settings
+from services.tts_providers import TTSProvider
+from services.tts_router import tts_router
+
+
+class ProviderVoices:
+    def __init__(self):
+        self.voices: List[dict] = []
+        self.etag: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self.attempted_at: Optional[float] = None  # last listing attempt, successful or not
+        self.last_error: Optional[str] = None
+
+
+class VoiceCatalog:
+    def __init__(self, providers: Dict[str, TTSProvider]):
+        self.providers = providers
+        self.listings: Dict[str, ProviderVoices] = {name: ProviderVoices() for name in providers}
+        self._by_id: Dict[str, dict] = {}
+        # Validators for the /api/voices response; change whenever any listing does
+        self.etag = '"empty"'
+        self.updated_at = int(time.time())
+
+    async def refresh(self, name: str):
+        listing = self.listings[name]
+        try:
+            voices, etag = await self.providers[name].fetch_voices(listing.etag if listing.loaded_at else None)
+        except Exception as e:
+            listing.attempted_at = time.time()
+            listing.last_error = str(e)
+            print(f"⚠️ Could not refresh {name} voices (keeping {len(listing.voices)} known): {e}", flush=True)
+            return
+        listing.last_error = None
+        listing.etag = etag
+        listing.loaded_at = listing.attempted_at = time.time()
+        if voices is None:
+            return  # unchanged since the last listing
+        listing.voices = [{**voice, "provider": name} for voice in voices]
+        self._rebuild()
+        print(f"🗣️ Loaded {len(voices)} {name} voices", flush=True)
+
+    def _rebuild(self):
+        by_id: Dict[str, dict] = {}
+        for listing in self.listings.values():
+            for voice in listing.voices:
+                by_id.setdefault(voice["id"], voice)
+        self._by_id = by_id
+        digest = hashlib.sha256(json.dumps(self.voices(), sort_keys=True).encode()).hexdigest()[:16]
+        if f'"{digest}"' != self.etag:
+            self.etag = f'"{digest}"'
+            self.updated_at = int(time.time())
+
+    async def refresh_all(self):
+        await asyncio.gather(*(self.refresh(name) for name in self.providers))
+
+    async def run_periodic(self):
+        """Refresh every VOICE_CATALOG_REFRESH_SECONDS until cancelled (the startup load happens in the lifespan)"""
+        while True:
+            await asyncio.sleep(settings.VOICE_CATALOG_REFRESH_SECONDS)
+            await self.refresh_all()
+
+    def voices(self, provider: Optional[str] = None) -> List[dict]:
+        return [
+            voice
+            for name, listing in self.listings.items()
+            if provider is None or name == provider
+            for voice in listing.voices
+        ]
+
+    def get(self, voice_id: str) -> Optional[dict]:
+        """The catalog entry for voice_id, or None if no provider offers it"""
+        voice = self._by_id.get(voice_id)
+        if voice is None:
+            # Default voices are always usable, even before the first listing arrives
+            for name, provider in self.providers.items():
+                if provider.default_voice == voice_id:
+                    return {"id": voice_id, "name": voice_id, "provider": name}
+        return voice
+
+    def loading(self) -> bool:
+        """Whether a configured provider's first listing is still outstanding (unknown voices may be its)"""
+        return any(
+            provider.configured and self.listings[name].attempted_at is None
+            for name, provider in self.providers.items()
+        )
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "voices": len(listing.voices),
+                "loaded_at": listing.loaded_at,
+                "last_error": listing.last_error,
+            }
+            for name, listing in self.listings.items()
+        }
+
+
+voice_catalog = VoiceCatalog(tts_router.providers)
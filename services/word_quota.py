@@ -0,0 +1,92 @@
+"""
+Word (token) accounting against a user's plan.
+
+Words are reserved with one conditional UPDATE that adds them only while the
+total stays within the plan's lifetime limit, and refunded with a relative
+UPDATE. Neither reads the counter first, so parallel requests, batches and
+WebSocket sessions can't overspend or overwrite each other's charges.
+
+The functions are synchronous and open their own session; call them through
+asyncio.to_thread from async code.
+"""
+from datetime import date
+from typing import NamedTuple, Tuple
+
+from sqlalchemy import and_, case, func
+
+from database import SessionLocal
+from models import User
+
+
+class WordUsage(NamedTuple):
+    tokens_used: int
+    daily_voice_count: int  # clips generated today (counted on the Free plan only)
+
+
+def plan_token_limit(plan: str) -> int:
+    """Lifetime token (word) allowance of a plan"""
+    return 300 if plan == "Free" else 800
+
+
+def _usage(session, user_id: int) -> WordUsage:
+    tokens_used, daily_voice_count, last_reset_date = session.query(
+        User.total_tokens_used, User.daily_voice_count, User.last_reset_date
+    ).filter(User.id == user_id).one()
+    return WordUsage(tokens_used or 0, (daily_voice_count or 0) if last_reset_date == date.today() else 0)
+
+
+def read_usage(user_id: int) -> WordUsage:
+    session = SessionLocal()
+    try:
+        return _usage(session, user_id)
+    finally:
+        session.close()
+
+
+def reserve_words(user_id: int, plan: str, word_count: int) -> Tuple[bool, WordUsage]:
+    """
+    Charge word_count words if the plan's limit allows it (on the Free plan the
+    clip is also counted for the day). Returns (reserved, usage after the update).
+    """
+    today = date.today()
+    tokens_used = func.coalesce(User.total_tokens_used, 0)
+    values = {User.total_tokens_used: tokens_used + word_count}
+    if plan == "Free":
+        values[User.daily_voice_count] = case(
+            (User.last_reset_date == today, func.coalesce(User.daily_voice_count, 0) + 1), else_=1
+        )
+        values[User.last_reset_date] = today
+    session = SessionLocal()
+    try:
+        reserved = session.query(User).filter(
+            User.id == user_id, tokens_used + word_count <= plan_token_limit(plan)
+        ).update(values, synchronize_session=False)
+        session.commit()
+        return bool(reserved), _usage(session, user_id)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def refund_words(user_id: int, plan: str, word_count: int) -> WordUsage:
+    """Give back words reserved by reserve_words (and, on the Free plan, today's clip)"""
+    tokens_used = func.coalesce(User.total_tokens_used, 0)
+    values = {User.total_tokens_used: case((tokens_used > word_count, tokens_used - word_count), else_=0)}
+    if plan == "Free":
+        daily_voice_count = func.coalesce(User.daily_voice_count, 0)
+        values[User.daily_voice_count] = case(
+            (and_(User.last_reset_date == date.today(), daily_voice_count > 0), daily_voice_count - 1),
+            else_=User.daily_voice_count,
+        )
+    session = SessionLocal()
+    try:
+        session.query(User).filter(User.id == user_id).update(values, synchronize_session=False)
+        session.commit()
+        return _usage(session, user_id)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,76 @@
+"""
+Audio output formats clients can ask for: "mp3", "opus" or "aac", optionally
+with a bitrate in kbps ("opus_32", "aac_64").
+
+Without a bitrate the provider's own choice is fine, so any provider that
+produces the codec natively can answer without a transcode. Transcodes then
+use the codec's default bitrate. Opus comes in an Ogg container and AAC as
+ADTS, so both play in browsers and on mobile.
+"""
+from typing import NamedTuple, Optional
+
+
+class Codec(NamedTuple):
+    content_type: str
+    extension: str
+    bitrates: tuple
+    default_bitrate: int
+
+
+CODECS = {
+    "mp3": Codec("audio/mpeg", "mp3", (32, 64, 96, 128, 192), 128),
+    "opus": Codec("audio/ogg", "ogg", (24, 32, 48, 64, 96, 128), 48),
+    "aac": Codec("audio/aac", "aac", (32, 48, 64, 96, 128), 64),
+}
+
+
+class AudioFormat(NamedTuple):
+    codec: str
+    bitrate: Optional[int] = None  # kbps; None = whatever the provider produces
+
+    @property
+    def key(self) -> str:
+        return f"{self.codec}_{self.bitrate}" if self.bitrate else self.codec
+
+    @property
+    def content_type(self) -> str:
+        return CODECS[self.codec].content_type
+
+    @property
+    def extension(self) -> str:
+        return CODECS[self.codec].extension
+
+    @property
+    def target_bitrate(self) -> int:
+        """Bitrate to encode at when this format has to be produced by a transcode"""
+        return self.bitrate or CODECS[self.codec].default_bitrate
+
+
+# What every provider returns when no format is asked for
+DEFAULT_FORMAT = AudioFormat("mp3")
+
+
+def parse_format(value: Optional[str]) -> AudioFormat:
+    """"opus_32" -> AudioFormat("opus", 32); None or "" is the default MP3. Raises ValueError."""
+    if not value:
+        return DEFAULT_FORMAT
+    codec, _, bitrate = value.strip().lower().partition("_")
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported output_format '{value}'. Use one of: {', '.join(CODECS)}")
+    if not bitrate:
+        return AudioFormat(codec)
+    allowed = CODECS[codec].bitrates
+    if not bitrate.isdigit() or int(bitrate) not in allowed:
+        raise ValueError(
+            f"Unsupported bitrate for {codec}: '{bitrate}'. Use one of: {', '.join(str(b) for b in allowed)} (kbps)"
+        )
+    return AudioFormat(codec, int(bitrate))
+
+
+def content_type_for(filename: str) -> str:
+    """Content type of a stored clip, from its extension"""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    for codec in CODECS.values():
+        if codec.extension == extension:
+            return codec.content_type
+    return "audio/mpeg"
@@ -2,7 +2,11 @@ import base64
 import io
 import os
 import shutil
+import threading
+from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
+from utils import offload
+from utils.mp3_frames import FrameHeader, audio_frames, first_frame_header
 
 load_dotenv()
 
@@ -36,6 +40,7 @@ warnings.filterwarnings("ignore", message=".*ffmpeg.*", category=RuntimeWarning)
 # Try to import pydub, fallback if not available
 try:
     from pydub import AudioSegment
+    from pydub.generators import Sine
     # Configure AudioSegment to use our ffmpeg binary if found
     if ffmpeg_binary:
         # Set the converter directly to avoid pydub's check
@@ -45,36 +50,112 @@ except ImportError:
     PYDUB_AVAILABLE = False
     print("Warning: pydub not available. Watermarking will be disabled.")
 
-def add_watermark_to_audio(audio_data: bytes) -> str:
+# Trial watermark: a short beep appended to the end of the clip
+WATERMARK_FREQUENCY_HZ = 440
+WATERMARK_DURATION_MS = 1000
+
+# Encoded watermark frames per (sample_rate, bitrate, channels). Each format is
+# encoded once per process; after that, watermarking is a byte concatenation.
+_watermark_frames: Dict[Tuple[int, int, int], Optional[bytes]] = {}
+_watermark_lock = threading.Lock()
+
+
+def _watermark_tone(sample_rate: int, channels: int):
+    tone = Sine(WATERMARK_FREQUENCY_HZ, sample_rate=sample_rate).to_audio_segment(duration=WATERMARK_DURATION_MS)
+    return tone.set_channels(channels)
+
+
+def _encode_watermark(sample_rate: int, bitrate: int, channels: int) -> Optional[bytes]:
+    """
+    MP3 frames of the watermark tone in exactly the given format, or None when
+    the encoder can't produce a matching stream (blocking - spawns ffmpeg).
+    """
+    output = io.BytesIO()
+    _watermark_tone(sample_rate, channels).export(
+        output,
+        format="mp3",
+        bitrate=f"{bitrate // 1000}k",
+        # Constant bitrate and no Xing/Info frame, so every frame matches the clip's
+        parameters=["-ar", str(sample_rate), "-ac", str(channels), "-write_xing", "0"],
+    )
+    frames = audio_frames(output.getvalue())
+    header = first_frame_header(frames)
+    if header is None or (header.sample_rate, header.bitrate, header.channels) != (sample_rate, bitrate, channels):
+        return None
+    return frames
+
+
+def watermark_frames_for(header: FrameHeader) -> Optional[bytes]:
+    """Pre-encoded watermark frames matching header's format (blocking on first use per format)"""
+    key = (header.sample_rate, header.bitrate, header.channels)
+    if key in _watermark_frames:
+        return _watermark_frames[key]
+    with _watermark_lock:
+        if key not in _watermark_frames:
+            try:
+                _watermark_frames[key] = _encode_watermark(*key)
+                print(f"🔖 Watermark encoded for {key[0]} Hz / {key[1] // 1000} kbps / {key[2]} ch", flush=True)
+            except Exception as e:
+                # Remembered as None, so this is logged once; every trial clip in this format is mixed from now on
+                _watermark_frames[key] = None
+                print(
+                    f"❌ Could not encode watermark for {key[0]} Hz / {key[1] // 1000} kbps / {key[2]} ch ({e}); "
+                    f"trial clips in this format will use the slow re-encode path until restart",
+                    flush=True,
+                )
+        return _watermark_frames[key]
+
+
+def _mix_watermark(audio_data: bytes) -> bytes:
+    """
+    Decode, append the tone and re-encode. Only used for input that can't be
+    watermarked at frame level (blocking - run it in a worker thread).
+    """
+    main_audio = AudioSegment.from_file(io.BytesIO(audio_data))
+    watermarked_audio = main_audio + _watermark_tone(main_audio.frame_rate, main_audio.channels)
+    output = io.BytesIO()
+    watermarked_audio.export(output, format="mp3")
+    return output.getvalue()
+
+
+async def watermark_trailer(sample: bytes) -> bytes:
+    """
+    Watermark frames to append after a stream whose first bytes are sample.
+    Returns b"" if the format can't be matched.
+    """
+    if not PYDUB_AVAILABLE:
+        return b""
+    header = first_frame_header(sample)
+    if header is None:
+        return b""
+    frames = _watermark_frames.get((header.sample_rate, header.bitrate, header.channels))
+    if frames is None:
+        frames = await offload.run_in_thread("watermark_encode", watermark_frames_for, header)
+    return frames or b""
+
+
+async def add_watermark_to_audio(audio_data: bytes) -> bytes:
     """
-    Add watermark audio to the generated voice for trial users
+    Add watermark audio to the generated voice for trial users.
+    Matching MP3 input gets pre-encoded watermark frames appended without a
+    transcode; anything else falls back to mixing in a worker thread.
     """
     if not PYDUB_AVAILABLE:
         # If pydub is not available, just return the original audio
-        return base64.b64encode(audio_data).decode('utf-8')
+        return audio_data
     
     try:
-        # Load the main audio
-        main_audio = AudioSegment.from_file(io.BytesIO(audio_data))
-        
-        # Create watermark text as audio (you might want to use TTS for this)
-        # For now, we'll create a simple beep as watermark
-        watermark_audio = AudioSegment.sine(440, duration=1000)  # 1 second beep
-        
-        # Add watermark at the end
-        watermarked_audio = main_audio + watermark_audio
-        
-        # Convert to base64 for streaming
-        output = io.BytesIO()
-        watermarked_audio.export(output, format="mp3")
-        watermarked_data = output.getvalue()
-        
-        return base64.b64encode(watermarked_data).decode('utf-8')
+        trailer = await watermark_trailer(audio_data)
+        if trailer:
+            # The clip's Xing/Info frame would understate the new length, so drop it
+            # (frame scanning is a pure-Python loop over the whole clip)
+            return await offload.run_in_process("mp3_frames", audio_frames, audio_data) + trailer
+        return await offload.run_in_thread("watermark_mix", _mix_watermark, audio_data)
     
     except Exception as e:
         print(f"Error adding watermark: {e}")
         # Return original audio if watermarking fails
-        return base64.b64encode(audio_data).decode('utf-8')
+        return audio_data
 
 def audio_to_base64(audio_data: bytes) -> str:
     """
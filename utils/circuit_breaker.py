@@ -0,0 +1,119 @@
+"""
+Per-upstream circuit breakers.
+
+A breaker starts closed. After CIRCUIT_BREAKER_FAILURE_THRESHOLD consecutive
+failures it opens and every call fails fast with CircuitOpenError instead of
+waiting on an upstream that is known to be down. After
+CIRCUIT_BREAKER_RESET_SECONDS it goes half-open and lets one trial call
+through: success closes it again, failure re-opens it for another period.
+
+State (0 closed, 1 half-open, 2 open) and every transition are exported as
+metrics.
+"""
+import random
+import time
+from typing import Dict, Optional
+
+from config import settings
+from utils import metrics
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+metrics.describe("circuit_breaker_state", "Breaker state per upstream: 0 closed, 1 half-open, 2 open")
+metrics.describe("circuit_breaker_transitions_total", "Breaker state changes per upstream")
+metrics.describe("circuit_breaker_rejections_total", "Calls failed fast because the upstream's breaker was open")
+
+
+class CircuitOpenError(Exception):
+    """The upstream's breaker is open; retry_after is the number of seconds until it half-opens"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is temporarily unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        metrics.set_gauge("circuit_breaker_state", _STATE_VALUES[CLOSED], upstream=name)
+
+    def _transition(self, state: str):
+        if state == self._state:
+            return
+        print(f"🔌 Circuit for {self.name}: {self._state} -> {state}", flush=True)
+        metrics.inc("circuit_breaker_transitions_total", upstream=self.name, from_state=self._state, to_state=state)
+        metrics.set_gauge("circuit_breaker_state", _STATE_VALUES[state], upstream=self.name)
+        self._state = state
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def allow(self):
+        """Call before each upstream call; raises CircuitOpenError when it must not go out"""
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        metrics.inc("circuit_breaker_rejections_total", upstream=self.name)
+        retry_after = self.reset_seconds - (time.monotonic() - self._opened_at) if state == OPEN else 1.0
+        raise CircuitOpenError(self.name, max(1.0, retry_after))
+
+    def record_success(self):
+        self._trial_in_flight = False
+        self._failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def release(self):
+        """The call ended without a verdict (e.g. it was cancelled); let another trial through"""
+        self._trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The shared breaker for an upstream, created on first use"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(
+            name, settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD, settings.CIRCUIT_BREAKER_RESET_SECONDS
+        )
+    return breaker
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Seconds to sleep before retry number attempt (1-based): "full jitter", a
+    random point in [0, base * 2^(attempt-1)] capped at UPSTREAM_RETRY_MAX_DELAY_SECONDS,
+    so clients that failed together don't retry together. An upstream's
+    Retry-After is honoured when it fits under the cap.
+    """
+    cap = settings.UPSTREAM_RETRY_MAX_DELAY_SECONDS
+    if retry_after is not None and 0 <= retry_after <= cap:
+        return retry_after
+    return random.uniform(0, min(cap, settings.UPSTREAM_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1)))
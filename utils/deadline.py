@@ -0,0 +1,26 @@
+import time
+from typing import Optional
+
+
+class Deadline:
+    """
+    A time budget for one request, carried through every upstream call it makes.
+    Each call uses what's left of the budget as its timeout, so a request can't
+    outlive its budget no matter how many retries or fallbacks it goes through.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Timeout for the next upstream call: the remaining budget, at most cap"""
+        remaining = self.remaining()
+        return min(remaining, cap) if cap is not None else remaining
@@ -0,0 +1,120 @@
+import os
+import re
+from typing import Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Used when the server can't hand the file to the kernel: few large reads
+# keep the number of worker-thread hops per response low
+CHUNK_SIZE = 1024 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range "Range: bytes=start-end" header into an inclusive
+    (start, end) pair. Returns None to serve the whole file (no header, multiple
+    ranges, or a syntax we ignore) and raises ValueError when unsatisfiable.
+    """
+    if not range_header:
+        return None
+    match = _RANGE_RE.match(range_header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, file_size - length), file_size - 1
+    start = int(first)
+    end = int(last) if last else file_size - 1
+    if start >= file_size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, file_size - 1)
+
+
+class RangeFileResponse(Response):
+    """
+    File response with single-range support that never copies through Python when
+    the ASGI server offers the "http.response.zerocopysend" extension (the kernel
+    sendfile()s straight from the page cache). Elsewhere it falls back to large
+    reads in a worker thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        request_headers: Mapping[str, str],
+        media_type: str,
+        headers: Optional[Mapping[str, str]] = None,
+        etag: Optional[str] = None,
+    ):
+        self.path = path
+        self.media_type = media_type
+        self.background = None
+        file_size = stat_result.st_size
+        self.offset, self.count = 0, file_size
+        status_code = 200
+
+        byte_range = None
+        if_range = request_headers.get("if-range")
+        # If-Range: only honour the range when the client's copy is current
+        if if_range is None or (etag is not None and if_range.strip() == etag):
+            try:
+                byte_range = parse_range(request_headers.get("range"), file_size)
+            except ValueError:
+                self.status_code = 416
+                self.body = b""
+                self.init_headers({**(headers or {}), "Content-Range": f"bytes */{file_size}"})
+                self.offset, self.count = 0, 0
+                return
+
+        if byte_range is not None:
+            start, end = byte_range
+            self.offset, self.count = start, end - start + 1
+            status_code = 206
+
+        self.status_code = status_code
+        response_headers = {**(headers or {}), "Accept-Ranges": "bytes", "Content-Length": str(self.count)}
+        if status_code == 206:
+            response_headers["Content-Range"] = f"bytes {self.offset}-{self.offset + self.count - 1}/{file_size}"
+        self.init_headers(response_headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.status_code == 416 or scope.get("method") == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        file = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.offset,
+                    "count": self.count,
+                })
+                return
+
+            await anyio.to_thread.run_sync(file.seek, self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File shrank underneath us; end the response rather than hang
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await anyio.to_thread.run_sync(file.close)
@@ -0,0 +1,77 @@
+import os
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+
+# Generated media filenames are unique (timestamp + uuid) and never rewritten,
+# so a validator computed once stays valid until the file is deleted.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# path -> (etag, last_modified_http_date, mtime_seconds)
+_MAX_ENTRIES = 10000
+_validators: "OrderedDict[str, Tuple[str, str, int]]" = OrderedDict()
+
+
+def _remember(path: str, value: Tuple[str, str, int]):
+    _validators[path] = value
+    _validators.move_to_end(path)
+    while len(_validators) > _MAX_ENTRIES:
+        _validators.popitem(last=False)
+
+
+def cached_validators(path: str) -> Optional[Tuple[str, str, int]]:
+    """Validators for path if we've already stat'ed it - no disk access"""
+    value = _validators.get(path)
+    if value is not None:
+        _validators.move_to_end(path)
+    return value
+
+
+def validators_from_stat(path: str, st: os.stat_result) -> Tuple[str, str, int]:
+    """
+    Strong ETag from inode/size/mtime plus Last-Modified, remembered for later
+    conditional requests.
+    """
+    etag = f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+    mtime = int(st.st_mtime)
+    value = (etag, formatdate(mtime, usegmt=True), mtime)
+    _remember(path, value)
+    return value
+
+
+def forget(path: str):
+    """Drop a deleted file's validators so it can't be answered with a 304"""
+    _validators.pop(path, None)
+
+
+def is_not_modified(request_headers: Mapping[str, str], etag: str, mtime: int) -> bool:
+    """
+    RFC 9110 conditional GET: If-None-Match wins when present, otherwise
+    If-Modified-Since is compared against the file's mtime (whole seconds).
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison is the rule for If-None-Match
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in candidates
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since is None:
+            return False
+        return mtime <= int(since.timestamp())
+    return False
+
+
+def not_modified_headers(etag: str, last_modified: str) -> dict:
+    return {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+    }
@@ -46,3 +46,10 @@ def verify_token(token: str):
     except JWTError:
         return None
 
+def token_expiry(token: str) -> Optional[float]:
+    """Expiry of an already verified token as a Unix timestamp, None if it never expires"""
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return None
+    return float(exp) if exp is not None else None
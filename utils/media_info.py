@@ -0,0 +1,179 @@
+"""
+Duration and bitrate of stored media, read from container and frame headers
+without decoding anything.
+
+- MP3: every frame header gives its sample count, so the frames are walked
+  header to header (the Xing/Info frame, which holds no audio, is skipped).
+- AAC (ADTS): the same walk; each raw data block is 1024 samples.
+- Ogg (Opus, Vorbis): the granule position of the last page is the stream's
+  length in samples, less Opus' pre-skip.
+- MP4: the duration and timescale in the moov/mvhd box.
+
+Durations are whole microseconds; anything that can't be parsed gives None.
+"""
+import os
+import struct
+from typing import BinaryIO, Dict, NamedTuple, Optional, Tuple
+
+from utils.mp3_frames import find_first_frame, is_info_frame, parse_frame_header, skip_id3v2
+
+_ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+
+
+class MediaInfo(NamedTuple):
+    duration_us: int
+    bitrate: int  # average, bits per second
+
+    @property
+    def duration_seconds(self) -> float:
+        return round(self.duration_us / 1_000_000, 3)
+
+
+def _duration_us(samples: Dict[int, int]) -> int:
+    """Total duration of {sample_rate: sample count}, rounded once rather than per frame"""
+    return sum(count * 1_000_000 // rate for rate, count in samples.items())
+
+
+def _info(duration_us: int, size: int) -> Optional[MediaInfo]:
+    if duration_us <= 0 or size <= 0:
+        return None
+    return MediaInfo(duration_us, size * 8 * 1_000_000 // duration_us)
+
+
+def mp3_info(data: bytes) -> Optional[MediaInfo]:
+    offset = find_first_frame(data, skip_id3v2(data))
+    if offset < 0:
+        return None
+    # Frames of one stream share a handful of distinct headers, so each is parsed once
+    frames: Dict[bytes, Tuple[int, int, int]] = {}
+    first = parse_frame_header(data, offset)
+    if is_info_frame(data, offset, first):
+        offset += first.frame_length
+    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+    samples_by_rate: Dict[int, int] = {}
+    audio_bytes = 0
+    while offset + 4 <= end:
+        raw = data[offset:offset + 4]
+        frame = frames.get(raw)
+        if frame is None:
+            header = parse_frame_header(raw)
+            if header is None:
+                # Lost sync (junk between frames) - search for the next frame
+                offset = find_first_frame(data, offset + 1)
+                if offset < 0:
+                    break
+                continue
+            frame = frames[raw] = (header.frame_length, header.samples, header.sample_rate)
+        length, samples, sample_rate = frame
+        if offset + length > end:
+            break  # truncated final frame
+        samples_by_rate[sample_rate] = samples_by_rate.get(sample_rate, 0) + samples
+        audio_bytes += length
+        offset += length
+    return _info(_duration_us(samples_by_rate), audio_bytes)
+
+
+def adts_info(data: bytes) -> Optional[MediaInfo]:
+    offset = skip_id3v2(data)
+    samples_by_rate: Dict[int, int] = {}
+    audio_bytes = 0
+    while offset + 7 <= len(data):
+        header = data[offset:offset + 7]
+        if header[0] != 0xFF or (header[1] & 0xF6) != 0xF0:
+            break
+        rate_index = (header[2] >> 2) & 0x0F
+        length = ((header[3] & 0x03) << 11) | (header[4] << 3) | (header[5] >> 5)
+        if rate_index >= len(_ADTS_SAMPLE_RATES) or length < 7 or offset + length > len(data):
+            break
+        blocks = (header[6] & 0x03) + 1
+        sample_rate = _ADTS_SAMPLE_RATES[rate_index]
+        samples_by_rate[sample_rate] = samples_by_rate.get(sample_rate, 0) + blocks * 1024
+        audio_bytes += length
+        offset += length
+    return _info(_duration_us(samples_by_rate), audio_bytes)
+
+
+def ogg_info(data: bytes) -> Optional[MediaInfo]:
+    if data[:4] != b"OggS" or len(data) < 28:
+        return None
+    # First packet (on the first page) identifies the codec
+    packet = data[27 + data[26]:]
+    if packet[:8] == b"OpusHead" and len(packet) >= 12:
+        sample_rate = 48000  # Opus granule positions always count 48 kHz samples
+        pre_skip = struct.unpack_from("<H", packet, 10)[0]
+    elif packet[:7] == b"\x01vorbis" and len(packet) >= 16:
+        sample_rate = struct.unpack_from("<I", packet, 12)[0]
+        pre_skip = 0
+    else:
+        return None
+    # The last page that completes a packet carries the total sample count
+    page = data.rfind(b"OggS")
+    while page > 0:
+        if page + 14 <= len(data) and data[page + 4] == 0:
+            granule = struct.unpack_from("<q", data, page + 6)[0]
+            if granule >= 0:
+                return _info((granule - pre_skip) * 1_000_000 // sample_rate, len(data))
+        page = data.rfind(b"OggS", 0, page)
+    return None
+
+
+def audio_info(data: bytes) -> Optional[MediaInfo]:
+    """Duration and bitrate of an MP3, ADTS AAC or Ogg clip"""
+    if not data:
+        return None
+    if data[:4] == b"OggS":
+        return ogg_info(data)
+    offset = skip_id3v2(data)
+    # ADTS shares MPEG audio's sync word, but with the layer bits set to 00
+    if offset + 2 <= len(data) and data[offset] == 0xFF and (data[offset + 1] & 0xF6) == 0xF0:
+        return adts_info(data)
+    return mp3_info(data)
+
+
+def audio_duration(data: bytes) -> Optional[float]:
+    """Duration of a clip in seconds (for the duration_seconds columns), or None"""
+    info = audio_info(data)
+    return info.duration_seconds if info else None
+
+
+def _boxes(f: BinaryIO, start: int, end: int):
+    """Yield (type, payload offset, payload size) for the MP4 boxes between start and end"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset  # box runs to the end of the file
+        if size < header:
+            return
+        yield kind, offset + header, size - header
+        offset += size
+
+
+def mp4_info(path: str) -> Optional[MediaInfo]:
+    """Duration and overall bitrate of an MP4 file, from its mvhd box (only box headers are read)"""
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            for kind, moov, moov_size in _boxes(f, 0, size):
+                if kind != b"moov":
+                    continue
+                for child, mvhd, _ in _boxes(f, moov, moov + moov_size):
+                    if child != b"mvhd":
+                        continue
+                    f.seek(mvhd)
+                    version = f.read(4)[0]
+                    if version == 1:
+                        timescale, duration = struct.unpack(">16xIQ", f.read(28))
+                    else:
+                        timescale, duration = struct.unpack(">8xII", f.read(16))
+                    if not timescale:
+                        return None
+                    return _info(duration * 1_000_000 // timescale, size)
+    except (OSError, struct.error, IndexError):
+        return None
+    return None
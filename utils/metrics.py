@@ -0,0 +1,97 @@
+"""
+Minimal in-process metrics registry rendered in Prometheus text format at /metrics.
+Metrics are per worker process; labels are passed as keyword arguments.
+"""
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Latency buckets in seconds, from cache hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[LabelKey, float]] = {}
+_gauges: Dict[str, Dict[LabelKey, float]] = {}
+_histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+_help: Dict[str, str] = {}
+_collectors: List[Callable[[], None]] = []
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name: str, help_text: str):
+    _help[name] = help_text
+
+
+def inc(name: str, amount: float = 1.0, **labels):
+    """Increase a counter"""
+    with _lock:
+        series = _counters.setdefault(name, {})
+        key = _key(labels)
+        series[key] = series.get(key, 0.0) + amount
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges.setdefault(name, {})[_key(labels)] = float(value)
+
+
+def observe(name: str, value: float, **labels):
+    """Record one sample (usually seconds) into a histogram"""
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        key = _key(labels)
+        # [bucket counts..., count, sum]
+        data = series.get(key)
+        if data is None:
+            data = series[key] = [0.0] * (len(DEFAULT_BUCKETS) + 2)
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                data[i] += 1
+        data[-2] += 1
+        data[-1] += value
+
+
+def register_collector(fn: Callable[[], None]):
+    """fn is called before every render to refresh gauges computed on demand"""
+    _collectors.append(fn)
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+def render() -> str:
+    for collector in list(_collectors):
+        try:
+            collector()
+        except Exception as e:
+            print(f"⚠️ Metrics collector failed: {e}", flush=True)
+
+    lines: List[str] = []
+    with _lock:
+        for kind, store in (("counter", _counters), ("gauge", _gauges)):
+            for name in sorted(store):
+                if name in _help:
+                    lines.append(f"# HELP {name} {_help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in store[name].items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+        for name in sorted(_histograms):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, data in _histograms[name].items():
+                for i, bound in enumerate(DEFAULT_BUCKETS):
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', str(bound))])} {data[i]}")
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {data[-2]}")
+                lines.append(f"{name}_count{_format_labels(key)} {data[-2]}")
+                lines.append(f"{name}_sum{_format_labels(key)} {data[-1]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,175 @@
+"""
+MPEG audio (MP3) frame-level helpers that work on the byte stream without decoding.
+
+Used to stitch separately synthesized clips together at frame boundaries: ID3 tags
+and the Xing/Info/VBRI header frame of each clip are dropped and the audio frames
+are concatenated.
+"""
+from typing import Iterator, List, NamedTuple, Optional
+
+# Bitrates in kbps indexed by [version_key][layer][bitrate_index]
+# version_key: 1 = MPEG-1, 2 = MPEG-2 and MPEG-2.5
+_BITRATES = {
+    1: {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    2: {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+# Sample rates indexed by [version_bits][sample_rate_index]
+_SAMPLE_RATES = {
+    0b11: [44100, 48000, 32000],  # MPEG-1
+    0b10: [22050, 24000, 16000],  # MPEG-2
+    0b00: [11025, 12000, 8000],   # MPEG-2.5
+}
+_LAYERS = {0b11: 1, 0b10: 2, 0b01: 3}
+
+
+class FrameHeader(NamedTuple):
+    version: float      # 1, 2 or 2.5
+    layer: int          # 1, 2 or 3
+    bitrate: int        # bits per second
+    sample_rate: int
+    channels: int
+    padding: int
+    frame_length: int   # bytes, header included
+    samples: int        # PCM samples per channel in this frame
+
+
+def parse_frame_header(data: bytes, offset: int = 0) -> Optional[FrameHeader]:
+    """Parse the 4-byte header at offset, or return None if it isn't a valid frame header"""
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version_bits = (b1 >> 3) & 0b11
+    layer_bits = (b1 >> 1) & 0b11
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0b11
+    if version_bits == 0b01 or layer_bits == 0b00 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None  # reserved values, or "free" bitrate which we don't handle
+
+    version = {0b11: 1, 0b10: 2, 0b00: 2.5}[version_bits]
+    layer = _LAYERS[layer_bits]
+    bitrate = _BITRATES[1 if version == 1 else 2][layer][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b2 >> 1) & 1
+    channels = 1 if (b3 >> 6) == 0b11 else 2
+
+    if layer == 1:
+        samples = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or version == 1:
+        samples = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    else:
+        # Layer III in MPEG-2/2.5 carries half as many samples per frame
+        samples = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+    if frame_length < 4:
+        return None
+    return FrameHeader(version, layer, bitrate, sample_rate, channels, padding, frame_length, samples)
+
+
+def skip_id3v2(data: bytes) -> int:
+    """Offset of the first byte after a leading ID3v2 tag (0 if there is none)"""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def _audio_end(data: bytes) -> int:
+    """Length of data without a trailing ID3v1 tag"""
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        return len(data) - 128
+    return len(data)
+
+
+def find_first_frame(data: bytes, start: int = 0) -> int:
+    """
+    Offset of the first frame header that is followed by another valid header
+    (two in a row rules out false syncs inside tag data). -1 if none is found.
+    """
+    end = _audio_end(data)
+    offset = start
+    while offset < end - 4:
+        offset = data.find(b"\xff", offset, end)
+        if offset < 0:
+            return -1
+        header = parse_frame_header(data, offset)
+        if header is not None:
+            following = offset + header.frame_length
+            if following >= end or parse_frame_header(data, following) is not None:
+                return offset
+        offset += 1
+    return -1
+
+
+def iter_frames(data: bytes) -> Iterator[tuple]:
+    """Yield (offset, FrameHeader) for each consecutive audio frame"""
+    end = _audio_end(data)
+    offset = find_first_frame(data, skip_id3v2(data))
+    if offset < 0:
+        return
+    while offset + 4 <= end:
+        header = parse_frame_header(data, offset)
+        if header is None:
+            # Lost sync (junk between frames) - search for the next frame
+            offset = find_first_frame(data, offset + 1)
+            if offset < 0:
+                return
+            continue
+        if offset + header.frame_length > end:
+            return  # truncated final frame
+        yield offset, header
+        offset += header.frame_length
+
+
+def first_frame_header(data: bytes) -> Optional[FrameHeader]:
+    """Header of the first audio frame, which gives the stream's format"""
+    for _, header in iter_frames(data):
+        return header
+    return None
+
+
+def is_info_frame(data: bytes, offset: int, header: FrameHeader) -> bool:
+    """True for the Xing/Info/VBRI metadata frame encoders put first (it holds no audio)"""
+    if header.layer != 3:
+        return False
+    if header.version == 1:
+        side_info = 17 if header.channels == 1 else 32
+    else:
+        side_info = 9 if header.channels == 1 else 17
+    tag = data[offset + 4 + side_info:offset + 8 + side_info]
+    return tag in (b"Xing", b"Info") or data[offset + 36:offset + 40] == b"VBRI"
+
+
+def audio_frames(data: bytes) -> bytes:
+    """Just the audio frames of an MP3: no ID3 tags, no Xing/Info/VBRI header frame"""
+    chunks: List[bytes] = []
+    first = True
+    for offset, header in iter_frames(data):
+        if first:
+            first = False
+            if is_info_frame(data, offset, header):
+                continue
+        chunks.append(data[offset:offset + header.frame_length])
+    return b"".join(chunks)
+
+
+def concat_mp3(parts: List[bytes]) -> bytes:
+    """
+    Join MP3 clips at frame boundaries. Clips are expected to share sample rate
+    and channel layout (same provider voice/format), which players require anyway.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    return b"".join(audio_frames(part) for part in parts)
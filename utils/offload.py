@@ -0,0 +1,99 @@
+"""
+Run CPU-bound media work off the event loop.
+
+- run_in_thread(): for work that spends its time in C code that releases the GIL
+  (ffmpeg subprocesses, codecs, numpy/PIL, zlib).
+- run_in_process(): for pure-Python loops that would hold the GIL and stall the
+  loop even from a thread. Arguments and results are pickled, so pass bytes and
+  plain values, and only module-level functions.
+
+Every task is labelled with a task type; queue wait (submit -> start) and
+execution time are exported per type, so /metrics shows which work is still
+waiting on a saturated pool.
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from config import settings
+from utils import metrics
+
+metrics.describe("offload_queue_wait_seconds", "Time offloaded tasks waited for a free worker, per task type and pool")
+metrics.describe("offload_exec_seconds", "Time offloaded tasks ran on a worker, per task type and pool")
+metrics.describe("offload_tasks_in_flight", "Offloaded tasks submitted but not yet finished, per pool")
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_in_flight = {"thread": 0, "process": 0}
+
+
+def _timed_call(submitted_at: float, fn: Callable, args: tuple, kwargs: dict):
+    """Runs on the worker: returns (queue_wait, exec_time, result)"""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started - submitted_at, time.time() - started, result
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=settings.OFFLOAD_THREAD_WORKERS, thread_name_prefix="offload")
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.OFFLOAD_PROCESS_WORKERS)
+    return _process_pool
+
+
+def _noop():
+    return None
+
+
+async def _submit(pool_name: str, executor: Executor, task_type: str, fn: Callable, args: tuple, kwargs: dict) -> Any:
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_timed_call, time.time(), fn, args, kwargs)
+    _in_flight[pool_name] += 1
+    metrics.set_gauge("offload_tasks_in_flight", _in_flight[pool_name], pool=pool_name)
+    try:
+        queue_wait, exec_time, result = await loop.run_in_executor(executor, call)
+    finally:
+        _in_flight[pool_name] -= 1
+        metrics.set_gauge("offload_tasks_in_flight", _in_flight[pool_name], pool=pool_name)
+    metrics.observe("offload_queue_wait_seconds", max(0.0, queue_wait), task=task_type, pool=pool_name)
+    metrics.observe("offload_exec_seconds", exec_time, task=task_type, pool=pool_name)
+    return result
+
+
+async def run_in_thread(task_type: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run fn(*args, **kwargs) on the shared thread pool"""
+    return await _submit("thread", _get_thread_pool(), task_type, fn, args, kwargs)
+
+
+async def run_in_process(task_type: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run fn(*args, **kwargs) on the shared process pool (fn and arguments must pickle)"""
+    return await _submit("process", _get_process_pool(), task_type, fn, args, kwargs)
+
+
+async def start():
+    """
+    Start the worker processes at application startup. With the fork start method
+    all workers are forked on first use, and forking before other threads exist
+    avoids inheriting locks they hold.
+    """
+    await run_in_process("warmup", _noop)
+
+
+def shutdown():
+    """Stop the pools at application shutdown: queued tasks are cancelled, running ones are not waited for"""
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -0,0 +1,171 @@
+"""
+Client-side token buckets that keep us under a provider's rate limit.
+
+Each bucket refills at `rate` tokens per second up to `burst`; every upstream
+request takes one token. A request that finds the bucket empty reserves the
+next token and sleeps until it's due, so short bursts queue for a moment
+instead of turning into 429s, and waiters are served in arrival order. A
+request whose wait would exceed its time budget gives up with
+RateLimitTimeout without taking a token.
+
+With RATE_LIMIT_BACKEND=redis the bucket lives in Redis (one atomic script
+call per acquire), so all uvicorn workers and instances share the quota.
+Without the redis package, or when Redis can't be reached, each process keeps
+its own in-memory bucket. Redis calls time out after
+RATE_LIMIT_REDIS_TIMEOUT_SECONDS, and after a failure the in-memory bucket is
+used for RATE_LIMIT_REDIS_COOLDOWN_SECONDS before Redis is tried again.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Dict, Optional
+
+from config import settings
+from utils import metrics
+
+# Shared buckets need the optional redis package (pip install redis)
+try:
+    import redis.asyncio as redis_asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis_asyncio = None
+    REDIS_AVAILABLE = False
+
+metrics.describe("rate_limiter_wait_seconds", "Time requests queued for a client-side rate limit token")
+metrics.describe("rate_limiter_timeouts_total", "Requests that couldn't get a token within their time budget")
+
+# KEYS[1] bucket; ARGV rate, burst, cost, max_wait (a negative cost refunds). Returns {acquired, wait}.
+# Numbers go back as strings: Redis truncates Lua numbers to integers.
+_ACQUIRE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if cost > 0 and tokens < cost then
+    wait = (cost - tokens) / rate
+end
+if wait > max_wait then
+    return {0, tostring(wait)}
+end
+tokens = math.min(burst, tokens - cost)
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return {1, tostring(wait)}
+"""
+
+
+class RateLimitTimeout(Exception):
+    """No token would be free within the caller's time budget"""
+
+    def __init__(self, name: str, wait: float):
+        super().__init__(f"{name} client-side rate limit: next slot in {wait:.1f}s")
+        self.wait = wait
+
+
+class TokenBucket:
+    def __init__(self, name: str, key: str, rate: float, burst: int):
+        self.name = name
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._script = None
+
+    def _take_local(self, cost: float, max_wait: float):
+        """In-memory version of _ACQUIRE_SCRIPT"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        wait = (cost - self._tokens) / self.rate if 0 < cost and self._tokens < cost else 0.0
+        if wait > max_wait:
+            return False, wait
+        self._tokens = min(self.burst, self._tokens - cost)
+        return True, wait
+
+    async def _take(self, cost: float, max_wait: float):
+        client = _redis_client()
+        if client is not None:
+            try:
+                if self._script is None:
+                    self._script = client.register_script(_ACQUIRE_SCRIPT)
+                acquired, wait = await self._script(keys=[self.key], args=[self.rate, self.burst, cost, max_wait])
+                return bool(int(acquired)), float(wait)
+            except Exception as e:
+                _redis_failed()
+                print(
+                    f"⚠️ Rate limiter backend unavailable, using in-process buckets for "
+                    f"{settings.RATE_LIMIT_REDIS_COOLDOWN_SECONDS:.0f}s ({self.name}): {e}", flush=True
+                )
+        return self._take_local(cost, max_wait)
+
+    async def acquire(self, max_wait: Optional[float] = None):
+        """
+        Take one token, sleeping until it's due. Raises RateLimitTimeout when
+        that would take longer than max_wait (default TTS_RATE_LIMIT_MAX_WAIT_SECONDS).
+        """
+        if max_wait is None:
+            max_wait = settings.TTS_RATE_LIMIT_MAX_WAIT_SECONDS
+        acquired, wait = await self._take(1, max_wait)
+        if not acquired:
+            metrics.inc("rate_limiter_timeouts_total", provider=self.name)
+            raise RateLimitTimeout(self.name, wait)
+        metrics.observe("rate_limiter_wait_seconds", wait, provider=self.name)
+        if wait <= 0:
+            return
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Hand the reserved token back (e.g. this was the losing half of a hedge)
+            await asyncio.shield(self._take(-1, 0))
+            raise
+
+
+_redis = None
+_redis_down_until = 0.0
+
+
+def _redis_client():
+    global _redis
+    if settings.RATE_LIMIT_BACKEND != "redis" or not REDIS_AVAILABLE:
+        return None
+    if time.monotonic() < _redis_down_until:
+        return None  # failed recently; don't make every request wait on it again
+    if _redis is None:
+        _redis = redis_asyncio.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+            socket_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+        )
+    return _redis
+
+
+def _redis_failed():
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + settings.RATE_LIMIT_REDIS_COOLDOWN_SECONDS
+
+
+_buckets: Dict[str, TokenBucket] = {}
+
+
+def get_limiter(provider: str, api_key: Optional[str]) -> Optional[TokenBucket]:
+    """
+    The bucket for one provider account (keys are hashed, never stored), or
+    None when no limit is configured for the provider.
+    """
+    rate, burst = settings.TTS_RATE_LIMITS.get(provider, (0.0, 0))
+    if rate <= 0:
+        return None
+    account = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    key = f"ratelimit:{provider}:{account}"
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = _buckets[key] = TokenBucket(provider, key, rate, max(1, burst))
+    return bucket
@@ -0,0 +1,70 @@
+import re
+from typing import List
+
+# A sentence ends at . ! ? or … (plus any closing quotes/brackets) followed by
+# whitespace, or at a line break
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])[\"'”’)\]]*\s+|\n+")
+
+# Common abbreviations that end in a period but don't end a sentence
+_ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "sr.", "jr.", "st.", "vs.", "etc.", "e.g.", "i.e.", "no."}
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split text into sentences, keeping each sentence's punctuation.
+    Splitting is deterministic, so an unchanged sentence always yields the same
+    string (and therefore the same cache key) across edits of its neighbours.
+    """
+    pieces = []
+    last = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        piece = text[last:match.start()] + text[match.start():match.end()].rstrip()
+        words = piece.split()
+        if words and words[-1].lower() in _ABBREVIATIONS:
+            continue  # keep going - this period belongs to an abbreviation
+        if "\n" not in match.group() and text[match.end():match.end() + 1].islower():
+            continue  # '"Fine!" he said.' is one sentence
+        pieces.append(piece.strip())
+        last = match.end()
+    pieces.append(text[last:].strip())
+    return [p for p in pieces if p]
+
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Break a sentence longer than max_chars at word boundaries"""
+    pieces, current = [], ""
+    for word in sentence.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_chars: int) -> List[str]:
+    """
+    Group sentences into chunks of at most max_chars for long-form synthesis.
+    A paragraph break closes the current chunk once it's at least half full, so
+    chunks tend to end where the narration naturally pauses.
+    """
+    chunks: List[str] = []
+    current = ""
+    for paragraph in _PARAGRAPH_RE.split(text):
+        for sentence in split_sentences(paragraph):
+            for piece in (_split_long(sentence, max_chars) if len(sentence) > max_chars else [sentence]):
+                if current and len(current) + 1 + len(piece) > max_chars:
+                    chunks.append(current)
+                    current = ""
+                current = f"{current} {piece}" if current else piece
+        if current and len(current) >= max_chars // 2:
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks